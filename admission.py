@@ -0,0 +1,191 @@
+# admission.py
+"""
+准入控制：限制调用AI的路由同时处理的请求数（全局 + 按路由），
+超出时在有界队列中等待，队列已满立即返回429，等待超过期限返回503，均带Retry-After
+"""
+import functools
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+
+from flask import jsonify, make_response
+
+from metrics import REGISTRY, observe_stage
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_REJECTIONS = REGISTRY.counter(
+    'ansapra_admission_rejections_total', '准入控制拒绝的请求数', ('route', 'reason')
+)
+
+# Retry-After 的范围（秒）
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+
+class Rejected(Exception):
+    """请求未被准入，status_code 为 429（队列已满）或 503（等待超时）"""
+
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _Slot:
+    """已准入的请求占用的并发名额，release 可重复调用"""
+
+    def __init__(self, controller, route):
+        self._controller = controller
+        self._route = route
+        self._start = time.perf_counter()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._controller._release(self._route, time.perf_counter() - self._start)
+
+
+class AdmissionController:
+    """
+    全局与按路由的并发上限（0表示不限制），共享一个有界等待队列
+    等待中的请求同样占用服务器线程，队列长度应小于 gthread 线程数减去并发上限
+    """
+
+    def __init__(self, global_limit=16, route_limits=None, queue_size=8, queue_timeout=10):
+        self.global_limit = global_limit
+        self.route_limits = dict(route_limits or {})
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._route_active = defaultdict(int)
+        self._route_waiting = defaultdict(int)
+        # 按路由统计的名额占用时间（指数移动平均），用于估算 Retry-After
+        self._hold_seconds = {}
+        self._counters = defaultdict(lambda: {'admitted': 0, 'queued': 0, 'rejected_full': 0, 'rejected_timeout': 0})
+
+    def _has_capacity(self, route):
+        if self.global_limit > 0 and self._active >= self.global_limit:
+            return False
+        limit = self.route_limits.get(route, 0)
+        return not (limit > 0 and self._route_active[route] >= limit)
+
+    def _retry_after(self, route):
+        """按排在前面的请求数和平均占用时间估算多久后重试"""
+        hold = self._hold_seconds.get(route, 5.0)
+        limit = self.route_limits.get(route) or self.global_limit or 1
+        estimate = hold * (self._route_waiting[route] + 1) / limit
+        return int(min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(estimate))))
+
+    def acquire(self, route):
+        """申请名额，返回 _Slot；无法在期限内获得时抛出 Rejected"""
+        start = time.perf_counter()
+        with self._cond:
+            counters = self._counters[route]
+            if self._has_capacity(route):
+                return self._admit(route, counters)
+
+            if self._waiting >= self.queue_size:
+                counters['rejected_full'] += 1
+                ADMISSION_REJECTIONS.inc(route=route, reason='queue_full')
+                raise Rejected('服务器繁忙，请稍后重试', 429, self._retry_after(route))
+
+            counters['queued'] += 1
+            self._waiting += 1
+            self._route_waiting[route] += 1
+            deadline = start + self.queue_timeout
+            try:
+                while not self._has_capacity(route):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        counters['rejected_timeout'] += 1
+                        ADMISSION_REJECTIONS.inc(route=route, reason='timeout')
+                        logger.warning(f"{route} 请求排队超过 {self.queue_timeout} 秒，返回503")
+                        raise Rejected('服务器繁忙，排队超时，请稍后重试', 503, self._retry_after(route))
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+                self._route_waiting[route] -= 1
+            observe_stage('admission_wait', time.perf_counter() - start)
+            return self._admit(route, counters)
+
+    def _admit(self, route, counters):
+        self._active += 1
+        self._route_active[route] += 1
+        counters['admitted'] += 1
+        return _Slot(self, route)
+
+    def _release(self, route, held_seconds):
+        with self._cond:
+            self._active -= 1
+            self._route_active[route] -= 1
+            previous = self._hold_seconds.get(route)
+            self._hold_seconds[route] = held_seconds if previous is None else previous * 0.8 + held_seconds * 0.2
+            self._cond.notify_all()
+
+    def limit(self, route):
+        """
+        路由装饰器：准入后才执行视图；流式响应在发送结束（或客户端断开）时才释放名额
+        未准入时返回带 Retry-After 的JSON错误
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                try:
+                    slot = self.acquire(route)
+                except Rejected as e:
+                    response = jsonify({'success': False, 'message': str(e), 'retry_after': e.retry_after})
+                    response.status_code = e.status_code
+                    response.headers['Retry-After'] = str(e.retry_after)
+                    return response
+
+                try:
+                    response = make_response(view(*args, **kwargs))
+                except BaseException:
+                    slot.release()
+                    raise
+                if response.is_streamed:
+                    response.response = _release_when_done(response.response, slot.release)
+                    response.call_on_close(slot.release)
+                else:
+                    slot.release()
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._cond:
+            routes = {}
+            for route in sorted(set(self.route_limits) | set(self._counters)):
+                routes[route] = dict(
+                    self._counters[route],
+                    limit=self.route_limits.get(route, 0),
+                    active=self._route_active[route],
+                    waiting=self._route_waiting[route],
+                    avg_hold_seconds=round(self._hold_seconds.get(route, 0), 3)
+                )
+            return {
+                'global_limit': self.global_limit,
+                'active': self._active,
+                'queue_size': self.queue_size,
+                'queue_timeout': self.queue_timeout,
+                'waiting': self._waiting,
+                'routes': routes
+            }
+
+
+def _release_when_done(iterable, release):
+    """流式响应的内容迭代完或被关闭时释放名额"""
+    try:
+        yield from iterable
+    finally:
+        release()
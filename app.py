@@ -3,60 +3,251 @@ import json
 import tempfile
 import traceback
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, make_response, Response
 from flask_cors import CORS
-import requests
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import uuid
 import logging
 import time
-import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from admission import AdmissionController
+from i18n import TranslationCatalog
+from job_queue import JobFailed, JobQueue, FINISHED_STATUSES
+from llm_client import DeepSeekClient, LLMError, LLMTimeoutError
+from long_document import condense_paper
+import metrics
+from passwords import HasherBusy, PasswordHasher
+from pdf_cache import PDFExtractionCache, content_hash
+from pdf_extract import EXTRACTOR_VERSION, extract_pdf
+import prompts
+from prompts import build_chart_prompt
+from rate_limit import MemoryBucketStore, RateLimiter, SQLiteBucketStore, parse_budgets
+from response_cache import SingleFlight, TTLCache, interpretation_cache_key
+from sessions import SUMMARY_FIELDS, ServerSessionInterface, SessionStore, user_summary
+from static_assets import AssetPipeline, revalidate
+from upload_spool import SpooledUpload, SpoolingRequest, remove_stale, spool_upload
+from user_store import HISTORY_LIMIT, UserStore
+from write_behind import WriteBehindBuffer
 
 # 配置日志
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+# 上传文件在multipart解析时直接分块写入 UPLOAD_FOLDER，不整体读入内存
+app.request_class = SpoolingRequest
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB限制
 app.config['SESSION_COOKIE_SECURE'] = False
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', tempfile.gettempdir())
+remove_stale(app.config['UPLOAD_FOLDER'])
 
 CORS(app)
+metrics.init_app(app)
+
+# 静态资源：url_for('static') 输出带内容哈希的文件名，预压缩（gzip/brotli）并长期缓存，
+# 构建结果写入 ASSET_BUILD_DIR，多个worker共用（可在部署时用 python static_assets.py 预先构建）
+assets = AssetPipeline(
+    os.environ.get('ASSET_BUILD_DIR', 'data/assets'),
+    enabled=os.environ.get('STATIC_ASSETS_ENABLED', '1') != '0'
+)
+assets.init_app(app)
+
+# 界面翻译：启动时读入内存并按语言切分，最多每 I18N_CHECK_INTERVAL 秒检查一次文件是否修改
+translations = TranslationCatalog(
+    os.path.join(app.static_folder, 'lang', 'translations.json'),
+    check_interval=float(os.environ.get('I18N_CHECK_INTERVAL', 5))
+)
 
 # API配置
 DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY')
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+DEEPSEEK_API_URL = os.environ.get('DEEPSEEK_API_URL', "https://api.deepseek.com/v1/chat/completions")
 ADOBE_CLIENT_ID = os.environ.get('ADOBE_CLIENT_ID')
 
-# 用户数据文件路径
-USERS_FILE = 'data/users.json'
-
-def load_users():
-    """加载用户数据"""
-    try:
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+# 所有DeepSeek调用共享的连接池客户端
+llm_client = DeepSeekClient(
+    DEEPSEEK_API_URL,
+    DEEPSEEK_API_KEY,
+    pool_size=int(os.environ.get('LLM_POOL_SIZE', 16)),
+    connect_timeout=float(os.environ.get('LLM_CONNECT_TIMEOUT', 10)),
+    max_retries=int(os.environ.get('LLM_MAX_RETRIES', 2))
+)
 
-def save_users(users_data):
-    """保存用户数据"""
-    os.makedirs('data', exist_ok=True)
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users_data, f, ensure_ascii=False, indent=2)
+# 用户数据文件路径
+USERS_FILE = 'data/users.json'  # 旧版整体JSON存储，仅用于一次性迁移
+USERS_DB = os.environ.get('USERS_DB', 'data/users.db')
+
+user_store = UserStore(USERS_DB)
+user_store.migrate_from_json(USERS_FILE)
+# 阅读/聊天历史改为追加写入历史日志表，旧记录中内嵌的列表一次性迁移出去
+user_store.migrate_embedded_history()
+
+# 服务端会话：Cookie中只保存会话ID，会话和登录用户的简要信息缓存在进程内并写入 SESSION_DB，
+# 会话闲置 SESSION_TTL 秒后失效，进程内缓存最多使用 SESSION_CACHE_TTL 秒后重新读取
+session_store = SessionStore(
+    os.environ.get('SESSION_DB', 'data/sessions.db'),
+    ttl=int(os.environ.get('SESSION_TTL', 7 * 86400)),
+    cache_ttl=int(os.environ.get('SESSION_CACHE_TTL', 60)),
+    max_items=int(os.environ.get('SESSION_CACHE_SIZE', 10000))
+)
+app.session_interface = ServerSessionInterface(session_store)
+
+def invalidate_flushed_sessions(updates):
+    """
+    写缓冲提交后再次清除相关会话缓存的简要信息：修改时已清除过一次，但提交前
+    其他worker可能按存储中的旧数据重新生成并保存了简要信息
+    """
+    for email, fields in updates.items():
+        if any(field in fields for field in SUMMARY_FIELDS):
+            session_store.invalidate_user(email)
+
+# 写缓冲：设置修改、登录时间、阅读历史和聊天记录每 WRITE_BEHIND_INTERVAL 秒批量提交一次
+# （待提交数达到 WRITE_BEHIND_MAX_PENDING 时提前提交），worker退出时提交剩余部分；设为0时直接写入
+write_behind = WriteBehindBuffer(
+    user_store,
+    interval=float(os.environ.get('WRITE_BEHIND_INTERVAL', 1.0)),
+    max_pending=int(os.environ.get('WRITE_BEHIND_MAX_PENDING', 500)),
+    on_flush=invalidate_flushed_sessions
+)
+
+# 历史记录接口默认每页条数（最多 user_store.HISTORY_LIMIT 条）
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 20))
+
+# PDF最多解析的页数
+PDF_MAX_PAGES = int(os.environ.get('PDF_MAX_PAGES', 10))
+# 并行解析PDF页面的进程数（0或1为串行）
+PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', 0))
+
+# PDF解析结果缓存
+pdf_cache = PDFExtractionCache(
+    os.environ.get('PDF_CACHE_DIR', 'data/pdf_cache'),
+    memory_items=int(os.environ.get('PDF_CACHE_MEMORY_ITEMS', 64)),
+    disk_max_bytes=int(os.environ.get('PDF_CACHE_DISK_MB', 200)) * 1024 * 1024
+)
+
+# 长文档模式：全文分块并发摘要后再解读
+# LONG_DOCUMENT_AUTO_CHARS > 0 时，超过该长度的论文自动进入长文档模式
+LONG_DOCUMENT_AUTO_CHARS = int(os.environ.get('LONG_DOCUMENT_AUTO_CHARS', 0))
+LONG_DOCUMENT_CHUNK_CHARS = int(os.environ.get('LONG_DOCUMENT_CHUNK_CHARS', 6000))
+LONG_DOCUMENT_CONCURRENCY = int(os.environ.get('LONG_DOCUMENT_CONCURRENCY', 4))
+
+# 单个图表请求内并发生成的图表数上限
+CHART_CONCURRENCY = int(os.environ.get('CHART_CONCURRENCY', 4))
+
+# 异步解读任务队列（async=1 提交，轮询或订阅 /api/jobs/<job_id> 获取结果）
+job_queue = JobQueue(
+    os.environ.get('JOBS_DB', 'data/jobs.db'),
+    workers=int(os.environ.get('JOB_WORKERS', 2)),
+    retention=int(os.environ.get('JOB_RETENTION', 86400))
+)
+
+# 解读结果缓存（同一论文 + 相同设置 + 相近画像复用生成结果），TTL设为0可关闭
+interpretation_cache = TTLCache(
+    max_items=int(os.environ.get('INTERPRET_CACHE_SIZE', 256)),
+    ttl=int(os.environ.get('INTERPRET_CACHE_TTL', 24 * 3600)),
+    name='interpretation'
+)
+
+# 调用AI的路由的准入控制：全局与按路由的并发上限（0为不限制），
+# 超出时最多 ADMISSION_QUEUE_SIZE 个请求排队等待 ADMISSION_QUEUE_TIMEOUT 秒，
+# 队列已满返回429，排队超时返回503（排队的请求也占用gthread线程，上限与队列之和应小于线程数）
+admission = AdmissionController(
+    global_limit=int(os.environ.get('ADMISSION_GLOBAL_LIMIT', 16)),
+    route_limits={
+        'interpret': int(os.environ.get('ADMISSION_INTERPRET_LIMIT', 8)),
+        'chat': int(os.environ.get('ADMISSION_CHAT_LIMIT', 12)),
+        'charts': int(os.environ.get('ADMISSION_CHARTS_LIMIT', 4))
+    },
+    queue_size=int(os.environ.get('ADMISSION_QUEUE_SIZE', 8)),
+    queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 10))
+)
+
+# 限流：令牌桶按登录用户(user)、游客会话(guest)、客户端IP(ip)和登录尝试的账户(account)分别计数，
+# 预算格式为 '维度=次数/秒数'（每个周期补满），次数为0或省略的维度不限流；
+# 配置 RATE_LIMIT_DB 时桶状态保存在SQLite中由所有worker共享，否则保存在各进程内
+RATE_LIMIT_BUDGETS = {
+    'interpret': parse_budgets(os.environ.get('RATE_LIMIT_INTERPRET', 'user=30/3600,guest=5/3600,ip=120/3600')),
+    'chat': parse_budgets(os.environ.get('RATE_LIMIT_CHAT', 'user=120/3600,guest=30/3600,ip=600/3600')),
+    'charts': parse_budgets(os.environ.get('RATE_LIMIT_CHARTS', 'user=30/3600,guest=5/3600,ip=120/3600')),
+    # 游客会话的创建次数，防止不断换新游客身份绕过游客预算
+    'guest_login': parse_budgets(os.environ.get('RATE_LIMIT_GUEST_LOGIN', 'ip=20/3600')),
+    # 登录尝试次数（在校验密码前扣除），按账户限制猜测密码，按IP限制批量尝试
+    'login': parse_budgets(os.environ.get('RATE_LIMIT_LOGIN', 'account=10/300,ip=100/300'))
+}
+RATE_LIMIT_IDLE_TTL = max(
+    [budget.period for budgets in RATE_LIMIT_BUDGETS.values() for budget in budgets.values()] or [3600]
+)
+RATE_LIMIT_DB = os.environ.get('RATE_LIMIT_DB', '')
+rate_limiter = RateLimiter(
+    SQLiteBucketStore(RATE_LIMIT_DB, idle_ttl=RATE_LIMIT_IDLE_TTL) if RATE_LIMIT_DB
+    else MemoryBucketStore(idle_ttl=RATE_LIMIT_IDLE_TTL),
+    RATE_LIMIT_BUDGETS,
+    # 部署在反向代理之后时设为代理层数，按 X-Forwarded-For 识别客户端IP
+    trusted_proxies=int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', 0)),
+    enabled=os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+)
+
+# 密码哈希：算法与成本见 werkzeug 的 generate_password_hash（如 'pbkdf2:sha256:600000'、'scrypt:32768:8:1'），
+# 修改后旧哈希在用户下次登录成功时按新参数重新计算；计算在 PASSWORD_HASH_WORKERS 个线程中进行
+# （0为在请求线程中直接计算），最多 PASSWORD_HASH_QUEUE 个请求排队，超出或等待超时返回503
+password_hasher = PasswordHasher(
+    method=os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000'),
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 1)),
+    queue_size=int(os.environ.get('PASSWORD_HASH_QUEUE', 8)),
+    timeout=float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+)
+
+# 相同内容的并发请求只计算一次（课堂上多名学生同时上传同一篇论文时合并请求）
+pdf_flights = SingleFlight()
+interpretation_flights = SingleFlight()
+chart_flights = SingleFlight()
 
 def get_user_by_email(email):
-    """通过邮箱获取用户"""
-    users = load_users()
-    return users.get(email)
+    """通过邮箱获取用户（包含写缓冲中尚未提交的修改）"""
+    with metrics.timed('user_store_load'):
+        user = user_store.get(email)
+    if user is not None:
+        user.update(write_behind.pending_fields(email))
+    return user
+
+def update_user(email, updater):
+    """对单个用户记录做读-改-写，返回修改后的用户，不存在时返回None"""
+    with metrics.timed('user_store_save'):
+        user = user_store.update(email, updater)
+    if user is not None:
+        user.update(write_behind.pending_fields(email))
+    return user
+
+def delete_user(email):
+    """删除用户及其所有会话"""
+    write_behind.discard(email)
+    with metrics.timed('user_store_save'):
+        deleted = user_store.delete(email)
+    session_store.delete_user(email)
+    return deleted
+
+def get_user_summary():
+    """
+    当前登录用户的简要信息（id、用户名、设置、语言），不需要完整用户记录的路由使用
+    会话中已缓存时不读取用户存储；游客或用户不存在时返回None
+    """
+    email = session.get('user_email')
+    if not email or session.get('is_guest'):
+        return None
+    if session.summary is None:
+        user = get_user_by_email(email)
+        if user is None:
+            return None
+        session.summary = user_summary(user)
+        if session.sid:
+            session_store.set_summary(session.sid, session.summary)
+    return session.summary
 
 def create_user(email, username, password, questionnaire=None):
-    """创建新用户"""
-    users = load_users()
-    if email in users:
+    """创建新用户（密码哈希繁忙时抛出 HasherBusy）"""
+    if user_store.get(email) is not None:
         return False, "邮箱已存在"
     
     user_id = str(uuid.uuid4())
@@ -64,8 +255,9 @@ def create_user(email, username, password, questionnaire=None):
         'id': user_id,
         'email': email,
         'username': username,
-        'password_hash': generate_password_hash(password),
+        'password_hash': password_hasher.hash(password),
         'questionnaire': questionnaire or {},
+        'profile': build_profile(questionnaire),
         'settings': {
             'reading': {
                 'preparation': 'B',
@@ -84,537 +276,141 @@ def create_user(email, username, password, questionnaire=None):
             },
             'language': 'zh'
         },
-        'reading_history': [],
         'created_at': datetime.now().isoformat(),
         'last_login': None
     }
     
-    users[email] = user_data
-    save_users(users)
+    with metrics.timed('user_store_save'):
+        inserted = user_store.insert(email, user_data)
+    if not inserted:
+        return False, "邮箱已存在"
     return True, user_data
 
 def update_user_settings(email, settings):
-    """更新用户设置"""
-    users = load_users()
-    if email in users:
-        users[email]['settings'] = settings
-        save_users(users)
-        return True
-    return False
+    """更新用户设置（经写缓冲批量提交）"""
+    with metrics.timed('user_store_load'):
+        if not user_store.exists(email):
+            return False
+    write_behind.update_fields(email, {'settings': settings})
+    session_store.invalidate_user(email)
+    return True
 
 def add_to_history(email, history_item):
-    """添加阅读历史"""
-    users = load_users()
-    if email in users:
-        if 'reading_history' not in users[email]:
-            users[email]['reading_history'] = []
-        
-        history_item['id'] = str(uuid.uuid4())
-        history_item['timestamp'] = datetime.now().isoformat()
-        users[email]['reading_history'].insert(0, history_item)
-        
-        # 保持最多50条历史记录
-        users[email]['reading_history'] = users[email]['reading_history'][:50]
-        save_users(users)
-        return True
-    return False
-
-def get_history(email):
-    """获取用户阅读历史"""
-    users = load_users()
-    if email in users:
-        return users[email].get('reading_history', [])
-    return []
-
-def extract_text_from_pdf_advanced(file_bytes):
+    """添加阅读历史（经写缓冲追加到历史日志，保留最近50条）"""
+    history_item['id'] = str(uuid.uuid4())
+    history_item['timestamp'] = datetime.now().isoformat()
+    return write_behind.append_history(email, 'reading', history_item)
+
+def add_chat_history(email, chat_item):
+    """添加聊天记录（经写缓冲追加到历史日志，保留最近50条）"""
+    return write_behind.append_history(email, 'chat', chat_item)
+
+def flush_pending_history(email):
+    """读取历史前提交该用户尚未提交的历史记录（分页游标基于提交后的记录ID）"""
+    if write_behind.has_pending_history(email):
+        with metrics.timed('user_store_save'):
+            write_behind.flush()
+
+def update_user_questionnaire(email, questionnaire):
+    """更新用户问卷并重新计算用户画像，返回更新后的用户，不存在时返回None"""
+    profile = build_profile(questionnaire)
+    def apply(user):
+        user['questionnaire'] = questionnaire
+        user['profile'] = profile
+    updated = update_user(email, apply)
+    session_store.invalidate_user(email)
+    return updated
+
+def get_history(email, limit=HISTORY_LIMIT):
+    """获取用户阅读历史（新的在前）"""
+    flush_pending_history(email)
+    with metrics.timed('user_store_load'):
+        items, _ = user_store.get_history(email, 'reading', limit=limit)
+    return [item for _, item in items]
+
+def history_page(email, kind):
     """
-    高级PDF解析：尝试多种方法提取文本
-    返回：(success, text_or_error_message)
+    按请求参数 limit / cursor 读取一页历史记录（从最新的开始往前翻）
+    返回：(items, next_cursor)，items 为 [(id, item)]，没有更早的记录时 next_cursor 为None
+    参数不合法时抛出 ValueError
     """
-    try:
-        # 方法1：先尝试PyPDF2
-        try:
-            from PyPDF2 import PdfReader
-            
-            pdf_file = io.BytesIO(file_bytes)
-            pdf_reader = PdfReader(pdf_file)
-            
-            # 检查PDF是否加密
-            if pdf_reader.is_encrypted:
-                try:
-                    # 尝试用空密码解密
-                    pdf_reader.decrypt('')
-                except:
-                    return False, "PDF文件已加密，无法读取内容。请上传未加密的PDF文件。"
-            
-            text_content = ""
-            total_pages = len(pdf_reader.pages)
-            max_pages = min(total_pages, 10)
-            
-            for page_num in range(max_pages):
-                try:
-                    page = pdf_reader.pages[page_num]
-                    page_text = page.extract_text()
-                    
-                    if page_text and page_text.strip():
-                        # 检查提取的文本是否包含可读字符（非乱码）
-                        readable_chars = sum(1 for c in page_text if c.isprintable() or c.isspace())
-                        if readable_chars / len(page_text) > 0.3:  # 降低阈值，从0.7改为0.3
-                            # 过滤可能的元数据
-                            filtered_text = filter_pdf_metadata(page_text)
-                            if filtered_text and filtered_text.strip():
-                                text_content += f"第{page_num+1}页:\n{filtered_text}\n\n"
-                            # 如果过滤后为空，使用原始文本
-                            elif page_text.strip():
-                                text_content += f"第{page_num+1}页:\n{page_text}\n\n"
-                except Exception as page_error:
-                    continue
-            
-            if text_content.strip():
-                logger.info(f"PyPDF2成功提取文本，长度: {len(text_content)}")
-                return True, text_content
-        except Exception as e:
-            logger.warning(f"PyPDF2解析失败: {e}")
-        
-        # 方法2：尝试pdfplumber（如果安装）
-        try:
-            import pdfplumber
-            
-            pdf_file = io.BytesIO(file_bytes)
-            text_content = ""
-            
-            with pdfplumber.open(pdf_file) as pdf:
-                total_pages = len(pdf.pages)
-                max_pages = min(total_pages, 10)
-                
-                for page_num in range(max_pages):
-                    try:
-                        page = pdf.pages[page_num]
-                        page_text = page.extract_text()
-                        
-                        if page_text and page_text.strip():
-                            # 过滤可能的元数据
-                            filtered_text = filter_pdf_metadata(page_text)
-                            if filtered_text and filtered_text.strip():
-                                text_content += f"第{page_num+1}页:\n{filtered_text}\n\n"
-                            # 如果过滤后为空，使用原始文本
-                            elif page_text.strip():
-                                text_content += f"第{page_num+1}页:\n{page_text}\n\n"
-                    except:
-                        continue
-            
-            if text_content.strip():
-                logger.info(f"pdfplumber成功提取文本，长度: {len(text_content)}")
-                return True, text_content
-        except ImportError:
-            logger.warning("pdfplumber未安装")
-        except Exception as e:
-            logger.warning(f"pdfplumber解析失败: {e}")
-        
-        # 方法3：尝试pdfminer.six（更强大的解析器）
-        try:
-            from pdfminer.high_level import extract_text as pdfminer_extract_text
-            from pdfminer.pdfparser import PDFSyntaxError
-            
-            pdf_file = io.BytesIO(file_bytes)
-            
-            try:
-                text_content = pdfminer_extract_text(pdf_file)
-                # 过滤可能的元数据
-                filtered_text = filter_pdf_metadata(text_content)
-                if filtered_text and filtered_text.strip():
-                    text_content = filtered_text
-                # 如果过滤后为空，使用原始文本
-            except PDFSyntaxError:
-                # 可能不是标准PDF，尝试其他方法
-                text_content = ""
-            
-            if text_content and text_content.strip():
-                logger.info(f"pdfminer成功提取文本，长度: {len(text_content)}")
-                return True, text_content
-        except ImportError:
-            logger.warning("pdfminer未安装")
-        except Exception as e:
-            logger.warning(f"pdfminer解析失败: {e}")
-        
-        # 所有方法都失败，可能是扫描件
-        return False, """
-PDF文件解析失败，可能是以下原因：
-
-1. **PDF是扫描件/图片**：文件由图片组成，需要OCR识别才能提取文字
-2. **PDF使用特殊字体/编码**：使用了不常见的字体或编码方式
-3. **PDF已损坏或加密**：文件可能已损坏或被加密
-
-建议：
-1. 上传可复制文字的PDF文件（非扫描件）
-2. 或者直接复制PDF中的文字粘贴到文本框中
-3. 或者将扫描件转换为可编辑的PDF（使用Adobe Acrobat等工具）
-
-如果您确定PDF包含可复制文字但仍失败，请通过调试接口检查文件：/api/debug/pdf
-"""
-        
-    except Exception as e:
-        logger.error(f"PDF解析过程中发生未知错误: {e}")
-        return False, f"PDF解析失败: {str(e)}"
-
-def filter_pdf_metadata(text):
+    limit = int(request.args.get('limit', HISTORY_PAGE_SIZE))
+    if not 1 <= limit <= HISTORY_LIMIT:
+        raise ValueError(f'limit 应在 1-{HISTORY_LIMIT} 之间')
+    cursor = request.args.get('cursor')
+    before = int(cursor) if cursor else None
+    flush_pending_history(email)
+    with metrics.timed('user_store_load'):
+        items, has_more = user_store.get_history(email, kind, limit=limit, before=before)
+    next_cursor = str(items[-1][0]) if has_more and items else None
+    return items, next_cursor
+
+def analyze_pdf(source):
     """
-    过滤PDF中的元数据和无用信息
-    返回：过滤后的纯文本内容
+    解析PDF并判断是否为扫描件（同一遍完成），结果按文件内容SHA-256缓存，重复上传时跳过解析
+    （缓存键包含提取引擎版本和页数上限，修改 PDF_MAX_PAGES 或升级提取逻辑后不会读到旧结果）
+    source 为落盘的上传文件（SpooledUpload，哈希已在写入时算好）或文件内容bytes
+    返回：{'success', 'text', 'extractor', 'is_scanned', 'scan_message'}
     """
-    if not text:
-        return ""
-    
-    # 扩展元数据关键词列表
-    metadata_keywords = [
-        'Metadata', 'Creator', 'Producer', 'CreationDate', 'ModDate',
-        'Author', 'Title', 'Subject', 'Keywords', 'PDF', 'Version',
-        'Page', 'Pages', 'Document', 'File', 'Software',
-        'Generated by', 'Created by', 'Produced by', 'Written by',
-        'File:', 'Title:', 'Subject:', 'Keywords:', 'Author:',
-        'Creator:', 'Producer:', 'CreationDate:', 'ModDate:',
-        'PDF-', 'xref', 'trailer', 'startxref', 'obj', 'endobj',
-        'stream', 'endstream', 'xref', 'catalog', 'pages', 'page',
-        'font', 'fonts', 'xref', 'trailer', 'startxref', 'obj', 'endobj',
-        'stream', 'endstream', 'xref', 'catalog', 'pages', 'page',
-        'font', 'fonts', 'xref', 'trailer', 'startxref', 'obj', 'endobj'
-    ]
-    
-    # 分割文本为行
-    lines = text.split('\n')
-    filtered_lines = []
-    
-    for line in lines:
-        stripped_line = line.strip()
-        
-        # 跳过空行
-        if not stripped_line:
-            continue
-        
-        # 跳过元数据行
-        is_metadata = False
-        for keyword in metadata_keywords:
-            if keyword.lower() in stripped_line.lower():
-                # 对于某些关键词，即使长度超过100也可能是元数据
-                if len(stripped_line) < 200 or keyword in ['PDF-', 'xref', 'trailer', 'startxref', 'obj', 'endobj', 'stream', 'endstream']:
-                    is_metadata = True
-                    break
-        
-        if is_metadata:
-            continue
-        
-        # 跳过看起来像页码的行
-        if stripped_line.isdigit() and len(stripped_line) <= 3:
-            continue
-        
-        # 跳过包含过多特殊字符的行（可能是乱码）
-        special_chars = sum(1 for c in stripped_line if not c.isalnum() and not c.isspace() and c not in ',.!?;:()[]{}<>"\'')
-        if special_chars / len(stripped_line) > 0.5:
-            continue
-        
-        # 跳过看起来像PDF内部结构的行
-        if stripped_line.startswith('%') and len(stripped_line) < 50:
-            continue
-        
-        # 保留有用的文本行
-        filtered_lines.append(line)
-    
-    # 重新组合文本
-    filtered_text = '\n'.join(filtered_lines)
-    
-    # 进一步清理：移除重复的空白行
-    while '\n\n\n' in filtered_text:
-        filtered_text = filtered_text.replace('\n\n\n', '\n\n')
-    
-    # 清理首尾空白
-    filtered_text = filtered_text.strip()
-    
-    # 如果过滤后文本太短，可能是过滤过度，返回原始文本
-    if len(filtered_text) < 100 and len(text) > 100:
-        logger.warning("过滤后文本过短，可能是过滤过度")
-        # 尝试更宽松的过滤
-        return text.strip()
-    
-    return filtered_text
+    if isinstance(source, SpooledUpload):
+        digest, source = source.sha256, source.path
+    else:
+        digest = content_hash(source)
+    key = f"{digest}-v{EXTRACTOR_VERSION}-p{PDF_MAX_PAGES}"
+    cached = pdf_cache.get(key)
+    if cached is not None:
+        logger.info(f"PDF解析缓存命中: {key[:12]}")
+        return cached
+    
+    def extract():
+        extraction = extract_pdf(source, max_pages=PDF_MAX_PAGES, workers=PDF_EXTRACT_WORKERS)
+        result = {
+            'success': extraction['success'],
+            'text': extraction['text'],
+            'extractor': extraction['extractor'],
+            'is_scanned': extraction['is_scanned'],
+            'scan_message': extraction['scan_message']
+        }
+        pdf_cache.put(key, result)
+        return result
 
-def is_pdf_scanned(file_bytes):
-    """简单判断PDF是否为扫描件"""
-    try:
-        # 检查文件头是否是PDF
-        if len(file_bytes) < 5 or file_bytes[:5] != b'%PDF-':
-            return True, "不是有效的PDF文件"
-        
-        # 尝试提取文本
-        from PyPDF2 import PdfReader
-        
-        pdf_file = io.BytesIO(file_bytes)
-        pdf_reader = PdfReader(pdf_file)
-        
-        if len(pdf_reader.pages) == 0:
-            return True, "PDF没有页面"
-        
-        # 检查第一页是否有文本
-        try:
-            first_page = pdf_reader.pages[0]
-            text = first_page.extract_text()
-            
-            if not text or not text.strip():
-                return True, "PDF第一页没有提取到文字，可能是扫描件"
-            
-            # 检查提取的文本质量
-            readable_chars = sum(1 for c in text if c.isprintable() or c.isspace())
-            if readable_chars / len(text) < 0.3:  # 可读字符少于30%
-                return True, "提取的文字大多是乱码，可能是扫描件或特殊编码"
-            
-            return False, "可能是文本型PDF"
-            
-        except:
-            return True, "无法提取PDF文字"
-            
-    except Exception as e:
-        return True, f"PDF检查失败: {str(e)}"
+    # 同一文件正在被其他请求解析时，等待其结果而不是重复解析
+    return pdf_flights.do(key, extract)
 
-def call_deepseek_api(user_data, paper_content, user_settings, history, questionnaire=None, chat_history=None, language='zh'):
-    """调用DeepSeek API，根据用户画像、历史记录和问卷数据生成个性化解读"""
-    if not DEEPSEEK_API_KEY:
-        raise ValueError("DeepSeek API Key not configured")
-    
-    
+def build_interpretation_messages(user_data, paper_content, user_settings, history, questionnaire=None, chat_history=None, language='zh', paper_limit=3000):
+    """根据用户画像、历史记录和问卷数据构建解读请求的消息列表
+    paper_limit: 论文内容截取的字符数，None表示不截取（长文档模式传入的是压缩后的全文摘要）
+    返回：(messages, max_tokens)
+    """
     # 获取用户问卷数据
     if questionnaire is None and user_data:
         questionnaire = user_data.get('questionnaire', {})
     
-    # 分析用户画像
-    profile_analysis = analyze_user_profile(user_data) if user_data else {}
-    
     # 构建详细提示词
     # 优先使用传入的language参数，如果没有则从user_settings中获取
     if not language:
         language = user_settings.get('language', 'zh') if user_settings else 'zh'
     
-    if language == 'en':
-        system_prompt = """You are a professional natural science paper interpretation assistant, specially designed to help high school students understand academic papers. Please generate paper interpretations according to the user's personalized needs. If the uploaded content cannot be interpreted (e.g., PDF parsing error), please output 'PDF解析出错，请换一篇论文哦'."""
-    else:
-        system_prompt = """你是一位专业的自然科学论文解读助手，专门帮助高中生理解学术论文。请根据用户的个性化需求生成论文解读。如果上传内容无法解读（例如PDF解析错误），请输出'PDF解析出错，请换一篇论文哦'。"""
+    system_prompt = prompts.INTERPRET_SYSTEM_PROMPTS[prompts.template_language(language)]
     
     # 获取阅读习惯设置
     reading_settings = user_settings.get('reading', {}) if user_settings else {}
     
-    # 构建用户阅读习惯描述
-    reading_habits_context = ""
-    if reading_settings:
-        if language == 'en':
-            reading_habits_context = f"""
-Reading Habits Settings:
-1. Preparation Level: {reading_settings.get('preparation', 'B')}
-   - A: Almost no preparation
-   - B: Some preparation
-   - C: In-depth preparation
-   - Effect: Higher preparation level → remove basic term explanations, only explain difficult terms
-
-2. Reading Purpose: {reading_settings.get('purpose', 'B')}
-   - A: Goal-oriented: Reading for specific tasks (homework, competitions), pursuing efficiency and directness
-     * Focus on article concepts and core knowledge points in interpretation
-   - B: Knowledge explorer: Driven by subject interest, wants to broaden knowledge, not急于求成, not pursuing in-depth understanding
-     * Connect with related knowledge within the discipline and practical application examples in interpretation
-   - C: Deep learner: For in-depth understanding and research in a field, values research methods and applications beyond paper knowledge
-     * Focus on the most cutting-edge technology parts of the paper, interpret thoroughly and in detail
-   - D: Scientific literacy builder: Hopes to improve personal scientific literacy and overall scientific perception through paper interpretation
-     * Focus on cultivating user's scientific literacy and scientific perception ability in interpretation
-
-3. Reading Time Preference: {reading_settings.get('time', 'B')}
-   - A: Within 10 minutes
-     * Shorter, more concise interpretation
-   - B: 10-30 minutes
-     * Moderate length and detail
-   - C: 30 minutes or more
-     * Longer, more detailed interpretation
-
-4. Preferred Interpretation Style: {reading_settings.get('style', 'C')}
-   - A: Vivid and figurative, language is colloquial, can connect with the simplest examples and analogies in life to interpret papers
-     * Focus on colloquial expression and examples, analogies in interpretation
-   - B: Quantitative interpretation, try to interpret papers through data and formulas
-     * Connect more with formulas and data in the article in interpretation
-   - C: Professional interpretation, interpret papers through more formal language and professional rigorous expression, make slight adjustments to paper content
-     * Use rigorous expression in interpretation
-   - D: Authentic style, retain the original expression style and expression method of the original text, accept long and difficult sentences, professional terminology interpretation method
-     * Use high difficulty, high academic style similar to professional academic papers in interpretation
-   - E: Step-by-step derivation, through problem introduction, similar to classroom teaching method to gradually introduce knowledge, emphasize interactivity
-     * Use question method in interpretation, guide users like classroom teaching
-
-5. Preferred Interpretation Depth: {reading_settings.get('depth', 'B')}
-   - A: Concise summary
-     * Use about 2000 words for paper overview section
-   - B: Balanced detailed
-     * Use about 4000 words for paper overview section
-   - C: Detailed in-depth
-     * Use about 6000 words for paper overview section
-
-6. Preferred Post-reading Test Content: {reading_settings.get('test_type', ['A'])}
-   - A: Related definition fill-in-the-blank questions
-   - B: Error-prone multiple-choice questions
-   - C: Formula logic dictation questions
-
-7. Preferred Chart Formats: {reading_settings.get('chart_types', ['A'])}
-   - A: Mind maps (tree structure)
-   - B: Flowcharts and logic diagrams
-   - C: Tables
-   - D: Statistical charts (line charts, bar charts, etc.)
-
-Please strictly adjust your interpretation according to these settings, especially the specific requirements for each option.
-"""
-        else:
-            reading_habits_context = f"""
-阅读习惯设置：
-1. 阅读一篇专业自然科学论文之前，您会在论文所在领域知识方面做什么程度的准备？ {reading_settings.get('preparation', 'B')}
-   - A：几乎不做准备
-   - B：做一些准备
-   - C：做较为深入的准备
-   - 效果：准备程度越高 → 去除基础术语解释，只解释高难度术语
-
-2. 您阅读自然科学论文的原因是？ {reading_settings.get('purpose', 'B')}
-   - A：目标驱动者: 为完成特定任务（如作业、比赛）而阅读，追求高效和直接
-     * 在论文解读过程中，专注于文章概念和核心知识点的解释
-   - B：知识探索者: 受学科兴趣驱动，希望拓宽知识面，不急于求成，不追求深入理解
-     * 在论文解读部分应多联系学科内部相关知识和实际应用举例
-   - C：深度学习者: 为了深入理解并研究某一领域知识，论文知识之外，同时重视研究方法和应用
-     * 在论文解读部分应当侧重于论文最前沿最尖端的技术部分，对论文解读透彻而详细
-   - D：科学了解者：希望通过论文解读提升个人科学素养和整体科学感知能力
-     * 在论文解读部分注重用户科学素养和科学感知能力的培养，解读内容侧重该部分
-
-3. 您愿意在多长时间内解读一篇自然科学论文？ {reading_settings.get('time', 'B')}
-   - A：10分钟内
-     * 解读简短、精炼
-   - B：10-30分钟内
-     * 长度适中、细节适当
-   - C：30分钟及以上
-     * 解读详细、内容全面
-
-4. 您喜好的自然科学论文解读风格与方式是？ {reading_settings.get('style', 'C')}
-   - A：生动形象，语言偏口语化，能联系生活中最简单的例子和类比解读论文
-     * 在论文解读过程中，专注于口语化表达和举例、类比
-   - B：量化解读，尽量通过数据和公式解读论文
-     * 在论文解读部分应多联系文章中的公式和数据
-   - C：专业解读，通过较为正式的语言和专业严谨的表达解读论文，对论文内容稍作调整
-     * 采用严谨的表达
-   - D：原汁原味，保留原文的表达风格和表述方式，接受长难句、专业术语解读方式
-     * 在论文解读部分采用高难度、高学术性，类似于专业学术论文的风格进行解读
-   - E：逐步推导，通过问题引入的方式，类似于课堂教学的方式逐步介绍知识，强调互动性
-     * 在论文解读部分多采用疑问的方式，通过问题，像课堂一样引导教导用户
-
-5. 您喜好的自然科学论文解读深度是？ {reading_settings.get('depth', 'B')}
-   - A：简洁概括
-     * 在论文解读的论文概述部分中，使用2000字左右概括
-   - B：平衡详细
-     * 在论文解读的论文概述部分中，使用4000字左右概括
-   - C：详细深入
-     * 在论文解读的论文概述部分中，使用6000字左右概括
-
-6. 您希望读后自测部分包含哪些内容？（可多选） {reading_settings.get('test_type', ['A'])}
-   - A：相关定义填空题
-   - B：易错易混选择题
-   - C：公式逻辑默写题
-
-7. 您偏好的图表形式是？（可多选） {reading_settings.get('chart_types', ['A'])}
-   - A：思维导图（树状）
-   - B：流程图与逻辑图
-   - C：表格
-   - D：统计图（折线图、柱状图等）
-
-请严格根据以上设置调整您的解读，特别是每个选项的具体要求。确保解读内容与用户的阅读习惯设置完全匹配，以提供个性化的论文解读体验。
-"""
-    
-    # 构建用户画像和历史记录描述
+    # 用户阅读习惯与用户画像描述（按内容记忆化，相同设置的用户复用）
+    reading_habits_context = prompts.reading_habits_context(language, reading_settings)
     user_context = ""
     if user_data and questionnaire:
-        if language == 'en':
-            user_context = f"""
-User Profile Analysis:
-1. Knowledge Reserve: {profile_analysis.get('知识储备', {})}
-2. Learning Style Preferences: {profile_analysis.get('学习方式偏好', {})}
-3. Knowledge Framework Form: {profile_analysis.get('知识框架形式', '')}
-4. Ability Level: {profile_analysis.get('能力水平', {})}
-5. Scientific Discrimination Ability: {profile_analysis.get('科学辨伪能力', '')}
-6. Reading Focus: {profile_analysis.get('阅读关注点', '')}
-7. Inquiry Tendency: {profile_analysis.get('探究倾向', '')}
-"""
-        else:
-            user_context = f"""
-用户画像分析：
-1. 知识储备：{profile_analysis.get('知识储备', {})}
-2. 学习方式偏好：{profile_analysis.get('学习方式偏好', {})}
-3. 知识框架形式：{profile_analysis.get('知识框架形式', '')}
-4. 能力水平：{profile_analysis.get('能力水平', {})}
-5. 科学辨伪能力：{profile_analysis.get('科学辨伪能力', '')}
-6. 阅读关注点：{profile_analysis.get('阅读关注点', '')}
-7. 探究倾向：{profile_analysis.get('探究倾向', '')}
-"""
+        profile = get_profile(user_data)
+        user_context = prompts.user_context(language, profile['stamp'], lambda: profile['analysis'])
     
     # 构建历史记录描述
-    history_context = ""
-    if history and len(history) > 0:
-        if language == 'en':
-            history_context = "Previous reading history (especially paper subjects and keywords) can help illustrate the user's reading interests and preferences:\n"
-            for i, item in enumerate(history[:3]):  # 取最近3条
-                history_context += f"{i+1}. {item.get('paper_content', '')[:100]}...\n"
-        else:
-            history_context = "过往阅读历史（尤其是论文的科目和关键词）可以帮助说明用户的阅读兴趣和阅读类型偏好：\n"
-            for i, item in enumerate(history[:3]):  # 取最近3条
-                history_context += f"{i+1}. {item.get('paper_content', '')[:100]}...\n"
-    
-    # 构建完整的用户提示
-    if language == 'en':
-        user_prompt = f"""
-a) The user is a high school student who needs to interpret a natural science academic paper
-b) The specific personalized interpretation settings, past reading data, personal natural science knowledge framework questionnaire, and the paper file for this interpretation have been transmitted. Please generate an interpretation that meets all personalized needs based on the user's input paper.
-c) To help improve the user's knowledge framework, focus on the weak points of the user's knowledge framework during interpretation, leverage the user's strengths in natural sciences, and focus on cultivating the user's interest in natural sciences. Please focus on the user's knowledge framework, reflect in the interpretation the improvement of the user's natural science knowledge framework, pay attention to cultivating the user's ability to strengthen weak disciplines, respect existing strengths, focus on personalized interpretation methods, and require attention to the internal connections of the five major disciplines of natural sciences involved in the paper
-d) The user's past reading history, especially the subjects and keywords of papers, can help illustrate the user's reading interests and preferences.
-e) When interpreting, sentences should not be lengthy; they should be short and clear
-f) At the beginning of the interpretation content, please provide three paper-related keywords with both Chinese and English output.
-g) Divide the interpretation content into logical sections with clear subtitles. The final output should be divided into: Paper Core Overview (Research Background and Purpose, Research Methods and Theory, Research Findings and Significance, and this part must be clear and detailed), Terminology Interpretation Section (not brief, explain more high-difficulty terms), Self-Assessment Questions(answers must be given at the end of the part), and Post-Reading Thinking Questions(must be high quality ones)
-h) Only interpret the paper content; no additional content needs to be generated
-i) The generated interpretation must be in English. (If the user's web language is set to Chinese, the interpretation output should be in Chinese)
-j) The interpretation must end with the reference: "Interpretation content generated by DeepSeek AI, for reference only."
-
-User Reading Habits:
-{reading_habits_context}
-
-User Context:
-{user_context}
-
-{history_context}
-
-Paper Content:
-{paper_content[:3000]}
-
-Please generate the interpretation:
-"""
-    else:
-        user_prompt = f"""
-a) 用户是一位高中生，需要解读一篇自然科学学术论文
-b) 其具体个性化解读方式设置数据、过往阅读数据、个人自然科学知识框架问卷、本次解读的论文文件已经传送，请根据用户输入的论文，生成一篇符合所有个性化需求的解读内容。
-c) 为了帮助完善用户的知识框架，可以在解读时注重用户知识框架的薄弱点，并发挥用户在自然科学方面的长处，着重引导培养用户在自然科学方面的兴趣。请重点关注用户的知识框架，在解读中体现出完善用户自然科学知识框架、注重培养用户增强薄弱学科能力、尊重现有长处，关注个性化解读方式，要求注重论文涉及的自然科学五大学科内部联系
-d) 用户的过往阅读历史，尤其是论文的科目和关键词，可以帮助说明用户的阅读兴趣和阅读类型偏好。
-e) 解读时，句子不能冗长， 要求简短、清晰
-f) 请在解读内容的开头提供三个论文相关的关键词，中英双语输出这些关键词。
-g) 尽可能逻辑清晰地分出小标题，有条理地分开解读内容的各部分。最终输出的内容要分为论文核心概述（研究背景与目的、研究方法与理论、研究发现与意义，该部分必须详细解释透彻）、术语解读部分（不要简短，多解释一些高难度术语）、自测小问题（必须要在该部分后面附上题目答案用于自测）、读后思考问题（质量要高）
-h) 只进行论文内容的解读，不需要额外生成其他内容
-i) 生成的解读内容需要是中文。（如果用户网页语言设置为英文，解读输出为英文）
-j) 解读的末尾必须有参考字样：解读内容由DeepSeek AI生成，仅供参考
-
-用户阅读习惯：
-{reading_habits_context}
-
-用户画像：
-{user_context}
-
-{history_context}
-
-论文内容：
-{paper_content[:3000]}
-
-请开始生成解读：
-"""
+    history_context = prompts.history_context(language, history)
+    
+    # 构建完整的用户提示，只有论文内容需要每次拼接
+    user_prompt = prompts.interpretation_user_prompt(
+        language, reading_habits_context, user_context, history_context,
+        paper_content[:paper_limit]
+    )
     
     # 如果有聊天历史，添加到消息中
     messages = [{"role": "system", "content": system_prompt}]
@@ -627,11 +423,6 @@ j) 解读的末尾必须有参考字样：解读内容由DeepSeek AI生成，仅
     
     messages.append({"role": "user", "content": user_prompt})
     
-    headers = {
-        'Authorization': f'Bearer {DEEPSEEK_API_KEY}',
-        'Content-Type': 'application/json'
-    }
-    
     # 根据解读深度设置最大token数
     depth_settings = {
         'A': 2000,  # 简洁概括
@@ -641,38 +432,96 @@ j) 解读的末尾必须有参考字样：解读内容由DeepSeek AI生成，仅
     
     max_tokens = depth_settings.get(reading_settings.get('depth', 'B'), 4000)
     
-    payload = {
-        'model': 'deepseek-chat',
-        'messages': messages,
-        'temperature': 0.7,
-        'max_tokens': max_tokens,
-        'stream': False
-    }
-    
-    try:
-        # 增加超时时间到120秒
-        response = requests.post(DEEPSEEK_API_URL, json=payload, headers=headers, timeout=150)
-        response.raise_for_status()
-        result = response.json()
-        
-        if 'choices' in result and len(result['choices']) > 0:
-            return result['choices'][0]['message']['content']
-        else:
-            raise ValueError("No response from DeepSeek API")
-            
-    except requests.exceptions.Timeout:
-        logger.error("DeepSeek API请求超时")
-        raise Exception("AI处理超时，请稍后重试、缩短文本长度或检查网络连接")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"DeepSeek API error: {e}")
-        # 提供更具体的错误信息
-        if "Read timed out" in str(e):
-            raise Exception("API响应超时，请稍后重试或减少文本长度")
-        elif "Connection refused" in str(e):
-            raise Exception("无法连接到API服务器，请检查网络连接")
-        else:
-            raise Exception(f"API调用失败: {str(e)}")
-        
+    return messages, max_tokens
+
+def call_deepseek_chat(messages, max_tokens, temperature=0.7, timeout=150, **options):
+    """调用DeepSeek API（非流式），返回生成的文本"""
+    return llm_client.chat(messages, max_tokens, temperature=temperature, timeout=timeout, **options)
+
+def condense_long_paper(paper_content, user_settings, language='zh'):
+    """长文档模式的map阶段：分章节并发摘要全文，返回 (压缩后的全文, 分阶段报告)"""
+    reading_settings = user_settings.get('reading', {}) if user_settings else {}
+    return condense_paper(
+        paper_content,
+        lambda messages, max_tokens: call_deepseek_chat(messages, max_tokens, temperature=0.3, timeout=120),
+        depth=reading_settings.get('depth', 'B'),
+        language=language,
+        max_workers=LONG_DOCUMENT_CONCURRENCY,
+        chunk_chars=LONG_DOCUMENT_CHUNK_CHARS
+    )
+
+def stream_deepseek_chat(messages, max_tokens, temperature=0.7, timeout=150):
+    """以流式模式调用DeepSeek API，逐块产出生成的文本"""
+    return llm_client.stream_chat(messages, max_tokens, temperature=temperature, timeout=timeout)
+
+def sse_event(data, event=None):
+    """格式化一条Server-Sent Events消息"""
+    message = f"event: {event}\n" if event else ""
+    message += f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return message
+
+def is_flag_set(value):
+    """判断请求中的开关参数（stream、no_cache等）是否开启"""
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def sse_response(generator):
+    """把事件生成器包装成SSE响应"""
+    return Response(generator, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# 用户画像分析逻辑的版本，修改分析规则时加1，启动时会为所有用户重新计算画像
+PROFILE_VERSION = 1
+
+KNOWLEDGE_STRUCTURE_MAP = {
+    'A': '线性递进式（注重知识深度递进）',
+    'B': '网络联系式（注重学科间联系）',
+    'C': '独立存储式（注重学科独立性）',
+    'D': '零散工具箱式（知识框架尚未建立）'
+}
+
+EVALUATION_CRITERIA_MAP = {
+    'A': '学术语言表达',
+    'B': '科学技术方法',
+    'C': '实验数据',
+    'D': '科学理论'
+}
+
+CLIMATE_QUESTION_MAP = {
+    'A': '关注社会影响与后果',
+    'B': '关注现象成因与机制',
+    'C': '关注技术解决方案',
+    'D': '关注理论推导与学科联系',
+    'E': '关注类似现象对比'
+}
+
+INTERNATIONAL_GRADE_LEVELS = {'A': '9年级', 'B': '10年级', 'C': '11年级', 'D': '12年级'}
+DOMESTIC_GRADE_LEVELS = {'A': '高一', 'B': '高二', 'C': '高三', 'D': '高三'}
+
+INTEREST_SUBJECTS = {
+    'physics': '物理学',
+    'biology': '生物学/医学',
+    'chemistry': '化学',
+    'geology': '地理地质学',
+    'astronomy': '天体天文学'
+}
+
+LEARNING_FREQUENCY_MAP = {
+    'A': '较高（经常学习课外知识）',
+    'B': '中等（偶尔学习）',
+    'C': '基础（较少学习）'
+}
+
+# 学科问题的正确答案 -> 学科名称
+SUBJECT_QUESTIONS = {
+    'physics_question': ('B', '物理学'),
+    'chemistry_question': ('B', '化学'),
+    'biology_question': ('B', '生物学'),
+    'astronomy_question': ('B', '天文学'),
+    'geology_question': ('C', '地球科学')
+}
+
 def analyze_user_profile(user_data):
     """根据问卷数据分析用户画像"""
     questionnaire = user_data.get('questionnaire', {})
@@ -695,13 +544,7 @@ def analyze_user_profile(user_data):
     
     # 3. 分析知识框架形式
     if 'knowledge_structure' in questionnaire:
-        structure_map = {
-            'A': '线性递进式（注重知识深度递进）',
-            'B': '网络联系式（注重学科间联系）',
-            'C': '独立存储式（注重学科独立性）',
-            'D': '零散工具箱式（知识框架尚未建立）'
-        }
-        profile['知识框架形式'] = structure_map.get(questionnaire['knowledge_structure'], '未知')
+        profile['知识框架形式'] = KNOWLEDGE_STRUCTURE_MAP.get(questionnaire['knowledge_structure'], '未知')
     
     # 4. 分析能力水平
     if 'scientific_abilities' in questionnaire:
@@ -729,25 +572,12 @@ def analyze_user_profile(user_data):
         if 'E' in criteria:
             profile['阅读关注点'] = '凭感觉判断（缺乏系统评价标准）'
         elif criteria:
-            criteria_map = {
-                'A': '学术语言表达',
-                'B': '科学技术方法',
-                'C': '实验数据',
-                'D': '科学理论'
-            }
             main_criteria = criteria[0] if criteria else 'E'
-            profile['阅读关注点'] = criteria_map.get(main_criteria, '多样化的评价标准')
+            profile['阅读关注点'] = EVALUATION_CRITERIA_MAP.get(main_criteria, '多样化的评价标准')
     
     # 7. 分析探究倾向
     if 'climate_question' in questionnaire:
-        climate_map = {
-            'A': '关注社会影响与后果',
-            'B': '关注现象成因与机制',
-            'C': '关注技术解决方案',
-            'D': '关注理论推导与学科联系',
-            'E': '关注类似现象对比'
-        }
-        profile['探究倾向'] = climate_map.get(questionnaire['climate_question'], '未知')
+        profile['探究倾向'] = CLIMATE_QUESTION_MAP.get(questionnaire['climate_question'], '未知')
     
     return profile
 
@@ -767,13 +597,11 @@ def analyze_knowledge_reserve(questionnaire):
         if system == 'A':  # 国际体系
             knowledge_reserve['课内知识']['体系'] = '国际课程体系'
             # 根据年级推断课程内容
-            grade_levels = {'A': '9年级', 'B': '10年级', 'C': '11年级', 'D': '12年级'}
-            knowledge_reserve['课内知识']['年级'] = grade_levels.get(grade, '未知')
+            knowledge_reserve['课内知识']['年级'] = INTERNATIONAL_GRADE_LEVELS.get(grade, '未知')
             knowledge_reserve['课内知识']['说明'] = '参考AP/AL/DSE/IGCSE等国际课程自然科学考纲'
         else:  # 普高体系
             knowledge_reserve['课内知识']['体系'] = '国内普高体系'
-            grade_levels = {'A': '高一', 'B': '高二', 'C': '高三', 'D': '高三'}
-            knowledge_reserve['课内知识']['年级'] = grade_levels.get(grade, '未知')
+            knowledge_reserve['课内知识']['年级'] = DOMESTIC_GRADE_LEVELS.get(grade, '未知')
             knowledge_reserve['课内知识']['说明'] = '参考人教版教材自然科学课程内容'
     
     # 2. 课外知识储备（根据兴趣程度和学习频率）
@@ -784,42 +612,15 @@ def analyze_knowledge_reserve(questionnaire):
         # 兴趣程度影响课外知识储备
         for subject, score in interests.items():
             if score and int(score) >= 4:  # 4-5分表示高兴趣
-                subject_cn = {
-                    'physics': '物理学',
-                    'biology': '生物学/医学',
-                    'chemistry': '化学',
-                    'geology': '地理地质学',
-                    'astronomy': '天体天文学'
-                }.get(subject, subject)
+                subject_cn = INTEREST_SUBJECTS.get(subject, subject)
                 knowledge_reserve['课外知识'][subject_cn] = '较高（兴趣浓厚）'
         
         # 学习频率影响整体课外知识储备
-        freq_map = {
-            'A': '较高（经常学习课外知识）',
-            'B': '中等（偶尔学习）',
-            'C': '基础（较少学习）'
-        }
-        knowledge_reserve['课外知识']['整体水平'] = freq_map.get(learning_freq, '未知')
+        knowledge_reserve['课外知识']['整体水平'] = LEARNING_FREQUENCY_MAP.get(learning_freq, '未知')
     
     # 3. 本科预备水平（根据学科问题正确率）
-    correct_answers = {
-        'physics_question': 'B',
-        'chemistry_question': 'B',
-        'biology_question': 'B',
-        'astronomy_question': 'B',
-        'geology_question': 'C'
-    }
-    
-    for question, correct_answer in correct_answers.items():
+    for question, (correct_answer, subject_cn) in SUBJECT_QUESTIONS.items():
         user_answer = questionnaire.get(question)
-        subject = question.split('_')[0]
-        subject_cn = {
-            'physics': '物理学',
-            'chemistry': '化学',
-            'biology': '生物学',
-            'astronomy': '天文学',
-            'geology': '地球科学'
-        }.get(subject, subject)
         
         if user_answer == correct_answer:
             knowledge_reserve['本科预备水平'][subject_cn] = '达到本科预备水平'
@@ -830,18 +631,56 @@ def analyze_knowledge_reserve(questionnaire):
     
     return knowledge_reserve
 
+def build_profile(questionnaire):
+    """
+    问卷写入时预先计算用户画像，与问卷一起保存在用户记录中
+    stamp 由分析逻辑版本和问卷内容哈希组成，问卷不变时不会变化
+    """
+    questionnaire = questionnaire or {}
+    encoded = json.dumps(questionnaire, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return {
+        'version': PROFILE_VERSION,
+        'stamp': f"{PROFILE_VERSION}:{content_hash(encoded)[:16]}",
+        'analysis': analyze_user_profile({'questionnaire': questionnaire})
+    }
+
+def get_profile(user_data):
+    """读取预先计算的用户画像（{'version', 'stamp', 'analysis'}），缺失或版本过期时现场计算"""
+    profile = user_data.get('profile')
+    if profile and profile.get('version') == PROFILE_VERSION:
+        return profile
+    return build_profile(user_data.get('questionnaire', {}))
+
+def get_profile_analysis(user_data):
+    """用户画像分析结果（只读，不要修改返回的字典）"""
+    return get_profile(user_data)['analysis']
+
+def backfill_profiles():
+    """为没有画像或画像版本过期的用户重新计算画像（每个PROFILE_VERSION只执行一次）"""
+    def apply(user):
+        profile = user.get('profile')
+        if profile and profile.get('version') == PROFILE_VERSION:
+            return False
+        user['profile'] = build_profile(user.get('questionnaire', {}))
+        return True
+
+    updated = user_store.update_all(apply, marker=('profile_version', str(PROFILE_VERSION)))
+    if updated:
+        logger.info(f"已为 {updated} 个用户重新计算画像（版本 {PROFILE_VERSION}）")
+
+backfill_profiles()
 
 # 路由定义
 @app.route('/')
 def index():
     if 'user_email' in session:
-        return render_template('index.html', adobe_client_id=ADOBE_CLIENT_ID)
+        return revalidate(make_response(render_template('index.html', adobe_client_id=ADOBE_CLIENT_ID)))
     else:
         return redirect(url_for('login_page'))
 
 @app.route('/login', methods=['GET'])
 def login_page():
-    return render_template('index.html', adobe_client_id=ADOBE_CLIENT_ID)
+    return revalidate(make_response(render_template('index.html', adobe_client_id=ADOBE_CLIENT_ID)))
 
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -854,11 +693,15 @@ def register():
     if not all([email, username, password]):
         return jsonify({'success': False, 'message': '请填写所有必填项'}), 400
     
-    success, result = create_user(email, username, password, questionnaire)
+    try:
+        success, result = create_user(email, username, password, questionnaire)
+    except HasherBusy as e:
+        return password_hasher_busy(e)
     
     if success:
         session['user_email'] = email
         session['user_id'] = result['id']
+        session.summary = user_summary(result)
         return jsonify({'success': True, 'user': {
             'email': email,
             'username': username,
@@ -876,17 +719,29 @@ def login():
     if not all([email, password]):
         return jsonify({'success': False, 'message': '请填写邮箱和密码'}), 400
     
+    allowed, scope, retry_after = rate_limiter.check('login', [('account', email.strip().lower())])
+    if not allowed:
+        return rate_limiter.rejection('login', scope, retry_after)
+    
     user = get_user_by_email(email)
     
-    if user and check_password_hash(user['password_hash'], password):
+    try:
+        ok, new_hash = password_hasher.verify(user['password_hash'], password) if user else (False, None)
+    except HasherBusy as e:
+        return password_hasher_busy(e)
+    
+    if ok:
+        session.clear()
         session['user_email'] = email
         session['user_id'] = user['id']
+        session.summary = user_summary(user)
         
-        # 更新最后登录时间
-        users = load_users()
-        if email in users:
-            users[email]['last_login'] = datetime.now().isoformat()
-            save_users(users)
+        # 更新最后登录时间；密码哈希的算法或成本与当前配置不同时一并保存新哈希
+        fields = {'last_login': datetime.now().isoformat()}
+        if new_hash:
+            fields['password_hash'] = new_hash
+            logger.info(f"用户 {email} 的密码哈希已迁移为 {password_hasher.method}")
+        write_behind.update_fields(email, fields)
         
         return jsonify({'success': True, 'user': {
             'email': email,
@@ -896,15 +751,29 @@ def login():
     else:
         return jsonify({'success': False, 'message': '邮箱或密码错误'}), 401
 
+def password_hasher_busy(error):
+    """密码哈希繁忙时的响应：带 Retry-After 的503"""
+    logger.warning(f"{error}，{error.retry_after}秒后可重试")
+    response = jsonify({
+        'success': False,
+        'message': f'登录请求较多，请在{error.retry_after}秒后重试',
+        'retry_after': error.retry_after
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
 @app.route('/api/logout', methods=['POST'])
 def logout():
     session.clear()
     return jsonify({'success': True})
 
 @app.route('/api/guest', methods=['POST'])
+@rate_limiter.limit('guest_login')
 def guest_login():
     """游客登录"""
     guest_id = f"guest_{uuid.uuid4().hex[:8]}"
+    session.clear()
     session['user_email'] = guest_id
     session['user_id'] = guest_id
     session['is_guest'] = True
@@ -920,7 +789,7 @@ def get_settings():
     if 'user_email' not in session or session.get('is_guest'):
         return jsonify({'success': False, 'message': '未登录'}), 401
     
-    user = get_user_by_email(session['user_email'])
+    user = get_user_summary()
     if not user:
         return jsonify({'success': False, 'message': '用户不存在'}), 404
     
@@ -937,65 +806,51 @@ def update_settings():
     else:
         return jsonify({'success': False, 'message': '更新失败'}), 400
 
-@app.route('/api/interpret', methods=['POST'])
-def interpret():
-    if 'user_email' not in session:
-        return jsonify({'success': False, 'message': '未登录'}), 401
-
-    file = request.files.get('file')
-    text = request.form.get('text', '')
-    language = request.form.get('language', 'zh')  # 添加语言参数，默认为中文
-
-    if not file and not text.strip():
-        return jsonify({'success': False, 'message': '请上传文件或输入文本'}), 400
-
-    user = get_user_by_email(session['user_email'])
-    if not user:
-        return jsonify({'success': False, 'message': '用户不存在'}), 404
-
-    try:
-        paper_content = ""
-        file_info = {}
-        is_scanned_pdf = False
-        pdf_warning = ""
+def load_paper_content(upload, filename, text):
+    """
+    解析上传的文件（upload为落盘的SpooledUpload，为None时使用文本输入）
+    返回：(paper_content, file_info, is_scanned_pdf, pdf_warning, error)
+    error 为需要直接返回给客户端的 (结果, 状态码)，解析成功时为None
+    """
+    paper_content = ""
+    file_info = {}
+    is_scanned_pdf = False
+    pdf_warning = ""
+
+    if upload is not None:
+        filename = secure_filename(filename)
+        file_ext = os.path.splitext(filename)[1].lower()
         
-        if file and file.filename:
-            filename = secure_filename(file.filename)
-            file_ext = os.path.splitext(filename)[1].lower()
+        file_info = {
+            'filename': filename,
+            'size': upload.size,
+            'extension': file_ext
+        }
+        
+        if file_ext == '.pdf':
+            # 检查PDF是否是扫描件并解析（相同文件直接使用缓存结果）
+            pdf_result = analyze_pdf(upload)
             
-            # 重置文件指针
-            file.seek(0)
-            file_bytes = file.read()
-            file_info = {
-                'filename': filename,
-                'size': len(file_bytes),
-                'extension': file_ext
-            }
+            if pdf_result['is_scanned']:
+                is_scanned_pdf = True
+                pdf_warning = f"检测到可能是扫描件: {pdf_result['scan_message']}"
+                logger.warning(f"扫描件警告: {pdf_warning}")
             
-            if file_ext == '.pdf':
-                # 先检查PDF是否是扫描件
-                is_scanned, scan_message = is_pdf_scanned(file_bytes)
-                
-                if is_scanned:
-                    is_scanned_pdf = True
-                    pdf_warning = f"检测到可能是扫描件: {scan_message}"
-                    logger.warning(f"扫描件警告: {pdf_warning}")
-                
-                # 使用高级PDF解析
-                success, result = extract_text_from_pdf_advanced(file_bytes)
+            # 使用高级PDF解析
+            success, result = pdf_result['success'], pdf_result['text']
+            
+            if success:
+                paper_content = result
+                logger.info(f"PDF解析成功，提取文本长度: {len(paper_content)}")
+                # 记录提取的文本内容（前100个字符）
+                logger.info(f"提取的文本内容（前100字符）: {paper_content[:100]}...")
+            else:
+                # 解析失败
+                logger.error(f"PDF解析失败: {result}")
                 
-                if success:
-                    paper_content = result
-                    logger.info(f"PDF解析成功，提取文本长度: {len(paper_content)}")
-                    # 记录提取的文本内容（前100个字符）
-                    logger.info(f"提取的文本内容（前100字符）: {paper_content[:100]}...")
-                else:
-                    # 解析失败
-                    logger.error(f"PDF解析失败: {result}")
-                    
-                    if is_scanned_pdf:
-                        # 如果是扫描件，提供更详细的建议
-                        paper_content = f"""
+                if is_scanned_pdf:
+                    # 如果是扫描件，提供更详细的建议
+                    paper_content = f"""
 {pdf_warning}
 
 扫描件PDF无法直接提取文字，因为它们是图片格式。
@@ -1008,158 +863,499 @@ def interpret():
 
 如果您有可编辑的PDF版本，请重新上传。
 """
-                    else:
-                        paper_content = result
-                    
-            elif file_ext == '.docx':
-                try:
-                    # 使用python-docx读取DOCX文件
-                    from io import BytesIO
-                    import docx
-                    
-                    docx_file = BytesIO(file_bytes)
+                else:
+                    paper_content = result
+                
+        elif file_ext == '.docx':
+            try:
+                # 使用python-docx读取DOCX文件（从落盘文件按需读取）
+                import docx
+                
+                with upload.open() as docx_file:
                     doc = docx.Document(docx_file)
+                
+                for paragraph in doc.paragraphs:
+                    if paragraph.text.strip():
+                        paper_content += paragraph.text + "\n"
+                
+                if not paper_content.strip():
+                    paper_content = "DOCX文件已上传，但未能提取到文本内容。"
                     
-                    for paragraph in doc.paragraphs:
-                        if paragraph.text.strip():
-                            paper_content += paragraph.text + "\n"
-                    
-                    if not paper_content.strip():
-                        paper_content = "DOCX文件已上传，但未能提取到文本内容。"
-                        
-                except Exception as docx_error:
-                    logger.error(f"DOCX解析错误: {docx_error}")
-                    paper_content = f"DOCX文件处理失败: {str(docx_error)}"
-                    
-            elif file_ext == '.txt':
-                # 尝试多种编码读取文本文件
-                encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1', 'iso-8859-1']
+            except Exception as docx_error:
+                logger.error(f"DOCX解析错误: {docx_error}")
+                paper_content = f"DOCX文件处理失败: {str(docx_error)}"
+                
+        elif file_ext == '.txt':
+            # 尝试多种编码读取文本文件
+            encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1', 'iso-8859-1']
+            with upload.mapped() as data:
                 for encoding in encodings:
                     try:
-                        paper_content = file_bytes.decode(encoding)
+                        paper_content = str(data, encoding)
                         logger.info(f"文本文件使用 {encoding} 编码成功解码")
                         break
                     except UnicodeDecodeError:
                         continue
+            
+            if not paper_content:
+                paper_content = "无法解码文本文件，请确保文件编码为UTF-8或GBK"
                 
-                if not paper_content:
-                    paper_content = "无法解码文本文件，请确保文件编码为UTF-8或GBK"
-                    
-            else:
-                # 对于其他格式，尝试作为文本读取
-                encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1']
+        else:
+            # 对于其他格式，尝试作为文本读取
+            encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1']
+            with upload.mapped() as data:
                 for encoding in encodings:
                     try:
-                        paper_content = file_bytes.decode(encoding, errors='ignore')
+                        paper_content = str(data, encoding, 'ignore')
                         if len(paper_content) > 100:  # 有足够内容才认为成功
                             logger.info(f"文件使用 {encoding} 编码解码成功")
                             break
                     except:
                         continue
-                
-                if not paper_content or len(paper_content) < 100:
-                    paper_content = f"不支持的文件格式: {file_ext}。请上传PDF、DOCX或TXT文件。文件名: {filename}"
-        
-        else:
-            paper_content = text
-            logger.info(f"使用文本输入，长度: {len(paper_content)}")
-            # 记录输入的文本内容（前100个字符）
-            logger.info(f"输入的文本内容（前100字符）: {paper_content[:100]}...")
-
-        # 记录文件信息
-        if file_info:
-            logger.info(f"文件信息: {file_info}")
-
-        # 检查是否是需要直接返回的错误信息
-        if "PDF解析失败" in paper_content or "不支持的文件格式" in paper_content or "无法解码" in paper_content:
-            logger.warning(f"文件处理失败: {paper_content[:100]}")
-            return jsonify({
-                'success': False, 
-                'message': 'PDF解析出错，请换一篇论文哦',
-                'file_info': file_info,
-                'is_scanned': is_scanned_pdf
-            }), 400
-
-        # 如果是扫描件提示信息，直接返回给用户
-        if "扫描件PDF无法直接提取文字" in paper_content or "检测到可能是扫描件" in paper_content:
-            return jsonify({
-                'success': False,
-                'message': 'PDF解析出错，请换一篇论文哦',
-                'file_info': file_info,
-                'is_scanned': True,
-                'suggestion': '请上传可编辑的PDF或使用OCR工具转换扫描件'
-            }), 400
+            
+            if not paper_content or len(paper_content) < 100:
+                paper_content = f"不支持的文件格式: {file_ext}。请上传PDF、DOCX或TXT文件。文件名: {filename}"
+    
+    else:
+        paper_content = text
+        logger.info(f"使用文本输入，长度: {len(paper_content)}")
+        # 记录输入的文本内容（前100个字符）
+        logger.info(f"输入的文本内容（前100字符）: {paper_content[:100]}...")
+
+    # 记录文件信息
+    if file_info:
+        logger.info(f"文件信息: {file_info}")
+
+    # 检查是否是需要直接返回的错误信息
+    if "PDF解析失败" in paper_content or "不支持的文件格式" in paper_content or "无法解码" in paper_content:
+        logger.warning(f"文件处理失败: {paper_content[:100]}")
+        return paper_content, file_info, is_scanned_pdf, pdf_warning, ({
+            'success': False, 
+            'message': 'PDF解析出错，请换一篇论文哦',
+            'file_info': file_info,
+            'is_scanned': is_scanned_pdf
+        }, 400)
+
+    # 如果是扫描件提示信息，直接返回给用户
+    if "扫描件PDF无法直接提取文字" in paper_content or "检测到可能是扫描件" in paper_content:
+        return paper_content, file_info, is_scanned_pdf, pdf_warning, ({
+            'success': False,
+            'message': 'PDF解析出错，请换一篇论文哦',
+            'file_info': file_info,
+            'is_scanned': True,
+            'suggestion': '请上传可编辑的PDF或使用OCR工具转换扫描件'
+        }, 400)
+
+    if not paper_content or paper_content.strip() == "":
+        return paper_content, file_info, is_scanned_pdf, pdf_warning, ({
+            'success': False, 
+            'message': '文件内容为空或无法读取',
+            'file_info': file_info,
+            'is_scanned': is_scanned_pdf
+        }, 400)
+
+    return paper_content, file_info, is_scanned_pdf, pdf_warning, None
 
+@app.route('/api/interpret', methods=['POST'])
+@rate_limiter.limit('interpret')
+@admission.limit('interpret')
+def interpret():
+    if 'user_email' not in session:
+        return jsonify({'success': False, 'message': '未登录'}), 401
+
+    # 解析multipart请求体（上传的文件在解析时分块落盘并计算哈希）
+    with metrics.timed('upload_read'):
+        file = request.files.get('file')
+    text = request.form.get('text', '')
+    language = request.form.get('language', 'zh')  # 添加语言参数，默认为中文
+
+    if not file and not text.strip():
+        return jsonify({'success': False, 'message': '请上传文件或输入文本'}), 400
+
+    user = get_user_by_email(session['user_email'])
+    if not user:
+        return jsonify({'success': False, 'message': '用户不存在'}), 404
 
-        if not paper_content or paper_content.strip() == "":
+    upload = None
+    try:
+        filename = None
+        if file and file.filename:
+            # 上传内容已在解析请求时落盘并计算哈希
+            upload = spool_upload(file, app.config['UPLOAD_FOLDER'])
+            filename = file.filename
+
+        long_document = is_flag_set(request.form.get('long_document'))
+        use_cache = not is_flag_set(request.form.get('no_cache'))
+
+        # 异步模式：立即返回任务ID，解析与AI解读在后台任务中完成
+        if is_flag_set(request.form.get('async')):
+            email = session['user_email']
+            # 临时文件转交给后台任务，任务结束时删除
+            job_upload = upload.detach() if upload else None
+            upload = None
+            job_id = job_queue.submit(email, lambda: run_interpretation_job(
+                email, job_upload, filename, text, language, long_document, use_cache
+            ))
             return jsonify({
-                'success': False, 
-                'message': '文件内容为空或无法读取',
-                'file_info': file_info,
-                'is_scanned': is_scanned_pdf
-            }), 400
+                'success': True,
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': url_for('get_job', job_id=job_id),
+                'events_url': url_for('job_events', job_id=job_id),
+                'queue': job_queue.stats()
+            }), 202
 
-        user_settings = user.get('settings', {})
-        history = user.get('reading_history', [])
+        try:
+            paper_content, file_info, is_scanned_pdf, pdf_warning, error = load_paper_content(upload, filename, text)
+        finally:
+            # 解析完成后立即删除临时文件（流式响应可能持续很久）
+            if upload:
+                upload.discard()
+        if error:
+            payload, status = error
+            return jsonify(payload), status
+
+        stream = is_flag_set(request.form.get('stream'))
+        long_document = long_document or \
+            (LONG_DOCUMENT_AUTO_CHARS > 0 and len(paper_content) > LONG_DOCUMENT_AUTO_CHARS)
+
+        # 查询解读结果缓存（no_cache=1 时跳过缓存，强制重新生成）
+        cache_key, cached_interpretation, prepare_messages = plan_interpretation(
+            user, paper_content, language, long_document, use_cache
+        )
+        if cached_interpretation is not None:
+            logger.info(f"解读结果缓存命中: {cache_key[:12]}")
+            result = finish_interpretation(
+                session['user_email'], paper_content, cached_interpretation,
+                file_info, is_scanned_pdf, pdf_warning
+            )
+            result['cached'] = True
+            if stream:
+                return sse_response(replay_interpretation(result))
+            return jsonify(result)
+
+        if stream:
+            return sse_response(stream_interpretation(
+                session['user_email'], prepare_messages,
+                paper_content, file_info, is_scanned_pdf, pdf_warning,
+                cache_key=cache_key
+            ))
 
         # 调用DeepSeek API
         try:
-            start_time = time.time()
-            # 记录传递给API的内容
-            logger.info(f"准备调用DeepSeek API，paper_content长度: {len(paper_content)}")
-            logger.info(f"paper_content前100字符: {paper_content[:100]}...")
-            # 传递问卷数据和用户设置
-            interpretation = call_deepseek_api(
-                user, 
-                paper_content, 
-                user_settings, 
-                history,
-                questionnaire=user.get('questionnaire', {}),
-                language=language  # 传递语言参数
+            result = generate_interpretation(
+                session['user_email'], prepare_messages,
+                paper_content, file_info, is_scanned_pdf, pdf_warning,
+                cache_key=cache_key
             )
-            logger.info(f"DeepSeek API调用完成，耗时: {time.time() - start_time:.2f}秒")
-            # 记录API返回的解读内容（前100个字符）
-            logger.info(f"API返回的解读内容（前100字符）: {interpretation[:100]}...")
         except Exception as api_error:
             logger.error(f"DeepSeek API调用失败: {api_error}")
             return jsonify({'success': False, 'message': f'AI处理失败: {str(api_error)}'}), 500
-        
-        history_item = {
-            'paper_content': paper_content[:500] + '...' if len(paper_content) > 500 else paper_content,
-            'interpretation': interpretation[:1000] + '...' if len(interpretation) > 1000 else interpretation,
-            'file_info': file_info,
-            'is_scanned': is_scanned_pdf,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        add_to_history(session['user_email'], history_item)
-
-        # 简化推荐搜索
-        recommendations = []
-
-        return jsonify({
-            'success': True,
-            'interpretation': interpretation,
-            'original_content': paper_content[:1000] + '...' if len(paper_content) > 1000 else paper_content,
-            'file_info': file_info,
-            'is_scanned': is_scanned_pdf,
-            'pdf_warning': pdf_warning if is_scanned_pdf else None,
-            'timestamp': datetime.now().isoformat()
-        })
+        return jsonify(result)
 
     except Exception as e:
         logger.error(f"Interpretation error: {e}")
+        if upload:
+            upload.discard()
         return jsonify({'success': False, 'message': f'处理失败: {str(e)}'}), 500
 
+def plan_interpretation(user, paper_content, language, long_document, use_cache=True):
+    """
+    查询解读结果缓存并准备消息构建函数
+    返回：(cache_key, cached_interpretation, prepare_messages)
+    prepare_messages() 返回 (messages, max_tokens, long_report)，长文档模式先压缩全文
+    """
+    user_settings = user.get('settings', {})
+    # 提示词只用到最近3条阅读历史
+    history = get_history(user['email'], limit=3) if user.get('email') else []
+
+    cache_key, cached_interpretation = None, None
+    if interpretation_cache.enabled and use_cache:
+        cache_key = interpretation_cache_key(
+            content_hash(paper_content.encode('utf-8')),
+            language,
+            user_settings,
+            get_profile_analysis(user),
+            mode='long' if long_document else 'standard'
+        )
+        cached_interpretation = interpretation_cache.get(cache_key)
+
+    def prepare_messages():
+        """构建解读消息；长文档模式先压缩全文，返回 (messages, max_tokens, long_report)"""
+        prompt_content, paper_limit, long_report = paper_content, 3000, None
+        if long_document:
+            with metrics.timed('long_document_map'):
+                prompt_content, long_report = condense_long_paper(paper_content, user_settings, language)
+            paper_limit = None
+        with metrics.timed('prompt_build'):
+            messages, max_tokens = build_interpretation_messages(
+                user,
+                prompt_content,
+                user_settings,
+                history,
+                questionnaire=user.get('questionnaire', {}),
+                language=language,
+                paper_limit=paper_limit
+            )
+        return messages, max_tokens, long_report
+
+    return cache_key, cached_interpretation, prepare_messages
+
+def generate_interpretation(email, prepare_messages, paper_content, file_info, is_scanned_pdf, pdf_warning, cache_key=None):
+    """
+    非流式解读：调用DeepSeek，写入缓存与阅读历史，返回解读结果（调用失败时抛出异常）
+    相同缓存键的解读正在生成时，等待并共享其结果
+    """
+    def generate():
+        start_time = time.time()
+        # 记录传递给API的内容
+        logger.info(f"准备调用DeepSeek API，paper_content长度: {len(paper_content)}")
+        logger.info(f"paper_content前100字符: {paper_content[:100]}...")
+        # 传递问卷数据和用户设置
+        messages, max_tokens, long_report = prepare_messages()
+        reduce_start = time.time()
+        interpretation = call_deepseek_chat(messages, max_tokens, temperature=0.7, timeout=150)
+        if long_report:
+            long_report['timings']['reduce'] = round(time.time() - reduce_start, 3)
+        logger.info(f"DeepSeek API调用完成，耗时: {time.time() - start_time:.2f}秒")
+        # 记录API返回的解读内容（前100个字符）
+        logger.info(f"API返回的解读内容（前100字符）: {interpretation[:100]}...")
+
+        if cache_key:
+            interpretation_cache.put(cache_key, interpretation)
+        return interpretation, long_report
+
+    if cache_key:
+        interpretation, long_report = interpretation_flights.do(cache_key, generate)
+    else:
+        interpretation, long_report = generate()
+
+    result = finish_interpretation(
+        email, paper_content, interpretation,
+        file_info, is_scanned_pdf, pdf_warning
+    )
+    if long_report:
+        result['long_document'] = long_report
+    return result
+
+def run_interpretation_job(email, upload, filename, text, language, long_document, use_cache):
+    """后台任务：解析文件并生成解读，失败时抛出 JobFailed（结果与同步接口的错误响应一致）"""
+    try:
+        user = get_user_by_email(email)
+        if not user:
+            raise JobFailed('用户不存在', {'success': False, 'message': '用户不存在'})
+        paper_content, file_info, is_scanned_pdf, pdf_warning, error = load_paper_content(upload, filename, text)
+    finally:
+        if upload:
+            upload.discard()
+    if error:
+        payload, _ = error
+        raise JobFailed(payload['message'], payload)
+
+    long_document = long_document or \
+        (LONG_DOCUMENT_AUTO_CHARS > 0 and len(paper_content) > LONG_DOCUMENT_AUTO_CHARS)
+    cache_key, cached_interpretation, prepare_messages = plan_interpretation(
+        user, paper_content, language, long_document, use_cache
+    )
+    if cached_interpretation is not None:
+        logger.info(f"解读结果缓存命中: {cache_key[:12]}")
+        result = finish_interpretation(
+            email, paper_content, cached_interpretation,
+            file_info, is_scanned_pdf, pdf_warning
+        )
+        result['cached'] = True
+        return result
+
+    try:
+        return generate_interpretation(
+            email, prepare_messages,
+            paper_content, file_info, is_scanned_pdf, pdf_warning,
+            cache_key=cache_key
+        )
+    except Exception as api_error:
+        logger.error(f"DeepSeek API调用失败: {api_error}")
+        message = f'AI处理失败: {str(api_error)}'
+        raise JobFailed(message, {'success': False, 'message': message})
+
+def finish_interpretation(email, paper_content, interpretation, file_info, is_scanned_pdf, pdf_warning):
+    """写入阅读历史并构建解读结果"""
+    history_item = {
+        'paper_content': paper_content[:500] + '...' if len(paper_content) > 500 else paper_content,
+        'interpretation': interpretation[:1000] + '...' if len(interpretation) > 1000 else interpretation,
+        'file_info': file_info,
+        'is_scanned': is_scanned_pdf,
+        'timestamp': datetime.now().isoformat()
+    }
+    
+    add_to_history(email, history_item)
+
+    # 简化推荐搜索
+    recommendations = []
+
+    return {
+        'success': True,
+        'interpretation': interpretation,
+        'original_content': paper_content[:1000] + '...' if len(paper_content) > 1000 else paper_content,
+        'file_info': file_info,
+        'is_scanned': is_scanned_pdf,
+        'pdf_warning': pdf_warning if is_scanned_pdf else None,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def replay_interpretation(result):
+    """以SSE形式返回已缓存的解读结果"""
+    yield sse_event({'file_info': result['file_info'], 'is_scanned': result['is_scanned']}, event='meta')
+    yield sse_event({'delta': result['interpretation']})
+    yield sse_event(result, event='done')
+
+def stream_interpretation(email, prepare_messages, paper_content, file_info, is_scanned_pdf, pdf_warning, cache_key=None):
+    """流式解读：逐块转发DeepSeek输出，结束后写入阅读历史
+    prepare_messages() 返回 (messages, max_tokens, long_report)，长文档模式的map阶段在其中完成
+    """
+    yield sse_event({'file_info': file_info, 'is_scanned': is_scanned_pdf}, event='meta')
+    
+    call, is_leader = interpretation_flights.acquire(cache_key) if cache_key else (None, True)
+    if not is_leader:
+        # 相同的解读正在由其他请求生成，等待完成后一次性返回
+        logger.info(f"合并进行中的相同解读请求: {cache_key[:12]}")
+        try:
+            interpretation, long_report = call.wait()
+        except Exception as api_error:
+            yield sse_event({'success': False, 'message': f'AI处理失败: {str(api_error)}'}, event='error')
+            return
+        if long_report:
+            yield sse_event(long_report, event='stage')
+        yield sse_event({'delta': interpretation})
+    else:
+        chunks = []
+        long_report = None
+        outcome, error = None, None
+        try:
+            messages, max_tokens, long_report = prepare_messages()
+            if long_report:
+                yield sse_event(long_report, event='stage')
+            
+            start_time = time.time()
+            first_token_time = None
+            for delta in stream_deepseek_chat(messages, max_tokens, timeout=150):
+                if first_token_time is None:
+                    first_token_time = time.time()
+                    logger.info(f"DeepSeek首个token耗时: {first_token_time - start_time:.2f}秒")
+                chunks.append(delta)
+                yield sse_event({'delta': delta})
+
+            interpretation = ''.join(chunks)
+            logger.info(f"DeepSeek API流式调用完成，耗时: {time.time() - start_time:.2f}秒")
+            if long_report:
+                long_report['timings']['reduce'] = round(time.time() - start_time, 3)
+            if cache_key:
+                interpretation_cache.put(cache_key, interpretation)
+            outcome = (interpretation, long_report)
+        except Exception as api_error:
+            error = api_error
+            logger.error(f"DeepSeek API流式调用失败: {api_error}")
+            yield sse_event({'success': False, 'message': f'AI处理失败: {str(api_error)}'}, event='error')
+            return
+        finally:
+            if call is not None:
+                if outcome is None and error is None:
+                    # 客户端在生成过程中断开
+                    error = LLMError("解读生成已中断，请重试")
+                interpretation_flights.release(cache_key, call, result=outcome, error=error)
+    
+    result = finish_interpretation(
+        email, paper_content, interpretation,
+        file_info, is_scanned_pdf, pdf_warning
+    )
+    if long_report:
+        result['long_document'] = long_report
+    yield sse_event(result, event='done')
+
+def job_response(job):
+    """任务状态的对外表示（不包含用户邮箱）"""
+    return {k: v for k, v in job.items() if k != 'email'}
+
+def get_own_job(job_id):
+    """读取当前用户的任务，不存在或不属于当前用户时返回None"""
+    job = job_queue.get(job_id)
+    if not job or job['email'] != session['user_email']:
+        return None
+    return job
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """轮询任务状态，完成后 result 中为与同步接口相同的解读结果"""
+    if 'user_email' not in session:
+        return jsonify({'success': False, 'message': '未登录'}), 401
+
+    job = get_own_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    return jsonify({'success': True, **job_response(job)})
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """以SSE订阅任务状态变化，任务结束时发送 done 事件"""
+    if 'user_email' not in session:
+        return jsonify({'success': False, 'message': '未登录'}), 401
+
+    job = get_own_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+
+    def generate(job):
+        yield sse_event(job_response(job), event='status')
+        while job['status'] not in FINISHED_STATUSES:
+            job = job_queue.wait(job_id, job['status'], timeout=15)
+            if job is None:
+                return
+            yield sse_event(job_response(job), event='status')
+        yield sse_event(job_response(job), event='done')
+
+    return sse_response(generate(job))
+
 @app.route('/api/history', methods=['GET'])
 def get_reading_history():
     if 'user_email' not in session or session.get('is_guest'):
         return jsonify({'success': False, 'message': '未登录'}), 401
     
-    history = get_history(session['user_email'])
-    return jsonify({'success': True, 'history': history})
+    try:
+        items, next_cursor = history_page(session['user_email'], 'reading')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'分页参数错误: {e}'}), 400
+    return jsonify({
+        'success': True,
+        'history': [item for _, item in items],
+        'next_cursor': next_cursor
+    })
+
+def stream_chat_answer(email, question, messages):
+    """流式聊天：逐块转发回答，结束后保存聊天历史"""
+    chunks = []
+    try:
+        for delta in stream_deepseek_chat(messages, 1000, timeout=30):
+            chunks.append(delta)
+            yield sse_event({'delta': delta})
+    except Exception as e:
+        logger.error(f"AI聊天流式错误: {e}")
+        yield sse_event({'success': False, 'message': f'AI处理失败: {str(e)}'}, event='error')
+        return
+    
+    answer = ''.join(chunks)
+    chat_item = {
+        'question': question,
+        'answer': answer,
+        'timestamp': datetime.now().isoformat()
+    }
+    
+    if email:
+        add_chat_history(email, chat_item)
+    
+    yield sse_event({'success': True, 'answer': answer, 'chat_item': chat_item}, event='done')
 
 @app.route('/api/chat', methods=['POST'])
+@rate_limiter.limit('chat')
+@admission.limit('chat')
 def chat_with_ai():
     """实时与AI对话"""
     if 'user_email' not in session:
@@ -1174,14 +1370,13 @@ def chat_with_ai():
     if not question:
         return jsonify({'success': False, 'message': '问题不能为空'}), 400
     
-    user = get_user_by_email(session['user_email'])
+    user = get_user_summary()
     if not user:
         return jsonify({'success': False, 'message': '用户不存在'}), 404
     
     try:
         # 获取用户设置
-        user_settings = user.get('settings', {})
-        language = user_settings.get('language', 'zh')
+        language = user['language']
         
         # 构建系统提示
         if language == 'en':
@@ -1219,26 +1414,14 @@ def chat_with_ai():
         
         messages.append({"role": "user", "content": user_prompt})
         
-        headers = {
-            'Authorization': f'Bearer {DEEPSEEK_API_KEY}',
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            'model': 'deepseek-chat',
-            'messages': messages,
-            'temperature': 0.7,
-            'max_tokens': 1000,
-            'stream': False
-        }
+        if is_flag_set(data.get('stream')):
+            # 游客不保存聊天历史
+            save_email = None if session.get('is_guest') else session['user_email']
+            return sse_response(stream_chat_answer(save_email, question, messages))
         
-        response = requests.post(DEEPSEEK_API_URL, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
-        result = response.json()
+        answer = call_deepseek_chat(messages, 1000, temperature=0.7, timeout=30)
         
-        if 'choices' in result and len(result['choices']) > 0:
-            answer = result['choices'][0]['message']['content']
-            
+        if answer:
             # 记录到聊天历史
             chat_item = {
                 'question': question,
@@ -1248,16 +1431,7 @@ def chat_with_ai():
             
             # 如果用户已登录且不是游客，可以保存聊天历史
             if 'user_email' in session and not session.get('is_guest'):
-                users = load_users()
-                email = session['user_email']
-                if email in users:
-                    if 'chat_history' not in users[email]:
-                        users[email]['chat_history'] = []
-                    users[email]['chat_history'].append(chat_item)
-                    # 保持最近50条聊天记录
-                    if len(users[email]['chat_history']) > 50:
-                        users[email]['chat_history'] = users[email]['chat_history'][-50:]
-                    save_users(users)
+                add_chat_history(session['user_email'], chat_item)
             
             return jsonify({
                 'success': True,
@@ -1267,7 +1441,7 @@ def chat_with_ai():
         else:
             raise ValueError("No response from AI")
             
-    except requests.exceptions.Timeout:
+    except LLMTimeoutError:
         logger.error("AI聊天请求超时")
         return jsonify({'success': False, 'message': 'AI响应超时，请稍后重试'}), 500
     except Exception as e:
@@ -1280,14 +1454,16 @@ def get_chat_history():
     if 'user_email' not in session or session.get('is_guest'):
         return jsonify({'success': False, 'message': '未登录或游客模式'}), 401
     
-    users = load_users()
-    email = session['user_email']
-    
-    if email in users:
-        chat_history = users[email].get('chat_history', [])
-        return jsonify({'success': True, 'chat_history': chat_history})
-    
-    return jsonify({'success': False, 'message': '用户不存在'}), 404
+    try:
+        items, next_cursor = history_page(session['user_email'], 'chat')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'分页参数错误: {e}'}), 400
+    # 每页内按时间顺序排列（与对话显示顺序一致），next_cursor 指向更早的一页
+    return jsonify({
+        'success': True,
+        'chat_history': [item for _, item in reversed(items)],
+        'next_cursor': next_cursor
+    })
 
 @app.route('/api/user/questionnaire', methods=['GET', 'PUT'])
 def user_questionnaire():
@@ -1296,12 +1472,12 @@ def user_questionnaire():
         return jsonify({'success': False, 'message': '未登录'}), 401
     
     email = session['user_email']
-    users = load_users()
     
     if request.method == 'GET':
         # 获取问卷数据
-        if email in users:
-            questionnaire = users[email].get('questionnaire', {})
+        user = get_user_by_email(email)
+        if user:
+            questionnaire = user.get('questionnaire', {})
             return jsonify({
                 'success': True,
                 'questionnaire': questionnaire
@@ -1313,13 +1489,10 @@ def user_questionnaire():
         data = request.json
         questionnaire = data.get('questionnaire', {})
         
-        if email in users:
-            users[email]['questionnaire'] = questionnaire
-            save_users(users)
-            
-            # 重新分析用户画像
-            user_data = users[email]
-            profile_analysis = analyze_user_profile(user_data)
+        user_data = update_user_questionnaire(email, questionnaire)
+        if user_data:
+            # 用户画像已在写入问卷时重新计算
+            profile_analysis = get_profile_analysis(user_data)
             
             return jsonify({
                 'success': True,
@@ -1334,11 +1507,8 @@ def delete_account():
         return jsonify({'success': False, 'message': '未登录'}), 401
     
     email = session['user_email']
-    users = load_users()
     
-    if email in users:
-        del users[email]
-        save_users(users)
+    if delete_user(email):
         session.clear()
         return jsonify({'success': True})
     
@@ -1347,13 +1517,13 @@ def delete_account():
 @app.route('/api/check-auth', methods=['GET'])
 def check_auth():
     if 'user_email' in session:
-        user = get_user_by_email(session['user_email'])
+        user = get_user_summary()
         if user:
             return jsonify({
                 'success': True,
                 'user': {
                     'email': session['user_email'],
-                    'username': user.get('username', ''),
+                    'username': user['username'],
                     'is_guest': session.get('is_guest', False)
                 }
             })
@@ -1362,7 +1532,16 @@ def check_auth():
 # 健康检查端点
 @app.route('/health')
 def health():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'jobs': job_queue.stats(),
+        'admission': admission.stats(),
+        'rate_limit': rate_limiter.config(),
+        'sessions': session_store.stats(),
+        'write_behind': write_behind.stats(),
+        'passwords': password_hasher.stats()
+    })
 
 @app.route('/api/user/update-questionnaire', methods=['POST'])
 def update_questionnaire():
@@ -1371,11 +1550,8 @@ def update_questionnaire():
     
     data = request.json
     questionnaire = data.get('questionnaire', {})
-    users = load_users()
     
-    if session['user_email'] in users:
-        users[session['user_email']]['questionnaire'] = questionnaire
-        save_users(users)
+    if update_user_questionnaire(session['user_email'], questionnaire):
         return jsonify({'success': True})
     
     return jsonify({'success': False, 'message': '用户不存在'}), 404
@@ -1396,27 +1572,31 @@ def get_user_profile():
             'username': user['username']
         },
         'questionnaire': user.get('questionnaire', {}),
-        'profile_analysis': analyze_user_profile(user)
+        'profile_analysis': get_profile_analysis(user)
     })
 
 @app.route('/static/lang/translations.json')
 def get_translations():
-    # 确保语言文件存在
-    import os
-    translations_path = os.path.join(app.static_folder, 'lang', 'translations.json')
-    
-    if os.path.exists(translations_path):
-        return send_file(translations_path)
-    else:
-        # 返回默认翻译
+    """全部语言的翻译（兼容旧版前端）"""
+    return translations.get().response()
+
+@app.route('/api/i18n/<lang>')
+def get_language_translations(lang):
+    """单一语言的翻译"""
+    language_translations = translations.get(lang)
+    if language_translations is None:
         return jsonify({
-            "zh": {"appName": "ANSAPRA - 高中生自然科学论文自适应阅读智能体"},
-            "en": {"appName": "ANSAPRA - Adaptive Natural Science Academic Paper Reading Agent"}
-        })
+            'success': False,
+            'message': f'不支持的语言: {lang}',
+            'languages': translations.languages()
+        }), 404
+    return language_translations.response()
 
 @app.route('/api/generate-charts', methods=['POST'])
+@rate_limiter.limit('charts')
+@admission.limit('charts')
 def generate_charts():
-    """生成论文相关图表"""
+    """生成论文相关图表（多种图表类型并发生成）"""
     if 'user_email' not in session:
         return jsonify({'success': False, 'message': '未登录'}), 401
 
@@ -1428,146 +1608,44 @@ def generate_charts():
     if not paper_content:
         return jsonify({'success': False, 'message': '请提供论文内容'}), 400
 
-    user = get_user_by_email(session['user_email'])
-    if not user:
+    if not get_user_summary():
         return jsonify({'success': False, 'message': '用户不存在'}), 404
 
     try:
-        # 获取用户设置
-        user_settings = user.get('settings', {})
-        
         # 限制paper_content长度
         max_content_length = 3000
         if len(paper_content) > max_content_length:
             paper_content = paper_content[:max_content_length] + "\n\n[注：内容过长，已截断部分内容]"
         
-        # 为每种图表类型生成图表
-        charts = {}
+        # 去重并保持顺序
+        chart_types = list(dict.fromkeys(chart_types))
         
-        for chart_type in chart_types:
-            # 构建图表生成提示词
-            if language == 'en':
-                if chart_type == 'A':
-                    chart_prompt = f"""
-Based on the following paper content, generate a detailed mind map (tree structure) that organizes the main ideas, key concepts, and relationships in the paper.
-
-Paper content:
-{paper_content}
-
-Please generate markdown syntax code using mermaid syntax renderer for the mind map.
-要求生成markdown语法代码并返回。论文相关图表生成部分，请变成mermaid语法渲染器，直接生成返回的markdown代码运行后的图表。注意不要出现语法错误，导致前端显示syntax error。
-
-一定要注意没有syntax error，只返回代码让查看器后台运行即可
-
-Please output only the markdown code with mermaid syntax, no other content.
-                    """
-                elif chart_type == 'B':
-                    chart_prompt = f"""
-Based on the following paper content, generate a detailed flowchart and logic diagram that shows the research process, methodology, and logical relationships in the paper.
-
-Paper content:
-{paper_content}
-
-Please generate markdown syntax code using mermaid syntax renderer for the flowchart and logic diagram.
-要求生成markdown语法代码并返回。论文相关图表生成部分，请变成mermaid语法渲染器，直接生成返回的markdown代码运行后的图表。注意不要出现语法错误，导致前端显示syntax error。
-
-一定要注意没有syntax error，只返回代码让查看器后台运行即可
-
-Please output only the markdown code with mermaid syntax, no other content.
-                    """
-                elif chart_type == 'C':
-                    chart_prompt = f"""
-Based on the following paper content, generate a detailed table that summarizes the key data, results, and findings in the paper.
-
-Paper content:
-{paper_content}
-
-Please generate markdown syntax code for the table.
-要求生成markdown语法代码并返回。论文相关图表生成部分，请直接生成返回的markdown代码运行后的表格。注意不要出现语法错误，导致前端显示syntax error。
-
-一定要注意没有syntax error，只返回代码让查看器后台运行即可
-
-Please output only the markdown table code, no other content.
-                    """
-                elif chart_type == 'D':
-                    chart_prompt = f"""
-Based on the following paper content, generate a detailed statistical chart data (such as line charts, bar charts, etc.) that visualizes the key data and results in the paper.
-
-Paper content:
-{paper_content}
-
-Please generate markdown syntax code using mermaid syntax renderer for the statistical charts.
-要求生成markdown语法代码并返回。论文相关图表生成部分，请变成mermaid语法渲染器，直接生成返回的markdown代码运行后的图表。注意不要出现语法错误，导致前端显示syntax error。
-
-一定要注意没有syntax error，只返回代码让查看器后台运行即可
-
-Please output only the markdown code with mermaid syntax, no other content.
-                    """
+        if is_flag_set(data.get('stream')):
+            return sse_response(stream_charts(chart_types, paper_content, language))
+        
+        charts = {}
+        chart_timings = {}
+        chart_errors = {}
+        for outcome in generate_charts_concurrently(chart_types, paper_content, language):
+            chart_timings[outcome['chart_type']] = outcome['latency']
+            if outcome['success']:
+                charts[outcome['chart_type']] = outcome['chart']
             else:
-                if chart_type == 'A':
-                    chart_prompt = f"""
-基于以下论文内容，生成一个详细的思维导图（树状结构），组织论文中的主要思想、关键概念和关系。
-
-论文内容：
-{paper_content}
-
-请生成使用mermaid语法渲染器的markdown语法代码来表示思维导图。
-要求生成markdown语法代码并返回。论文相关图表生成部分，请变成mermaid语法渲染器，直接生成返回的markdown代码运行后的图表。
-
-一定要注意没有syntax error，只返回代码让查看器后台运行即可
-
-请仅输出带有mermaid语法的markdown代码，不要输出其他内容。注意不要出现语法错误，导致前端显示syntax error。
-                    """
-                elif chart_type == 'B':
-                    chart_prompt = f"""
-基于以下论文内容，生成一个详细的流程图和逻辑图，展示论文中的研究过程、方法论和逻辑关系。
-
-论文内容：
-{paper_content}
-
-请生成使用mermaid语法渲染器的markdown语法代码来表示流程图和逻辑图。
-要求生成markdown语法代码并返回。论文相关图表生成部分，请变成mermaid语法渲染器，直接生成返回的markdown代码运行后的图表。
-
-一定要注意没有syntax error，只返回代码让查看器后台运行即可
-
-请仅输出带有mermaid语法的markdown代码，不要输出其他内容。注意不要出现语法错误，导致前端显示syntax error。
-                    """
-                elif chart_type == 'C':
-                    chart_prompt = f"""
-基于以下论文内容，生成一个详细的表格，总结论文中的关键数据、结果和发现。
-
-论文内容：
-{paper_content}
-
-请生成markdown语法代码来表示表格。
-要求生成markdown语法代码并返回。论文相关图表生成部分，请直接生成返回的markdown代码运行后的表格。
-
-一定要注意没有syntax error，只返回代码让查看器后台运行即可
-
-请仅输出markdown表格代码，不要输出其他内容。注意不要出现语法错误，导致前端显示syntax error。
-                    """
-                elif chart_type == 'D':
-                    chart_prompt = f"""
-基于以下论文内容，生成详细的统计图表数据（如折线图、柱状图等），可视化论文中的关键数据和结果。
-
-论文内容：
-{paper_content}
-
-请生成使用mermaid语法渲染器的markdown语法代码来表示统计图表。
-要求生成markdown语法代码并返回。论文相关图表生成部分，请变成mermaid语法渲染器，直接生成返回的markdown代码运行后的图表。
-
-一定要注意没有syntax error，只返回代码让查看器后台运行即可
-
-请仅输出带有mermaid语法的markdown代码，不要输出其他内容。注意不要出现语法错误，导致前端显示syntax error。
-                    """
-            
-            # 调用DeepSeek API生成图表数据
-            chart_data = call_deepseek_api_for_chart(chart_prompt, language)
-            charts[chart_type] = chart_data
+                chart_errors[outcome['chart_type']] = outcome['message']
+        
+        if chart_types and not charts:
+            return jsonify({
+                'success': False,
+                'message': '图表生成过程中发生错误，请稍后重试',
+                'chart_errors': chart_errors,
+                'chart_timings': chart_timings
+            }), 500
         
         return jsonify({
             'success': True,
-            'charts': charts
+            'charts': charts,
+            'chart_timings': chart_timings,
+            'chart_errors': chart_errors
         })
 
     except Exception as e:
@@ -1575,61 +1653,64 @@ Please output only the markdown code with mermaid syntax, no other content.
         logger.error(f"错误堆栈: {traceback.format_exc()}")
         return jsonify({'success': False, 'message': '图表生成过程中发生错误，请稍后重试'}), 500
 
+def generate_one_chart(chart_type, paper_content, language):
+    """生成单个图表，失败不抛出异常，返回结果与耗时"""
+    start_time = time.time()
+    outcome = {'chart_type': chart_type, 'success': False}
+    try:
+        chart_prompt = build_chart_prompt(chart_type, paper_content, language)
+        if chart_prompt is None:
+            outcome['message'] = f'不支持的图表类型: {chart_type}'
+        else:
+            # 调用DeepSeek API生成图表数据（相同论文的相同图表正在生成时共享结果）
+            flight_key = content_hash(f"{language}\n{chart_prompt}".encode('utf-8'))
+            outcome['chart'] = chart_flights.do(
+                flight_key, lambda: call_deepseek_api_for_chart(chart_prompt, language)
+            )
+            outcome['success'] = True
+    except Exception as e:
+        logger.error(f"图表 {chart_type} 生成失败: {e}")
+        outcome['message'] = str(e)
+    outcome['latency'] = round(time.time() - start_time, 3)
+    return outcome
+
+def generate_charts_concurrently(chart_types, paper_content, language):
+    """并发生成多个图表，按完成顺序逐个产出结果；并发数受CHART_CONCURRENCY限制"""
+    if not chart_types:
+        return
+    with ThreadPoolExecutor(max_workers=min(CHART_CONCURRENCY, len(chart_types))) as pool:
+        futures = [
+            pool.submit(generate_one_chart, chart_type, paper_content, language)
+            for chart_type in chart_types
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+def stream_charts(chart_types, paper_content, language):
+    """以SSE形式逐个返回完成的图表"""
+    start_time = time.time()
+    succeeded = 0
+    for outcome in generate_charts_concurrently(chart_types, paper_content, language):
+        succeeded += 1 if outcome['success'] else 0
+        yield sse_event(outcome, event='chart')
+    yield sse_event({
+        'success': succeeded > 0 or not chart_types,
+        'completed': len(chart_types),
+        'failed': len(chart_types) - succeeded,
+        'elapsed': round(time.time() - start_time, 3)
+    }, event='done')
+
 def call_deepseek_api_for_chart(prompt, language='zh'):
     """调用DeepSeek API生成图表数据"""
-    if not DEEPSEEK_API_KEY:
-        raise ValueError("DeepSeek API Key not configured")
-    
-    if language == 'en':
-        system_prompt = """You are a professional chart generation assistant. Please generate clear, structured chart data based on the provided paper content."""
-    else:
-        system_prompt = """你是一位专业的图表生成助手。请根据提供的论文内容生成清晰、结构化的图表数据。"""
+    system_prompt = prompts.CHART_SYSTEM_PROMPTS[prompts.template_language(language)]
     
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-    }
-    
-    data = {
-        "model": "deepseek-chat",
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 2000,
-        "temperature": 0.3,
-        "top_p": 0.9
-    }
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
     
-    try:
-        # 增加超时时间到120秒
-        response = requests.post(
-            DEEPSEEK_API_URL,
-            headers=headers,
-            json=data,
-            timeout=120
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"API request failed with status code {response.status_code}: {response.text}")
-        
-        result = response.json()
-        if not result.get('choices') or not result['choices'][0].get('message'):
-            raise Exception("Invalid API response format")
-        
-        return result['choices'][0]['message']['content']
-    except requests.exceptions.Timeout:
-        logger.error("DeepSeek API图表生成请求超时")
-        raise Exception("图表生成超时，请稍后重试或减少论文内容长度")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"DeepSeek API图表生成错误: {e}")
-        # 提供更具体的错误信息
-        if "Read timed out" in str(e):
-            raise Exception("API响应超时，请稍后重试或减少文本长度")
-        elif "Connection refused" in str(e):
-            raise Exception("无法连接到API服务器，请检查网络连接")
-        else:
-            raise Exception(f"API调用失败: {str(e)}")
+    # 增加超时时间到120秒
+    return call_deepseek_chat(messages, 2000, temperature=0.3, timeout=120, top_p=0.9)
 
 # 调试端点：详细分析PDF
 @app.route('/api/debug/pdf', methods=['POST'])
@@ -1640,13 +1721,13 @@ def debug_pdf():
     if not file:
         return jsonify({'error': '没有文件'}), 400
     
+    upload, pdf_file = None, None
     try:
-        # 读取文件
-        file.seek(0)
-        file_bytes = file.read()
+        # 上传内容已落盘，只读取需要的部分
+        upload = spool_upload(file, app.config['UPLOAD_FOLDER'])
         
         # 检查文件头
-        file_header = file_bytes[:100]
+        file_header = upload.head(100)
         
         # 检查是否是PDF
         is_pdf = file_header[:5] == b'%PDF-'
@@ -1654,15 +1735,14 @@ def debug_pdf():
         # 检查PDF版本
         pdf_version = "未知"
         if is_pdf:
-            # 提取版本号，如 %PDF-1.4
-            version_start = file_bytes.find(b'%PDF-')
-            if version_start != -1:
-                version_end = file_bytes.find(b'\n', version_start)
-                if version_end != -1:
-                    pdf_version = file_bytes[version_start:version_end].decode('ascii', errors='ignore')
+            # 提取版本号，如 %PDF-1.4（版本号在文件第一行）
+            first_line = upload.head(1024)
+            version_end = first_line.find(b'\n')
+            if version_end != -1:
+                pdf_version = first_line[:version_end].decode('ascii', errors='ignore')
         
         # 检查文件大小和结构
-        file_size = len(file_bytes)
+        file_size = upload.size
         
         # 尝试解析PDF基本信息
         pdf_info = {
@@ -1678,7 +1758,7 @@ def debug_pdf():
             try:
                 from PyPDF2 import PdfReader
                 
-                pdf_file = io.BytesIO(file_bytes)
+                pdf_file = upload.open()
                 pdf_reader = PdfReader(pdf_file)
                 
                 pdf_info.update({
@@ -1687,10 +1767,10 @@ def debug_pdf():
                     'metadata': pdf_reader.metadata,
                 })
                 
-                # 检查是否是扫描件
-                is_scanned, scan_reason = is_pdf_scanned(file_bytes)
-                pdf_info['is_scanned'] = is_scanned
-                pdf_info['scan_reason'] = scan_reason
+                # 检查是否是扫描件（与解读接口共用解析缓存）
+                pdf_result = analyze_pdf(upload)
+                pdf_info['is_scanned'] = pdf_result['is_scanned']
+                pdf_info['scan_reason'] = pdf_result['scan_message']
                 
                 # 尝试提取第一页文字
                 if len(pdf_reader.pages) > 0:
@@ -1716,8 +1796,9 @@ def debug_pdf():
                         pdf_info['extraction_error'] = str(e)
                 
                 # 尝试高级解析
-                success, advanced_text = extract_text_from_pdf_advanced(file_bytes)
+                success, advanced_text = pdf_result['success'], pdf_result['text']
                 pdf_info['advanced_extraction_success'] = success
+                pdf_info['advanced_extractor'] = pdf_result['extractor']
                 if success:
                     pdf_info['advanced_text_length'] = len(advanced_text)
                     pdf_info['advanced_text_preview'] = advanced_text[:500] + '...' if len(advanced_text) > 500 else advanced_text
@@ -1735,6 +1816,53 @@ def debug_pdf():
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    finally:
+        if pdf_file:
+            pdf_file.close()
+        if upload:
+            upload.discard()
+
+# 性能指标（Prometheus文本格式）
+JOB_QUEUE_DEPTH = metrics.REGISTRY.gauge('ansapra_job_queue_depth', '异步解读任务数', ('status',))
+JOB_WAIT_SECONDS = metrics.REGISTRY.gauge('ansapra_job_wait_seconds', '最近一小时异步任务的排队等待时间', ('stat',))
+CACHE_ITEMS = metrics.REGISTRY.gauge('ansapra_cache_items', '缓存在内存中的条目数', ('cache',))
+CACHE_DISK_BYTES = metrics.REGISTRY.gauge('ansapra_cache_disk_bytes', '缓存在磁盘上占用的字节数', ('cache',))
+ADMISSION_REQUESTS = metrics.REGISTRY.gauge('ansapra_admission_requests', '准入控制下正在处理和排队的请求数', ('route', 'state'))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    各阶段耗时直方图、按路由的请求数与在途请求数、缓存事件计数（缓存操作时累计），
+    以及抓取时采集的队列深度与缓存容量
+    """
+    job_stats = job_queue.stats()
+    JOB_QUEUE_DEPTH.set(job_stats['queued'], status='queued')
+    JOB_QUEUE_DEPTH.set(job_stats['running'], status='running')
+    JOB_WAIT_SECONDS.set(job_stats['avg_wait_seconds'], stat='avg')
+    JOB_WAIT_SECONDS.set(job_stats['max_wait_seconds'], stat='max')
+    pdf_stats = pdf_cache.stats()
+    CACHE_ITEMS.set(pdf_stats['memory_items'], cache=pdf_cache.name)
+    CACHE_DISK_BYTES.set(pdf_stats['disk_bytes'], cache=pdf_cache.name)
+    CACHE_ITEMS.set(interpretation_cache.stats()['items'], cache=interpretation_cache.name)
+    for route, route_stats in admission.stats()['routes'].items():
+        ADMISSION_REQUESTS.set(route_stats['active'], route=route, state='active')
+        ADMISSION_REQUESTS.set(route_stats['waiting'], route=route, state='waiting')
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# 调试端点：缓存命中情况
+@app.route('/api/debug/cache', methods=['GET'])
+def debug_cache():
+    """PDF解析缓存、解读结果缓存与并发请求合并统计"""
+    return jsonify({
+        'success': True,
+        'pdf_cache': pdf_cache.stats(),
+        'interpretation_cache': interpretation_cache.stats(),
+        'single_flight': {
+            'pdf': pdf_flights.stats(),
+            'interpretation': interpretation_flights.stats(),
+            'chart': chart_flights.stats()
+        }
+    })
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10000))
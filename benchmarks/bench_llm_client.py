@@ -0,0 +1,65 @@
+# benchmarks/bench_llm_client.py
+"""
+DeepSeek客户端基准测试：对比每次新建连接的 requests.post 与连接池客户端的
+单次调用延迟和新建连接数，验证503时的退避重试，以及流式调用拼接出的中文内容与完整响应一致
+用法: python benchmarks/bench_llm_client.py [--calls 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_deepseek import DEFAULT_ANSWER, FakeDeepSeekServer  # noqa: E402
+from llm_client import DeepSeekClient  # noqa: E402
+
+MESSAGES = [{'role': 'user', 'content': 'ping'}]
+
+
+def bare_call(url):
+    payload = {'model': 'deepseek-chat', 'messages': MESSAGES, 'max_tokens': 10, 'stream': False}
+    response = requests.post(url, json=payload, headers={'Authorization': 'Bearer test'}, timeout=30)
+    response.raise_for_status()
+    return response.json()['choices'][0]['message']['content']
+
+
+def run(label, fn, calls, server):
+    server.connections = 0
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:>12} {elapsed / calls * 1000:>10.2f} {server.connections:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    server = FakeDeepSeekServer(delay=0).start()
+    client = DeepSeekClient(server.url, 'test', backoff_base=0.05)
+
+    print(f"{'client':>12} {'ms/call':>10} {'connections':>12}")
+    run('bare', lambda: bare_call(server.url), args.calls, server)
+    run('pooled', lambda: client.chat(MESSAGES, 10), args.calls, server)
+
+    server.failures = 2
+    start = time.perf_counter()
+    answer = client.chat(MESSAGES, 10)
+    print(f"\n前2个请求返回503：重试后成功={bool(answer)}，耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    # 模拟回答中含UTF-8编码带0x85字节的中文字符（如"关"），逐字流式返回
+    streamed = ''.join(client.stream_chat(MESSAGES, 10))
+    print(f"流式中文内容一致={streamed == DEFAULT_ANSWER}（{len(streamed)}/{len(DEFAULT_ANSWER)}字）")
+    server.shutdown()
+    if streamed != DEFAULT_ANSWER:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
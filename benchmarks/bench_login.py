@@ -0,0 +1,193 @@
+# benchmarks/bench_login.py
+"""
+登录基准测试：用本地模拟DeepSeek服务器持续发送 /api/interpret 请求的同时，多个线程不断登录，
+统计登录吞吐、p50/p99延迟、因密码哈希繁忙被拒绝（503）的次数、期间完成的解读数和 /health 的p99延迟；
+对比 sync worker 与 gthread worker 下在请求线程中直接计算哈希（PASSWORD_HASH_WORKERS=0）
+和交给有界线程池计算的差异，每种方式启动独立的gunicorn
+用法: python benchmarks/bench_login.py [--seconds 10] [--logins 8] [--interprets 4] [--cpus 1]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_deepseek import FakeDeepSeekServer  # noqa: E402
+from load_test import free_port  # noqa: E402
+
+# (worker类型, PASSWORD_HASH_WORKERS)
+MODES = (('sync', 0), ('gthread', 0), ('gthread', 1))
+PASSWORD = 'bench-password'
+
+
+def percentile(samples, q):
+    if not samples:
+        return float('nan')
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def create_users(db_path, count, method):
+    """直接写入用户存储（所有用户共用一个哈希，准备数据不计入测试）"""
+    from werkzeug.security import generate_password_hash
+
+    from user_store import UserStore
+
+    store = UserStore(db_path)
+    password_hash = generate_password_hash(PASSWORD, method=method)
+    emails = [f"login{i}@example.com" for i in range(count)]
+    for email in emails:
+        store.insert(email, {
+            'id': email, 'email': email, 'username': email, 'password_hash': password_hash,
+            'settings': {'language': 'zh', 'reading': {}, 'visual': {}}, 'questionnaire': {}
+        })
+    return emails
+
+
+def start_app(worker_class, hash_workers, fake_url, tmp_dir, method, cpus):
+    """启动gunicorn，cpus > 0 时限制可使用的CPU数（模拟小规格实例）"""
+    label = f"{worker_class}-{hash_workers}"
+    port = free_port()
+    env = dict(os.environ,
+               DEEPSEEK_API_KEY='test-key',
+               DEEPSEEK_API_URL=fake_url,
+               USERS_DB=os.path.join(tmp_dir, f'users-{label}.db'),
+               SESSION_DB=os.path.join(tmp_dir, f'sessions-{label}.db'),
+               JOBS_DB=os.path.join(tmp_dir, f'jobs-{label}.db'),
+               GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_THREADS='1' if worker_class == 'sync' else '32',
+               PASSWORD_HASH_METHOD=method,
+               PASSWORD_HASH_WORKERS=str(hash_workers),
+               STATIC_ASSETS_ENABLED='0',
+               RATE_LIMIT_ENABLED='0',
+               INTERPRET_CACHE_TTL='0')
+    preexec = None
+    if cpus > 0 and hasattr(os, 'sched_setaffinity'):
+        allowed = sorted(os.sched_getaffinity(0))[:cpus]
+        preexec = lambda: os.sched_setaffinity(0, allowed)  # noqa: E731
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn_config.py',
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', '--access-logfile', '/dev/null'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, preexec_fn=preexec
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(base + '/health', timeout=1)
+            return proc, base, env['USERS_DB']
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('gunicorn 启动失败')
+
+
+def login_loop(base, email, deadline, results):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            r = requests.post(base + '/api/login', json={'email': email, 'password': PASSWORD}, timeout=120)
+            status = r.status_code
+        except requests.RequestException:
+            status = 0
+        results.append((status, time.perf_counter() - start))
+        if status == 503:
+            time.sleep(float(r.headers.get('Retry-After', 1)))
+
+
+def interpret_loop(session, base, index, deadline, results):
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+        try:
+            r = session.post(base + '/api/interpret', data={'text': f'测试论文内容 {index}-{n} ' * 50}, timeout=120)
+            results.append(r.status_code)
+        except requests.RequestException:
+            results.append(0)
+
+
+def probe_health(base, stop, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            requests.get(base + '/health', timeout=120)
+            samples.append(time.perf_counter() - start)
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+
+
+def run(base, emails, readers, seconds):
+    # 解读请求需要登录（游客不能解读），在计时开始前登录
+    sessions = []
+    for email in readers:
+        session = requests.Session()
+        session.post(base + '/api/login', json={'email': email, 'password': PASSWORD})
+        sessions.append(session)
+
+    deadline = time.perf_counter() + seconds
+    logins, interpretations, health = [], [], []
+    stop = threading.Event()
+    threads = [threading.Thread(target=login_loop, args=(base, email, deadline, logins)) for email in emails]
+    threads += [threading.Thread(target=interpret_loop, args=(session, base, i, deadline, interpretations))
+                for i, session in enumerate(sessions)]
+    prober = threading.Thread(target=probe_health, args=(base, stop, health), daemon=True)
+    prober.start()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stop.set()
+    prober.join()
+
+    ok = [seconds for status, seconds in logins if status == 200]
+    return {
+        'logins_per_second': len(ok) / seconds,
+        'p50_ms': percentile(ok, 0.5) * 1000,
+        'p99_ms': percentile(ok, 0.99) * 1000,
+        'busy': sum(1 for status, _ in logins if status == 503),
+        'failed': sum(1 for status, _ in logins if status not in (200, 503)),
+        'interpretations': sum(1 for status in interpretations if status == 200),
+        'health_p99_ms': percentile(health, 0.99) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--logins', type=int, default=8, help='并发登录的线程数（每个线程一个账户）')
+    parser.add_argument('--interprets', type=int, default=4, help='并发发送解读请求的线程数')
+    parser.add_argument('--delay', type=float, default=1.0, help='模拟DeepSeek响应延迟（秒）')
+    parser.add_argument('--method', default='pbkdf2:sha256:600000', help='密码哈希算法与成本')
+    parser.add_argument('--cpus', type=int, default=1, help='gunicorn可使用的CPU数（0为不限制）')
+    args = parser.parse_args()
+
+    fake = FakeDeepSeekServer(delay=args.delay).start()
+    print(f"{args.logins}个登录线程，{args.interprets}个解读线程，{args.seconds:g}秒，"
+          f"哈希 {args.method}，模拟DeepSeek延迟 {args.delay}s")
+    print(f"{'worker':>8} {'hash pool':>9} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'503':>5} "
+          f"{'failed':>6} {'interprets':>10} {'/health p99 ms':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for worker_class, hash_workers in MODES:
+            proc, base, users_db = start_app(worker_class, hash_workers, fake.url, tmp, args.method, args.cpus)
+            try:
+                emails = create_users(users_db, args.logins + args.interprets, args.method)
+                r = run(base, emails[:args.logins], emails[args.logins:], args.seconds)
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(f"{worker_class:>8} {hash_workers or 'inline':>9} {r['logins_per_second']:>9.2f} "
+                  f"{r['p50_ms']:>8.0f} {r['p99_ms']:>8.0f} {r['busy']:>5} {r['failed']:>6} "
+                  f"{r['interpretations']:>10} {r['health_p99_ms']:>15.1f}")
+    fake.shutdown()
+
+
+if __name__ == '__main__':
+    main()
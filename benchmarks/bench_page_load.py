@@ -0,0 +1,137 @@
+# benchmarks/bench_page_load.py
+"""
+页面加载基准测试：模拟浏览器首次访问（无缓存）和再次访问（有缓存）首页，
+统计传输字节数（响应头 + 响应体）、请求数和服务端处理时间，
+对比关闭静态资源管线（Flask默认的静态文件服务，下载全部语言的翻译）与开启后
+（带指纹的预压缩资源，只下载当前语言的翻译）的差异；每种方式在独立子进程中运行
+用法: python benchmarks/bench_page_load.py [--repeat 20]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# (方式, STATIC_ASSETS_ENABLED, 前端加载的翻译地址)
+MODES = (
+    ('legacy', '0', '/static/lang/translations.json'),
+    ('pipeline', '1', '/api/i18n/zh')
+)
+ACCEPT_ENCODING = 'gzip, deflate, br'
+ASSET_PATTERN = re.compile(r'(?:src|href)="(/static/[^"]+)"')
+
+
+class Browser:
+    """按 Cache-Control 缓存响应的简化浏览器：新鲜的缓存不发请求，过期的带 If-None-Match 协商"""
+
+    def __init__(self, client, translations_url):
+        self.client = client
+        self.translations_url = translations_url
+        self.cache = {}
+
+    def get(self, url, stats):
+        cached = self.cache.get(url)
+        headers = {'Accept-Encoding': ACCEPT_ENCODING}
+        if cached:
+            if cached['expires'] > time.time():
+                stats['cache_hits'] += 1
+                return cached['body']
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+
+        start = time.perf_counter()
+        response = self.client.get(url, headers=headers)
+        body = response.get_data()
+        stats['seconds'] += time.perf_counter() - start
+        stats['requests'] += 1
+        stats['bytes'] += len(body) + sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+        if response.status_code == 304:
+            stats['not_modified'] += 1
+            body = cached['body']
+        elif response.status_code != 200:
+            raise RuntimeError(f"{url} 返回 {response.status_code}")
+
+        cache_control = response.cache_control
+        max_age = 0 if cache_control.no_cache or cache_control.max_age is None else cache_control.max_age
+        self.cache[url] = {
+            'body': body,
+            'etag': response.headers.get('ETag') or (cached or {}).get('etag'),
+            'expires': time.time() + max_age
+        }
+        return body
+
+    def load_page(self):
+        stats = {'requests': 0, 'bytes': 0, 'seconds': 0.0, 'not_modified': 0, 'cache_hits': 0}
+        html = self.get('/', stats).decode('utf-8')
+        for url in ASSET_PATTERN.findall(html) + [self.translations_url]:
+            self.get(url, stats)
+        return stats
+
+
+def run_child(repeat, translations_url):
+    """子进程：按环境变量中的配置导入应用，多次测量首次访问和再次访问"""
+    import logging
+    logging.disable(logging.CRITICAL)
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, ROOT)
+    start = time.perf_counter()
+    import app as app_module
+    import_seconds = time.perf_counter() - start
+
+    results = {'import_seconds': import_seconds}
+    for label in ('cold', 'warm'):
+        samples = []
+        for _ in range(repeat):
+            client = app_module.app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_email'] = 'bench@example.com'
+            browser = Browser(client, translations_url)
+            stats = browser.load_page()
+            if label == 'warm':
+                stats = browser.load_page()
+            samples.append(stats)
+        samples.sort(key=lambda s: s['seconds'])
+        median = samples[len(samples) // 2]
+        results[label] = median
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--child', metavar='TRANSLATIONS_URL', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.repeat, args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'mode':>9} {'load':>5} {'requests':>9} {'304':>4} {'cached':>7} {'KB':>8} {'worker ms':>10}")
+        for mode, enabled, translations_url in MODES:
+            env = dict(
+                os.environ,
+                STATIC_ASSETS_ENABLED=enabled,
+                ASSET_BUILD_DIR=os.path.join(tmp, 'assets'),
+                USERS_DB=os.path.join(tmp, f'{mode}-users.db'),
+                JOBS_DB=os.path.join(tmp, f'{mode}-jobs.db'),
+                RATE_LIMIT_ENABLED='0'
+            )
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--repeat', str(args.repeat), '--child', translations_url],
+                check=True, capture_output=True, text=True, env=env
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            for label in ('cold', 'warm'):
+                s = result[label]
+                print(f"{mode:>9} {label:>5} {s['requests']:>9} {s['not_modified']:>4} {s['cache_hits']:>7} "
+                      f"{s['bytes'] / 1024:>8.1f} {s['seconds'] * 1000:>10.2f}")
+            print(f"{mode:>9} 启动（含资源构建） {result['import_seconds'] * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/bench_pdf_extract.py
+"""
+PDF解析基准测试：对比旧版（扫描件检查 + PyPDF2 → pdfplumber → pdfminer 整篇顺序回退）
+与单遍逐页回退引擎的耗时和峰值内存；--workers 时另外对比串行与进程池并行提取
+用法: python benchmarks/bench_pdf_extract.py [--pages 10] [--repeat 3] [--workers 4 --parallel-pages 40]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pdf_corpus import corpus  # noqa: E402
+from pdf_extract import extract_pdf, filter_pdf_metadata, is_usable_text, shutdown_pool  # noqa: E402
+
+
+def legacy_extract(file_bytes, max_pages=10):
+    """旧版流程：is_pdf_scanned 单独打开一次，然后三个解析器各自整篇重新解析"""
+    from PyPDF2 import PdfReader
+    import pdfplumber
+    from pdfminer.high_level import extract_text
+
+    reader = PdfReader(io.BytesIO(file_bytes))
+    if reader.pages:
+        reader.pages[0].extract_text()
+
+    reader = PdfReader(io.BytesIO(file_bytes))
+    text = ""
+    for page in reader.pages[:max_pages]:
+        page_text = page.extract_text()
+        if is_usable_text(page_text):
+            text += filter_pdf_metadata(page_text)
+    if text.strip():
+        return text
+
+    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+        for page in pdf.pages[:max_pages]:
+            page_text = page.extract_text()
+            if page_text and page_text.strip():
+                text += filter_pdf_metadata(page_text)
+    if text.strip():
+        return text
+
+    return filter_pdf_metadata(extract_text(io.BytesIO(file_bytes)))
+
+
+def timed(fn, file_bytes, repeat):
+    """最短耗时（毫秒），不开启tracemalloc以免干扰计时"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(file_bytes)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def measure(fn, file_bytes, repeat):
+    """返回 (最短耗时毫秒, 峰值内存MiB)，峰值内存单独跑一次测量"""
+    elapsed = timed(fn, file_bytes, repeat)
+    tracemalloc.start()
+    fn(file_bytes)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=0, help='进程池大小，0表示不测试并行')
+    parser.add_argument('--parallel-pages', type=int, default=40)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    print(f"{'document':>10} {'legacy ms':>10} {'legacy MiB':>11} {'engine ms':>10} {'engine MiB':>11} {'speedup':>8}")
+    for name, file_bytes in corpus(args.pages).items():
+        legacy_ms, legacy_mem = measure(lambda b: legacy_extract(b, args.pages), file_bytes, args.repeat)
+        engine_ms, engine_mem = measure(lambda b: extract_pdf(b, max_pages=args.pages), file_bytes, args.repeat)
+        print(f"{name:>10} {legacy_ms:>10.1f} {legacy_mem:>11.2f} {engine_ms:>10.1f} {engine_mem:>11.2f} "
+              f"{legacy_ms / engine_ms:>7.2f}x")
+
+    if args.workers > 1:
+        print(f"\n并行提取（{args.parallel_pages}页，{args.workers}个进程，墙钟时间）")
+        print(f"{'document':>10} {'serial ms':>10} {'parallel ms':>12} {'speedup':>8}")
+        # 预热进程池，排除子进程启动时间
+        extract_pdf(corpus(8)['text'], max_pages=8, workers=args.workers)
+        for name, file_bytes in corpus(args.parallel_pages).items():
+            serial_ms = timed(lambda b: extract_pdf(b, max_pages=args.parallel_pages), file_bytes, args.repeat)
+            parallel_ms = timed(lambda b: extract_pdf(b, max_pages=args.parallel_pages, workers=args.workers),
+                                file_bytes, args.repeat)
+            serial = extract_pdf(file_bytes, max_pages=args.parallel_pages)
+            parallel = extract_pdf(file_bytes, max_pages=args.parallel_pages, workers=args.workers)
+            assert parallel['text'] == serial['text'], '并行结果与串行不一致'
+            print(f"{name:>10} {serial_ms:>10.1f} {parallel_ms:>12.1f} {serial_ms / parallel_ms:>7.2f}x")
+        shutdown_pool()
+
+
+if __name__ == '__main__':
+    main()
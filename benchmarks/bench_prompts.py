@@ -0,0 +1,52 @@
+# benchmarks/bench_prompts.py
+"""
+提示词组装基准测试：同一用户重复解读不同论文时，单次构建解读消息与图表提示词的耗时
+用法: python benchmarks/bench_prompts.py [--calls 20000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from prompt_cases import PAPER, import_app, interpretation_cases  # noqa: E402
+
+
+def bench(fn, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = import_app()
+    cases = dict(interpretation_cases())
+    papers = [f"{i}\n{PAPER}" for i in range(64)]
+
+    print(f"{'case':>24} {'us/call':>10}")
+    for name in ('zh-s3-q1-h1-c0-3000', 'en-s2-q1-h1-c0-3000', 'zh-s0-q0-h0-c0-3000'):
+        kwargs = dict(cases[name])
+        # 用户记录中保存了问卷写入时计算的画像
+        user_data = kwargs['user_data']
+        kwargs['user_data'] = dict(user_data, profile=app.build_profile(user_data['questionnaire']))
+
+        def build(i, kwargs=kwargs):
+            kwargs['paper_content'] = papers[i % len(papers)]
+            app.build_interpretation_messages(**kwargs)
+
+        print(f"{name:>24} {bench(build, args.calls):>10.2f}")
+
+    def chart(i):
+        app.build_chart_prompt('ABCD'[i % 4], papers[i % len(papers)][:3000], 'zh' if i % 2 else 'en')
+
+    print(f"{'chart prompts':>24} {bench(chart, args.calls):>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/bench_upload_memory.py
+"""
+上传内存基准测试：对比旧版（file.read() 整体读入，bytes交给哈希和各解析器）
+与落盘方式（multipart解析时写入 UPLOAD_FOLDER 并计算哈希，解析器按路径读取）
+处理一次上传的峰值RSS增量；每种方式在独立子进程中运行（需要Linux的 /proc）
+用法: python benchmarks/bench_upload_memory.py [--mb 15] [--pages 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BOUNDARY = 'ansapra-bench-boundary'
+MODES = ('legacy', 'spooled')
+
+
+def write_multipart(path, pdf_bytes):
+    """把上传请求体写入文件，子进程从文件流式读取（模拟从socket读取）"""
+    with open(path, 'wb') as f:
+        f.write(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="paper.pdf"\r\n'
+            'Content-Type: application/pdf\r\n\r\n'.encode('latin-1')
+        )
+        f.write(pdf_bytes)
+        f.write(f'\r\n--{BOUNDARY}--\r\n'.encode('latin-1'))
+    return os.path.getsize(path)
+
+
+def read_status(field):
+    """读取 /proc/self/status 中的内存字段（KB）"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_child(mode, body_path, pages):
+    """子进程：处理同一个上传请求两次（第一次预热导入和缓存），第二次记录峰值RSS增量"""
+    from flask import Flask, request
+
+    from pdf_cache import content_hash
+    from pdf_extract import extract_pdf
+    from upload_spool import SpoolingRequest, spool_upload
+
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = tempfile.mkdtemp()
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+    if mode == 'spooled':
+        app.request_class = SpoolingRequest
+    size = os.path.getsize(body_path)
+
+    def handle():
+        with open(body_path, 'rb') as body, app.test_request_context(
+            '/api/interpret', method='POST', input_stream=body,
+            content_type=f'multipart/form-data; boundary={BOUNDARY}', content_length=size
+        ):
+            file = request.files['file']
+            if mode == 'legacy':
+                file.seek(0)
+                file_bytes = file.read()
+                key = content_hash(file_bytes)
+                result = extract_pdf(file_bytes, max_pages=pages)
+            else:
+                upload = spool_upload(file, app.config['UPLOAD_FOLDER'])
+                try:
+                    key = upload.sha256
+                    result = extract_pdf(upload.path, max_pages=pages)
+                finally:
+                    upload.discard()
+            assert result['success'] and key
+
+    handle()
+    baseline = read_status('VmRSS')
+    # 重置峰值RSS（VmHWM）
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    start = time.perf_counter()
+    handle()
+    seconds = time.perf_counter() - start
+    print(json.dumps({
+        'baseline_kb': baseline,
+        'peak_kb': read_status('VmHWM'),
+        'seconds': seconds,
+        'leftover_files': len(os.listdir(app.config['UPLOAD_FOLDER']))
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=float, default=15, help='上传PDF的大小（MB，不超过16MB上限）')
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'BODY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.pages)
+        return
+
+    from pdf_corpus import build_pdf, text_page
+
+    text_pdf = build_pdf([text_page(i) for i in range(args.pages)])
+    pdf_bytes = build_pdf(
+        [text_page(i) for i in range(args.pages)],
+        padding=max(0, int(args.mb * 1024 * 1024) - len(text_pdf))
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        body_path = os.path.join(tmp, 'body.bin')
+        body_size = write_multipart(body_path, pdf_bytes)
+        print(f"上传PDF {len(pdf_bytes) / 1024 / 1024:.1f}MB，{args.pages}页，请求体 {body_size / 1024 / 1024:.1f}MB")
+
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--pages', str(args.pages), '--child', mode, body_path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            delta_mb = (result['peak_kb'] - result['baseline_kb']) / 1024
+            print(f"{mode:8s} 峰值RSS增量 {delta_mb:6.1f}MB  耗时 {result['seconds'] * 1000:.0f}ms  "
+                  f"遗留临时文件 {result['leftover_files']}")
+
+
+if __name__ == '__main__':
+    main()
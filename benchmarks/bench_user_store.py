@@ -0,0 +1,126 @@
+# benchmarks/bench_user_store.py
+"""
+用户存储基准测试：对比旧版整体JSON读写、按记录改写（历史内嵌在用户记录中）
+与追加写入历史日志在不同用户规模下的单请求延迟
+用法: python benchmarks/bench_user_store.py [--sizes 100,1000,10000,100000] [--ops 500]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_store import UserStore  # noqa: E402
+
+
+def make_user(i):
+    """生成一个带历史记录的模拟用户"""
+    email = f"user{i}@example.com"
+    return email, {
+        'id': str(uuid.uuid4()),
+        'email': email,
+        'username': f"user{i}",
+        'password_hash': 'pbkdf2:sha256:600000$salt$' + 'f' * 64,
+        'questionnaire': {'grade': 'B', 'education_system': 'A'},
+        'settings': {'reading': {'depth': 'B', 'style': 'C'}, 'language': 'zh'},
+        'reading_history': [
+            {'paper_content': 'x' * 500, 'interpretation': 'y' * 1000}
+            for _ in range(5)
+        ],
+        'chat_history': [],
+    }
+
+
+def bench_store(store, emails, ops):
+    """单请求：读一个用户 + 改写用户记录追加一条历史"""
+    def apply(user):
+        user['reading_history'].insert(0, {'paper_content': 'new', 'interpretation': 'new'})
+        user['reading_history'] = user['reading_history'][:50]
+
+    samples = []
+    for _ in range(ops):
+        email = random.choice(emails)
+        start = time.perf_counter()
+        store.get(email)
+        store.update(email, apply)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_history(store, emails, ops):
+    """单请求：读一个用户 + 向历史日志追加一行"""
+    samples = []
+    for _ in range(ops):
+        email = random.choice(emails)
+        start = time.perf_counter()
+        store.get(email)
+        store.append_history(email, 'reading', {'paper_content': 'new', 'interpretation': 'new'})
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_json(path, emails, ops):
+    """旧版：每次请求整体读取再整体写回 users.json"""
+    samples = []
+    for _ in range(ops):
+        email = random.choice(emails)
+        start = time.perf_counter()
+        with open(path, 'r', encoding='utf-8') as f:
+            users = json.load(f)
+        users[email]['reading_history'].insert(0, {'paper_content': 'new', 'interpretation': 'new'})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(users, f, ensure_ascii=False, indent=2)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    mean = sum(samples) / len(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return mean * 1000, p99 * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100,1000,10000,100000')
+    parser.add_argument('--ops', type=int, default=500)
+    parser.add_argument('--json-max', type=int, default=10000,
+                        help='超过该规模不再测试旧版JSON（太慢）')
+    args = parser.parse_args()
+
+    print(f"{'users':>8} {'store mean ms':>14} {'store p99 ms':>13} {'log mean ms':>12} {'log p99 ms':>11} "
+          f"{'json mean ms':>13} {'json p99 ms':>12}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        users = dict(make_user(i) for i in range(size))
+        emails = list(users)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = UserStore(os.path.join(tmp, 'users.db'))
+            store.import_users(users)
+            store_mean, store_p99 = summarize(bench_store(store, emails, args.ops))
+
+            log_store = UserStore(os.path.join(tmp, 'users-log.db'))
+            log_store.import_users(users)
+            log_store.migrate_embedded_history()
+            log_mean, log_p99 = summarize(bench_history(log_store, emails, args.ops))
+
+            json_cols = f"{'-':>13} {'-':>12}"
+            if size <= args.json_max:
+                json_path = os.path.join(tmp, 'users.json')
+                with open(json_path, 'w', encoding='utf-8') as f:
+                    json.dump(users, f, ensure_ascii=False, indent=2)
+                json_ops = max(5, min(args.ops, 200000 // size))
+                json_mean, json_p99 = summarize(bench_json(json_path, emails, json_ops))
+                json_cols = f"{json_mean:>13.3f} {json_p99:>12.3f}"
+
+        print(f"{size:>8} {store_mean:>14.3f} {store_p99:>13.3f} {log_mean:>12.3f} {log_p99:>11.3f} {json_cols}")
+
+
+if __name__ == '__main__':
+    main()
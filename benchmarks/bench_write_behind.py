@@ -0,0 +1,123 @@
+# benchmarks/bench_write_behind.py
+"""
+写缓冲吞吐基准测试：多线程并发调用修改用户数据的路由和函数
+（POST /api/user/settings、POST /api/login、聊天记录保存、阅读历史保存），
+对比直接写入（WRITE_BEHIND_INTERVAL=0）与批量提交的吞吐和延迟；每种方式在独立子进程中运行
+用法: python benchmarks/bench_write_behind.py [--threads 8] [--seconds 3] [--interval 1]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPERATIONS = ('settings', 'login', 'chat_save', 'history_save')
+
+
+def run_child(threads, seconds):
+    """子进程：每种操作用 threads 个线程各跑 seconds 秒"""
+    import logging
+    logging.disable(logging.CRITICAL)
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, ROOT)
+    from werkzeug.security import generate_password_hash
+
+    import app as app_module
+
+    # 基准测试只关心写入，密码哈希使用最少的迭代次数（与 PASSWORD_HASH_METHOD 一致，登录时不会重新计算）
+    password_hash = generate_password_hash('bench', method=os.environ['PASSWORD_HASH_METHOD'])
+    emails = [f"bench{i}@example.com" for i in range(threads)]
+    for email in emails:
+        app_module.user_store.insert(email, {
+            'id': email, 'email': email, 'username': email, 'password_hash': password_hash,
+            'settings': {'language': 'zh', 'reading': {}, 'visual': {}}, 'questionnaire': {}
+        })
+
+    def worker(index, operation, deadline, samples):
+        email = emails[index]
+        client = app_module.app.test_client()
+        client.post('/api/login', json={'email': email, 'password': 'bench'})
+        n = 0
+        while time.perf_counter() < deadline:
+            n += 1
+            start = time.perf_counter()
+            if operation == 'settings':
+                response = client.post('/api/user/settings', json={'settings': {'language': 'zh', 'n': n}})
+                assert response.status_code == 200
+            elif operation == 'login':
+                response = client.post('/api/login', json={'email': email, 'password': 'bench'})
+                assert response.status_code == 200
+            elif operation == 'chat_save':
+                app_module.add_chat_history(email, {'question': f'q{n}', 'answer': 'a' * 500})
+            else:
+                app_module.add_to_history(email, {'paper_content': 'p' * 500, 'interpretation': 'i' * 1000})
+            samples.append(time.perf_counter() - start)
+
+    results = {}
+    for operation in OPERATIONS:
+        samples = []
+        deadline = time.perf_counter() + seconds
+        workers = [threading.Thread(target=worker, args=(i, operation, deadline, samples)) for i in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        start = time.perf_counter()
+        app_module.write_behind.flush()
+        samples.sort()
+        results[operation] = {
+            'ops_per_second': len(samples) / seconds,
+            'p50_ms': samples[len(samples) // 2] * 1000,
+            'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+            'final_flush_ms': (time.perf_counter() - start) * 1000
+        }
+    results['write_behind'] = app_module.write_behind.stats()
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--interval', type=float, default=1.0, help='批量提交间隔（秒）')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.threads, args.seconds)
+        return
+
+    print(f"{args.threads}个线程，每种操作 {args.seconds:g} 秒")
+    print(f"{'interval':>8} {'operation':>13} {'ops/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for interval in (0, args.interval):
+            env = dict(
+                os.environ,
+                WRITE_BEHIND_INTERVAL=str(interval),
+                USERS_DB=os.path.join(tmp, f'users-{interval}.db'),
+                SESSION_DB=os.path.join(tmp, f'sessions-{interval}.db'),
+                STATIC_ASSETS_ENABLED='0',
+                PASSWORD_HASH_METHOD='pbkdf2:sha256:1',
+                RATE_LIMIT_ENABLED='0'
+            )
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--threads', str(args.threads),
+                 '--seconds', str(args.seconds), '--child'],
+                check=True, capture_output=True, text=True, env=env
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            for operation in OPERATIONS:
+                r = result[operation]
+                print(f"{interval:>8g} {operation:>13} {r['ops_per_second']:>9.0f} "
+                      f"{r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f}")
+            stats = result['write_behind']
+            if stats['flushes']:
+                print(f"{'':>8} 批量提交 {stats['flushes']} 次，平均每批 {stats['flushed'] / stats['flushes']:.0f} 条")
+
+
+if __name__ == '__main__':
+    main()
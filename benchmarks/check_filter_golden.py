@@ -0,0 +1,58 @@
+# benchmarks/check_filter_golden.py
+"""
+元数据过滤回归对比：filter_pdf_metadata 在回归语料上的输出必须与
+golden/filter_pdf_metadata.json（按用例保存输出的SHA-256）以及改写前的实现逐字节一致
+用法: python benchmarks/check_filter_golden.py [--update]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from filter_cases import corpus, legacy_filter_pdf_metadata  # noqa: E402
+from pdf_extract import filter_pdf_metadata  # noqa: E402
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'filter_pdf_metadata.json')
+
+
+def digest(value):
+    return hashlib.sha256(value.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--update', action='store_true', help='用当前实现重新生成金标准')
+    args = parser.parse_args()
+    # 过度过滤回退会打印警告，对比时不需要
+    logging.disable(logging.WARNING)
+
+    cases = corpus()
+    rendered = {name: digest(filter_pdf_metadata(text)) for name, text in cases}
+
+    if args.update:
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+            json.dump(rendered, f, indent=1, sort_keys=True)
+        print(f"已写入 {len(rendered)} 个用例 -> {GOLDEN_PATH}")
+        return
+
+    with open(GOLDEN_PATH, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+
+    legacy = {name: digest(legacy_filter_pdf_metadata(text)) for name, text in cases}
+    failures = [
+        name for name in sorted(set(golden) | set(rendered))
+        if golden.get(name) != rendered.get(name) or legacy.get(name) != rendered.get(name)
+    ]
+    for name in failures[:20]:
+        print(f"不一致: {name}")
+    print(f"{len(golden) - len(failures)}/{len(golden)} 个用例一致")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
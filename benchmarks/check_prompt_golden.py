@@ -0,0 +1,69 @@
+# benchmarks/check_prompt_golden.py
+"""
+提示词金标准对比：解读提示词与图表提示词必须与 golden/prompts.json 逐字节一致
+（金标准按用例保存渲染结果的SHA-256）
+用法: python benchmarks/check_prompt_golden.py [--update]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from prompt_cases import chart_cases, import_app, interpretation_cases  # noqa: E402
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'prompts.json')
+
+
+def digest(value):
+    encoded = json.dumps(value, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def render_all(app, stored_profile=False):
+    rendered = {}
+    for name, kwargs in interpretation_cases():
+        if stored_profile:
+            # 模拟问卷写入时已保存画像的用户记录
+            user_data = kwargs['user_data']
+            kwargs['user_data'] = dict(user_data, profile=app.build_profile(user_data['questionnaire']))
+        messages, max_tokens = app.build_interpretation_messages(**kwargs)
+        rendered[f"interpret/{name}"] = digest({'messages': messages, 'max_tokens': max_tokens})
+    for name, kwargs in chart_cases():
+        rendered[f"chart/{name}"] = digest(app.build_chart_prompt(**kwargs))
+    return rendered
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--update', action='store_true', help='用当前实现重新生成金标准')
+    args = parser.parse_args()
+
+    app = import_app()
+    # 渲染两遍，第二遍使用已保存的用户画像并走记忆化缓存
+    rendered = render_all(app)
+    rendered_again = render_all(app, stored_profile=True)
+
+    if args.update:
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+            json.dump(rendered, f, indent=1, sort_keys=True)
+        print(f"已写入 {len(rendered)} 个用例 -> {GOLDEN_PATH}")
+        return
+
+    with open(GOLDEN_PATH, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+
+    failures = [
+        name for name in sorted(set(golden) | set(rendered))
+        if golden.get(name) != rendered.get(name) or golden.get(name) != rendered_again.get(name)
+    ]
+    for name in failures[:20]:
+        print(f"不一致: {name}")
+    print(f"{len(golden) - len(failures)}/{len(golden)} 个用例一致")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
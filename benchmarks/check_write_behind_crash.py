@@ -0,0 +1,136 @@
+# benchmarks/check_write_behind_crash.py
+"""
+写缓冲崩溃一致性检查：子进程通过 WriteBehindBuffer 不断对几个用户交替写入设置和聊天记录
+（每个操作带全局递增序号），在随机时刻被 SIGKILL；之后检查数据库：
+- SQLite完整性检查通过，所有用户记录可解析
+- 已提交的内容恰好是某个序号 M 之前的全部操作（批量提交不会只生效一部分，也不会乱序）
+用法: python benchmarks/check_write_behind_crash.py [--trials 20] [--interval 0.05]
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_store import UserStore  # noqa: E402
+from write_behind import WriteBehindBuffer  # noqa: E402
+
+USERS = [f"crash{i}@example.com" for i in range(3)]
+
+
+def operation(seq):
+    """序号对应的操作：(用户, 类型)，类型为 'settings' 或 'chat'"""
+    email = USERS[seq % len(USERS)]
+    kind = 'settings' if (seq // len(USERS)) % 3 == 0 else 'chat'
+    return email, kind
+
+
+def run_child(db_path, interval):
+    """子进程：不停写入直到被杀死，每100个操作输出一次已发出的序号"""
+    store = UserStore(db_path)
+    buffer = WriteBehindBuffer(store, interval=interval, max_pending=200)
+    seq = 0
+    while True:
+        seq += 1
+        email, kind = operation(seq)
+        if kind == 'settings':
+            buffer.update_fields(email, {'settings': {'seq': seq}})
+        else:
+            buffer.append_history(email, 'chat', {'seq': seq})
+        if seq % 100 == 0:
+            print(seq, flush=True)
+            time.sleep(0.001)
+
+
+def expected_state(max_seq):
+    """序号不超过 max_seq 的操作全部生效时每个用户的 (设置序号, 聊天序号列表)"""
+    state = {email: (None, []) for email in USERS}
+    for seq in range(1, max_seq + 1):
+        email, kind = operation(seq)
+        settings, chats = state[email]
+        if kind == 'settings':
+            state[email] = (seq, chats)
+        else:
+            chats.append(seq)
+    return state
+
+
+def verify(db_path):
+    """返回 (是否一致, 已提交的最大序号, 说明)"""
+    conn = sqlite3.connect(db_path)
+    integrity = conn.execute('PRAGMA integrity_check').fetchone()[0]
+    conn.close()
+    if integrity != 'ok':
+        return False, 0, f"完整性检查失败: {integrity}"
+
+    store = UserStore(db_path)
+    actual = {}
+    for email in USERS:
+        user = store.get(email)
+        if user is None:
+            return False, 0, f"用户丢失: {email}"
+        settings_seq = (user.get('settings') or {}).get('seq')
+        rows = store._connect().execute(
+            "SELECT data FROM history WHERE email = ? AND kind = 'chat' ORDER BY id", (email,)
+        ).fetchall()
+        actual[email] = (settings_seq, [json.loads(data)['seq'] for data, in rows])
+
+    max_seq = max([s or 0 for s, _ in actual.values()] + [c[-1] for _, c in actual.values() if c] + [0])
+    expected = expected_state(max_seq)
+    for email in USERS:
+        settings_seq, chats = actual[email]
+        expected_settings, expected_chats = expected[email]
+        # 超出上限的旧聊天记录已被压缩，保留的应是最近的连续一段
+        if settings_seq != expected_settings or chats != expected_chats[len(expected_chats) - len(chats):]:
+            return False, max_seq, f"{email} 的状态不是任何一个前缀: 设置={settings_seq} 聊天={chats[-5:]}"
+        if len(chats) < min(len(expected_chats), 50):
+            return False, max_seq, f"{email} 的聊天记录少于应保留的条数: {len(chats)}"
+    return True, max_seq, ''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trials', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.05)
+    parser.add_argument('--child', metavar='DB', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.interval)
+        return
+
+    failures = 0
+    for trial in range(args.trials):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'users.db')
+            store = UserStore(db_path)
+            for email in USERS:
+                store.insert(email, {'email': email, 'settings': {}})
+
+            child = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--interval', str(args.interval), '--child', db_path],
+                stdout=subprocess.PIPE, text=True
+            )
+            time.sleep(random.uniform(0.2, 1.0))
+            child.send_signal(signal.SIGKILL)
+            output, _ = child.communicate()
+            issued = int(output.split()[-1]) if output.split() else 0
+
+            ok, committed, message = verify(db_path)
+            failures += not ok
+            print(f"第{trial + 1:>2}次: {'一致' if ok else '不一致'}  已提交到序号 {committed}"
+                  f"（已发出 ≥{issued}）{message}")
+
+    print(f"{args.trials - failures}/{args.trials} 次一致")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# benchmarks/fake_deepseek.py
+"""
+本地模拟DeepSeek服务器，用于负载测试和基准测试
+支持普通响应与流式（SSE）响应，可配置延迟
+用法: python benchmarks/fake_deepseek.py [--port 18080] [--delay 2.0]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = "关键词：测试 / Test。这是模拟的DeepSeek解读内容。解读内容由DeepSeek AI生成，仅供参考"
+
+
+class FakeDeepSeekHandler(BaseHTTPRequestHandler):
+    """模拟 /v1/chat/completions 接口"""
+
+    # 支持keep-alive，便于验证客户端的连接复用
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，关闭Nagle避免keep-alive连接上的40ms延迟确认
+    disable_nagle_algorithm = True
+    delay = 1.0           # 完整响应前的等待秒数（流式模式下为首个token前的等待）
+    chunk_delay = 0.01    # 流式模式下每个数据块之间的间隔
+    answer = DEFAULT_ANSWER
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        self.server.record_request(payload)
+
+        # 模拟限流/服务端错误：前 failures 个请求返回503
+        if self.server.take_failure():
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        time.sleep(self.delay)
+
+        if payload.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            # 流式响应没有Content-Length，结束时关闭连接
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            for ch in self.answer:
+                chunk = {'choices': [{'delta': {'content': ch}}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(self.chunk_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        body = json.dumps({
+            'choices': [{'message': {'role': 'assistant', 'content': self.answer}}]
+        }, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeDeepSeekServer(ThreadingHTTPServer):
+    """在线程中运行的模拟服务器，记录收到的请求"""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, delay=1.0, failures=0):
+        handler = type('Handler', (FakeDeepSeekHandler,), {'delay': delay})
+        super().__init__(('127.0.0.1', port), handler)
+        self.requests = []
+        self.failures = failures
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def record_request(self, payload):
+        with self._lock:
+            self.requests.append(payload)
+
+    def take_failure(self):
+        with self._lock:
+            if self.failures > 0:
+                self.failures -= 1
+                return True
+            return False
+
+    def process_request(self, request, client_address):
+        # 统计新建的TCP连接数，用于验证连接复用
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/v1/chat/completions"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--delay', type=float, default=1.0)
+    parser.add_argument('--failures', type=int, default=0, help='前N个请求返回503')
+    args = parser.parse_args()
+    server = FakeDeepSeekServer(args.port, args.delay, args.failures)
+    print(f"模拟DeepSeek服务运行于 {server.url}（延迟 {args.delay} 秒）")
+    server.serve_forever()
@@ -0,0 +1,172 @@
+# benchmarks/filter_cases.py
+"""
+filter_pdf_metadata 的回归语料：论文正文、PDF元数据/内部结构行、页码、乱码、
+Unicode大小写与数字边界，以及固定种子的随机组合；
+legacy_filter_pdf_metadata 为改写前的实现，作为对照
+"""
+import logging
+import random
+
+from pdf_corpus import PARAGRAPH
+
+logger = logging.getLogger(__name__)
+
+
+def legacy_filter_pdf_metadata(text):
+    """改写前的逐关键词、逐字符实现（原样保留）"""
+    if not text:
+        return ""
+
+    metadata_keywords = [
+        'Metadata', 'Creator', 'Producer', 'CreationDate', 'ModDate',
+        'Author', 'Title', 'Subject', 'Keywords', 'PDF', 'Version',
+        'Page', 'Pages', 'Document', 'File', 'Software',
+        'Generated by', 'Created by', 'Produced by', 'Written by',
+        'File:', 'Title:', 'Subject:', 'Keywords:', 'Author:',
+        'Creator:', 'Producer:', 'CreationDate:', 'ModDate:',
+        'PDF-', 'xref', 'trailer', 'startxref', 'obj', 'endobj',
+        'stream', 'endstream', 'xref', 'catalog', 'pages', 'page',
+        'font', 'fonts', 'xref', 'trailer', 'startxref', 'obj', 'endobj',
+        'stream', 'endstream', 'xref', 'catalog', 'pages', 'page',
+        'font', 'fonts', 'xref', 'trailer', 'startxref', 'obj', 'endobj'
+    ]
+
+    lines = text.split('\n')
+    filtered_lines = []
+
+    for line in lines:
+        stripped_line = line.strip()
+        if not stripped_line:
+            continue
+
+        is_metadata = False
+        for keyword in metadata_keywords:
+            if keyword.lower() in stripped_line.lower():
+                if len(stripped_line) < 200 or keyword in ['PDF-', 'xref', 'trailer', 'startxref', 'obj', 'endobj', 'stream', 'endstream']:
+                    is_metadata = True
+                    break
+        if is_metadata:
+            continue
+
+        if stripped_line.isdigit() and len(stripped_line) <= 3:
+            continue
+
+        special_chars = sum(1 for c in stripped_line if not c.isalnum() and not c.isspace() and c not in ',.!?;:()[]{}<>"\'')
+        if special_chars / len(stripped_line) > 0.5:
+            continue
+
+        if stripped_line.startswith('%') and len(stripped_line) < 50:
+            continue
+
+        filtered_lines.append(line)
+
+    filtered_text = '\n'.join(filtered_lines)
+    while '\n\n\n' in filtered_text:
+        filtered_text = filtered_text.replace('\n\n\n', '\n\n')
+    filtered_text = filtered_text.strip()
+
+    if len(filtered_text) < 100 and len(text) > 100:
+        logger.warning("过滤后文本过短，可能是过滤过度")
+        return text.strip()
+
+    return filtered_text
+
+
+# 各类边界行
+METADATA_LINES = (
+    "Creator: Microsoft Word", "PRODUCER: Acrobat Distiller 9.0", "CreationDate: D:20240101",
+    "moddate D:20240102", "Author: J. Smith", "Title: On Chloroplasts", "Subject - biology",
+    "Keywords: photosynthesis", "%PDF-1.7", "%%EOF", "Version 2", "Page 3 of 12", "pages",
+    "Document ID 1234", "File: paper.pdf", "Software used", "Generated by LaTeX",
+    "created BY pdfTeX", "Produced by Ghostscript", "Written by hand", "xref", "trailer",
+    "startxref 1234", "1 0 obj", "endobj", "stream", "endstream", "/Type /Catalog",
+    "/Font /F1", "fonts embedded", "metadata block", "Titled results",
+)
+STRUCTURE_WORDS = ('pdf-', 'XREF', 'Trailer', 'startxref', 'obj', 'ENDOBJ', 'Stream', 'endstream')
+PLAIN_WORDS = ('Title', 'author', 'PAGE', 'font', 'Document', 'creator', 'software', 'catalog', 'version')
+PAGE_NUMBERS = ("1", "12", "123", "1234", "٣", "١٢", "²", "0", "007", " 42 ", "4a")
+SPECIAL_LINES = (
+    "@@@@ ####", "∑∫∂ √π", "(a), [b]; {c}: <d>!", "'quoted' \"text\"", "— – …", "★☆★ ok",
+    "a-b-c-d", "x = y + z", "###abc", "$$", "ab$$", "αβγ δεζ", "ⅠⅡⅢ", "①②③ abc", "_ _ _",
+    "%", "% comment", "%" + "x" * 60, "100%", "\x00\x01\x02", "﻿bom line", "テキスト・データ",
+)
+UNICODE_CASE = (
+    "İstanbul page", "Keywords", "ﬁle name here", "PÄGE", "ΣTREAM", "Straße", "ǅ title",
+    "ⓅⒹⒻ circled", "ｐｄｆ fullwidth", "İXREF",
+)
+WHITESPACE = ("", " ", "\t", "\r", "　", "\x0b", "\x0c", " ", " ", "  \r")
+
+
+def _long_line(rng, word=None, length=220):
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        words.append(rng.choice(PARAGRAPH).split(' ')[rng.randrange(8)])
+    if word is not None:
+        words.insert(rng.randrange(len(words) + 1), word)
+    return ' '.join(words)
+
+
+def corpus(seed=20240601, random_cases=400):
+    """返回 [(名称, 文本)]"""
+    rng = random.Random(seed)
+    cases = [
+        ('empty', ''),
+        ('none', None),
+        ('whitespace', ' \n\t\n \r\n'),
+        ('short_text', 'short'),
+        ('paper', '\n'.join(PARAGRAPH * 4)),
+        ('paper_blank_lines', '\n\n\n'.join(PARAGRAPH) + '\n\n\n\n'),
+        ('only_metadata', '\n'.join(METADATA_LINES)),
+        ('only_metadata_short', '\n'.join(METADATA_LINES[:3])),
+        ('overfiltered_exactly_100', 'x' * 100),
+        ('overfiltered_101', '\n'.join(['Page 1'] * 20) + 'x' * 5),
+    ]
+
+    for name, lines in (('metadata', METADATA_LINES), ('page_numbers', PAGE_NUMBERS),
+                        ('special', SPECIAL_LINES), ('unicode_case', UNICODE_CASE)):
+        for i, line in enumerate(lines):
+            # 单独一行（文本很短，不触发过度过滤回退）以及夹在正文中
+            cases.append((f'{name}/{i}/alone', line))
+            cases.append((f'{name}/{i}/in_paper', '\n'.join(PARAGRAPH[:2] + (line,) + PARAGRAPH[2:])))
+
+    # 200字符边界：普通关键词只在短行中生效，内部结构关键词任何长度都生效
+    for length in (190, 198, 199, 200, 201, 260):
+        for word in STRUCTURE_WORDS + PLAIN_WORDS:
+            line = _long_line(rng, word, length)
+            line = (line + ' filler' * 40)[:length] if len(line) < length else line[:length]
+            cases.append((f'long/{length}/{word}', '\n'.join(PARAGRAPH + (line,))))
+
+    for length in (1, 2, 3, 49, 50, 51):
+        cases.append((f'percent/{length}', '\n'.join(PARAGRAPH + ('%' + 'a' * (length - 1),))))
+
+    # 随机组合：正文、边界行、空白与换行混排
+    pools = (PARAGRAPH, METADATA_LINES, PAGE_NUMBERS, SPECIAL_LINES, UNICODE_CASE, WHITESPACE)
+    for i in range(random_cases):
+        parts = []
+        for _ in range(rng.randrange(1, 40)):
+            pool = rng.choice(pools)
+            line = rng.choice(pool)
+            if rng.random() < 0.2:
+                line = rng.choice(WHITESPACE) + line + rng.choice(WHITESPACE)
+            if rng.random() < 0.05:
+                line = _long_line(rng, rng.choice(STRUCTURE_WORDS + PLAIN_WORDS + (None,)))
+            parts.append(line)
+            if rng.random() < 0.2:
+                parts.append('\n' * rng.randrange(1, 5))
+        cases.append((f'random/{i}', '\n'.join(parts)))
+    return cases
+
+
+def pages_text(pages=100):
+    """模拟逐页提取到的论文文本：正文段落、页眉页脚、页码和少量内部结构残留"""
+    rng = random.Random(pages)
+    result = []
+    for page in range(1, pages + 1):
+        lines = [f"Journal of Plant Biology  Page {page}"]
+        for _ in range(45):
+            lines.append(' '.join(rng.choice(PARAGRAPH) for _ in range(2)))
+            if rng.random() < 0.1:
+                lines.append('')
+        lines.extend([rng.choice(SPECIAL_LINES), rng.choice(METADATA_LINES), str(page)])
+        result.append('\n'.join(lines))
+    return result
@@ -0,0 +1,144 @@
+# benchmarks/load_test.py
+"""
+并发负载测试：用本地模拟DeepSeek服务器，对比 sync 与 gthread worker 下
+并发 /api/interpret、/api/chat、/api/generate-charts 请求的总耗时，负载期间 /health 的延迟，
+以及超出准入上限被拒绝（429/503）的请求数和拒绝响应的最长耗时
+用法: python benchmarks/load_test.py [--concurrency 1,8,32] [--delay 2.0] [--worker-classes sync,gthread]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_deepseek import FakeDeepSeekServer  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_app(worker_class, threads, fake_url, tmp_dir):
+    """以指定worker类型启动gunicorn"""
+    # threads > 1 时gunicorn会自动把sync换成gthread，对照组必须是单线程
+    if worker_class == 'sync':
+        threads = 1
+    port = free_port()
+    env = dict(os.environ,
+               DEEPSEEK_API_KEY='test-key',
+               DEEPSEEK_API_URL=fake_url,
+               USERS_DB=os.path.join(tmp_dir, f'users-{worker_class}.db'),
+               GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_THREADS=str(threads))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn_config.py',
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', '--access-logfile', '/dev/null'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(base + '/health', timeout=1)
+            return proc, base
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('gunicorn 启动失败')
+
+
+def login(base):
+    session = requests.Session()
+    session.post(base + '/api/register', json={
+        'email': 'load@example.com', 'username': 'load', 'password': 'load-password'
+    })
+    session.post(base + '/api/login', json={'email': 'load@example.com', 'password': 'load-password'})
+    return session
+
+
+def fire(session, base, i):
+    """轮流发送三种LLM请求，返回 (状态码, 耗时)"""
+    start = time.perf_counter()
+    kind = i % 3
+    if kind == 0:
+        r = session.post(base + '/api/interpret', data={'text': '测试论文内容 ' * 50}, timeout=600)
+    elif kind == 1:
+        r = session.post(base + '/api/chat', json={'question': '这篇论文讲了什么？'}, timeout=600)
+    else:
+        r = session.post(base + '/api/generate-charts', json={'paper_content': '测试论文内容', 'chart_types': ['A']}, timeout=600)
+    return r.status_code, time.perf_counter() - start
+
+
+def probe_health(base, stop, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            requests.get(base + '/health', timeout=600)
+            samples.append(time.perf_counter() - start)
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+
+
+def run(base, concurrency):
+    session = login(base)
+    stop = threading.Event()
+    health_samples = []
+    prober = threading.Thread(target=probe_health, args=(base, stop, health_samples), daemon=True)
+    prober.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: fire(session, base, i), range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    prober.join()
+    ok = sum(1 for status, _ in results if status == 200)
+    shed = [seconds for status, seconds in results if status in (429, 503)]
+    health_max = max(health_samples) * 1000 if health_samples else float('nan')
+    shed_max = max(shed) * 1000 if shed else float('nan')
+    return elapsed, ok, len(shed), shed_max, health_max
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--delay', type=float, default=2.0, help='模拟DeepSeek响应延迟（秒）')
+    parser.add_argument('--worker-classes', default='sync,gthread')
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    fake = FakeDeepSeekServer(delay=args.delay).start()
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    print(f"模拟DeepSeek延迟 {args.delay}s")
+    print(f"{'worker':>8} {'concurrency':>12} {'wall s':>8} {'ok':>5} {'shed':>5} {'shed max ms':>12} "
+          f"{'req/s':>7} {'/health max ms':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for worker_class in args.worker_classes.split(','):
+            proc, base = start_app(worker_class, args.threads, fake.url, tmp)
+            try:
+                for concurrency in levels:
+                    elapsed, ok, shed, shed_max, health_max = run(base, concurrency)
+                    print(f"{worker_class:>8} {concurrency:>12} {elapsed:>8.2f} {ok:>5} {shed:>5} {shed_max:>12.1f} "
+                          f"{concurrency / elapsed:>7.2f} {health_max:>15.1f}")
+            finally:
+                proc.terminate()
+                proc.wait()
+    fake.shutdown()
+
+
+if __name__ == '__main__':
+    main()
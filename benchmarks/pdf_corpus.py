@@ -0,0 +1,75 @@
+# benchmarks/pdf_corpus.py
+"""
+生成基准测试用的PDF语料（无需额外依赖）：
+文本型论文、无文字页面（模拟扫描件）、文字页与空白页混合的文档
+"""
+import random
+
+PARAGRAPH = (
+    "Photosynthesis converts light energy into chemical energy in chloroplasts.",
+    "The light-dependent reactions produce ATP and NADPH across the thylakoid membrane.",
+    "In the Calvin cycle, RuBisCO fixes carbon dioxide into three-carbon sugars.",
+    "We measured absorption spectra of chlorophyll a and b under varying light intensity.",
+    "Results show a 23 percent increase in quantum yield at moderate temperatures.",
+)
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _text_stream(lines):
+    body = " ".join(f"({_escape(line)}) '" for line in lines)
+    return f"BT /F1 10 Tf 12 TL 50 760 Td {body} ET"
+
+
+def _drawing_stream():
+    # 只有图形没有文字，模拟扫描件页面
+    return "0.5 g 50 50 500 700 re f 1 g 100 100 400 600 re f"
+
+
+def build_pdf(pages, padding=0):
+    """
+    pages: 每页为文本行列表，None 表示无文字页面
+    padding: 附加一个不被页面引用的二进制流对象的字节数（模拟嵌入图片的大文件）
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + i * 2} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font_id = 3 + len(pages) * 2
+    for lines in pages:
+        stream = _drawing_stream() if lines is None else _text_stream(lines)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects) + 2} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    if padding:
+        data = random.Random(padding).randbytes(padding)
+        objects.append(f"<< /Length {padding} >>\nstream\n".encode('latin-1') + data + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        body = obj if isinstance(obj, bytes) else obj.encode('latin-1')
+        out += f"{i + 1} 0 obj\n".encode('latin-1') + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('latin-1')
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1')
+    return bytes(out)
+
+
+def text_page(page_num, lines_per_page=50):
+    return [f"[{page_num + 1}.{i + 1}] {PARAGRAPH[i % len(PARAGRAPH)]}" for i in range(lines_per_page)]
+
+
+def corpus(pages=10):
+    """返回 {名称: PDF字节}"""
+    return {
+        'text': build_pdf([text_page(i) for i in range(pages)]),
+        'scanned': build_pdf([None] * pages),
+        'mixed': build_pdf([text_page(i) if i % 2 == 0 else None for i in range(pages)]),
+    }
@@ -0,0 +1,105 @@
+# benchmarks/prompt_cases.py
+"""
+提示词测试用例：覆盖语言、阅读设置、问卷、阅读历史、聊天历史与截取长度的组合，
+供提示词基准测试和金标准对比脚本共用
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAPER = (
+    "Abstract\nPhotosynthesis converts light energy into chemical energy {with braces}.\n"
+    "Introduction\n" + "Chlorophyll absorbs red and blue light; 叶绿素吸收红光和蓝光。\n" * 120
+)
+
+READING_SETTINGS = [
+    None,
+    {},
+    {'depth': 'A', 'style': 'A', 'purpose': 'A', 'time': 'A', 'preparation': 'A',
+     'test_type': ['A'], 'chart_types': ['A']},
+    {'depth': 'C', 'style': 'E', 'purpose': 'D', 'time': 'C', 'preparation': 'C',
+     'test_type': ['A', 'B', 'C'], 'chart_types': ['B', 'D']},
+    {'depth': 'X', 'style': 'B'},
+]
+
+QUESTIONNAIRES = [
+    {},
+    {
+        'education_system': 'A', 'grade': 'C',
+        'interests': {'physics': '5', 'biology': '2', 'astronomy': 4},
+        'learning_frequency': 'A',
+        'learning_styles': {'visual': 5, 'reading': 2},
+        'knowledge_structure': 'B',
+        'scientific_abilities': {'thinking': '4', 'insight': 2, 'sensitivity': 5, 'interdisciplinary': 3},
+        'paper_evaluation_score': '4',
+        'evaluation_criteria': ['C', 'A'],
+        'climate_question': 'D',
+        'physics_question': 'B', 'chemistry_question': 'A', 'geology_question': 'C',
+    },
+    {'education_system': 'B', 'grade': 'A', 'evaluation_criteria': ['E'], 'paper_evaluation_score': 2},
+]
+
+HISTORIES = [
+    [],
+    [{'paper_content': f"历史论文 {i} " + 'x' * 150} for i in range(5)],
+]
+
+CHAT_HISTORIES = [
+    None,
+    [{'question': f"问题{i}", 'answer': f"回答{i}"} for i in range(8)],
+]
+
+
+def import_app():
+    """在临时目录中导入app（避免写入仓库的data目录）"""
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault('USERS_DB', os.path.join(tmp, 'users.db'))
+    os.environ.setdefault('JOBS_DB', os.path.join(tmp, 'jobs.db'))
+    os.environ.setdefault('PDF_CACHE_DIR', os.path.join(tmp, 'pdf_cache'))
+    import logging
+    logging.disable(logging.CRITICAL)
+    import app
+    return app
+
+
+def interpretation_cases():
+    """产出 (用例名, build_interpretation_messages的参数)"""
+    combos = itertools.product(
+        ('zh', 'en'),
+        range(len(READING_SETTINGS)),
+        range(len(QUESTIONNAIRES)),
+        range(len(HISTORIES)),
+        range(len(CHAT_HISTORIES)),
+        (3000, None),
+    )
+    for language, s, q, h, c, limit in combos:
+        reading = READING_SETTINGS[s]
+        user_settings = {} if reading is None else {'reading': reading, 'language': language}
+        user_data = {
+            'email': 'golden@example.com',
+            'settings': user_settings,
+            'questionnaire': QUESTIONNAIRES[q],
+            'reading_history': HISTORIES[h],
+        }
+        name = f"{language}-s{s}-q{q}-h{h}-c{c}-{limit}"
+        yield name, dict(
+            user_data=user_data,
+            paper_content=PAPER,
+            user_settings=user_settings,
+            history=HISTORIES[h],
+            questionnaire=QUESTIONNAIRES[q],
+            chat_history=CHAT_HISTORIES[c],
+            language=language,
+            paper_limit=limit,
+        )
+
+
+def chart_cases():
+    """产出 (用例名, build_chart_prompt的参数)"""
+    for language, chart_type in itertools.product(('zh', 'en', 'fr'), 'ABCDZ'):
+        yield f"{language}-{chart_type}", dict(
+            chart_type=chart_type, paper_content=PAPER[:3000], language=language
+        )
@@ -1,13 +1,19 @@
 # gunicorn.conf.py
 import multiprocessing
+import os
 
 # 服务器设置
 bind = "0.0.0.0:10000"
 workers = 1
-worker_class = "sync"
+# 使用线程worker：每个请求在独立线程中等待DeepSeek响应，
+# 一个进程即可同时处理多个解读/聊天/图表请求，/health 不会被阻塞
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+# 调用AI的路由受准入控制限制（app.py 中的 ADMISSION_*），
+# 并发上限与排队数之和应小于线程数，给 /health 和静态资源留出线程
 
 # 超时设置 - 这是关键！
-timeout = 600  # 3分钟
+timeout = 600  # 10分钟
 keepalive = 5
 graceful_timeout = 60
 
@@ -27,7 +33,19 @@ backlog = 2048
 worker_connections = 1000
 
 def when_ready(server):
-    server.log.info(f"服务器启动完成，超时设置为 {timeout} 秒")
+    server.log.info(f"服务器启动完成，超时设置为 {timeout} 秒，worker类型 {worker_class}，线程数 {threads}")
 
 def worker_exit(server, worker):
+    # 关闭PDF并行解析进程池，避免遗留子进程
+    from pdf_extract import shutdown_pool
+    shutdown_pool()
+    # 等待本worker已接收的异步解读任务执行完
+    from app import job_queue
+    job_queue.shutdown(wait=True)
+    # 提交写缓冲中剩余的用户数据修改（任务结束时可能追加了阅读历史）
+    from app import write_behind
+    write_behind.shutdown()
+    # 关闭密码哈希线程池
+    from app import password_hasher
+    password_hasher.shutdown()
     server.log.info(f"Worker {worker.pid} 退出")
@@ -0,0 +1,115 @@
+# i18n.py
+"""
+界面翻译：启动时把 translations.json 读入内存，按语言切分后预先序列化并压缩，
+/api/i18n/<lang> 直接返回内存中的结果（强ETag，未变化时返回304）；
+最多每 check_interval 秒检查一次文件的修改时间，文件变化时才重新加载
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import Response, request
+
+from static_assets import ENCODINGS, negotiate_encoding
+
+logger = logging.getLogger(__name__)
+
+# 翻译文件不存在时使用的默认翻译
+DEFAULT_TRANSLATIONS = {
+    "zh": {"appName": "ANSAPRA - 高中生自然科学论文自适应阅读智能体"},
+    "en": {"appName": "ANSAPRA - Adaptive Natural Science Academic Paper Reading Agent"}
+}
+
+
+class _Representation:
+    """一份翻译数据序列化后的JSON及其压缩版本"""
+
+    def __init__(self, data):
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {'identity': body}
+        for encoding, _, compress in ENCODINGS:
+            compressed = compress(body)
+            if len(compressed) < len(body):
+                self.variants[encoding] = compressed
+
+    def response(self):
+        """按 Accept-Encoding 返回对应版本，If-None-Match 匹配时返回304"""
+        encoding = negotiate_encoding(self.variants)
+        response = Response(self.variants[encoding], mimetype='application/json')
+        response.set_etag(f"{self.digest}-{encoding}")
+        response.cache_control.no_cache = True
+        if encoding != 'identity':
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        return response.make_conditional(request)
+
+
+class TranslationCatalog:
+    """内存中的翻译数据：全部语言及按语言切分的结果"""
+
+    def __init__(self, path, check_interval=5):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = time.monotonic()
+        self._full = None
+        self._languages = {}
+        self._load()
+
+    def _stat(self):
+        """文件的 (修改时间, 大小)，文件不存在时返回None"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        signature = self._stat()
+        data = None
+        if signature is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"读取翻译文件失败 {self.path}: {e}")
+                if self._full is not None:
+                    # 保留上一次加载成功的翻译，文件再次变化时重试
+                    self._signature = signature
+                    return
+        if data is None:
+            logger.warning(f"翻译文件不可用 {self.path}，使用默认翻译")
+            data = DEFAULT_TRANSLATIONS
+
+        languages = {lang: _Representation(items) for lang, items in data.items() if isinstance(items, dict)}
+        self._full = _Representation(data)
+        self._languages = languages
+        self._signature = signature
+        logger.info(f"已加载翻译: {', '.join(f'{lang}({len(data[lang])})' for lang in sorted(languages))}")
+
+    def _refresh(self):
+        """距上次检查超过 check_interval 秒时检查文件是否变化"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            if self._stat() != self._signature:
+                self._load()
+
+    def languages(self):
+        return sorted(self._languages)
+
+    def get(self, lang=None):
+        """返回指定语言（None为全部语言）的翻译，不支持的语言返回None"""
+        self._refresh()
+        if lang is None:
+            return self._full
+        return self._languages.get(lang)
@@ -0,0 +1,296 @@
+# job_queue.py
+"""
+后台任务队列：解读请求提交后立即返回任务ID，由本地线程池执行，
+任务状态与结果持久化到SQLite，客户端断线重连后仍可查询；
+每个任务记录所属进程的标识（进程号 + 进程启动时间），所属进程已退出的未完成任务标记为失败
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED_STATUSES = (DONE, FAILED)
+
+
+class JobFailed(Exception):
+    """任务执行失败，result 为需要返回给客户端的结果"""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+
+class JobQueue:
+    """持久化的后台任务队列（每个进程一个线程池，状态共享在数据库中）"""
+
+    def __init__(self, db_path, workers=2, retention=86400):
+        self.db_path = db_path
+        self.workers = workers
+        self.retention = retention
+        self._local = threading.local()
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        # 本进程的标识 (pid, '进程号:启动时间')，fork 后重新读取
+        self._owner = (None, None)
+        # 状态变化时唤醒本进程内等待结果的订阅者
+        self._changed = threading.Condition()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, '
+            'email TEXT, '
+            'status TEXT NOT NULL, '
+            'pid INTEGER, '
+            'owner TEXT, '
+            'created_at REAL NOT NULL, '
+            'started_at REAL, '
+            'finished_at REAL, '
+            'result TEXT, '
+            'error TEXT)'
+        )
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+        if 'owner' not in columns:
+            conn.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+        self._recover()
+
+    def _connect(self):
+        """获取当前线程（当前进程）的数据库连接"""
+        pid = os.getpid()
+        cached = getattr(self._local, 'conn', None)
+        if cached is not None and cached[0] == pid:
+            return cached[1]
+
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = (pid, conn)
+        return conn
+
+    def _get_executor(self):
+        """按进程懒加载线程池（preload_app 时线程不会随 fork 复制）"""
+        pid = os.getpid()
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != pid:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(1, self.workers), thread_name_prefix='job'
+                )
+                self._executor_pid = pid
+            return self._executor
+
+    def _owner_token(self):
+        pid = os.getpid()
+        if self._owner[0] != pid:
+            self._owner = (pid, _process_token(pid))
+        return self._owner[1]
+
+    def _recover(self):
+        """
+        把所属进程已退出的未完成任务标记为失败（服务重启后它们不会再执行）
+        容器重启后进程号会重复，以进程号 + 启动时间判断：上次启动时提交的任务
+        即使进程号与现在某个进程相同也会被标记；升级前没有记录所属进程的任务同样标记
+        """
+        rows = self._connect().execute(
+            'SELECT id, owner FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)
+        ).fetchall()
+        for job_id, owner in rows:
+            if not _owner_alive(owner):
+                self._mark_interrupted(job_id)
+
+    def _mark_interrupted(self, job_id):
+        self._set_status(job_id, FAILED, error='服务重启，任务已中断，请重新提交')
+        logger.warning(f"任务 {job_id} 所属进程已退出，标记为失败")
+
+    def _set_status(self, job_id, status, result=None, error=None):
+        now = time.time()
+        conn = self._connect()
+        if status == RUNNING:
+            conn.execute(
+                'UPDATE jobs SET status = ?, started_at = ? WHERE id = ?',
+                (status, now, job_id)
+            )
+        else:
+            conn.execute(
+                'UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?',
+                (status, now,
+                 json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, job_id)
+            )
+        with self._changed:
+            self._changed.notify_all()
+
+    def submit(self, email, fn):
+        """
+        提交任务，fn() 返回结果字典，抛出 JobFailed 表示失败
+        返回：任务ID
+        """
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        conn.execute(
+            'INSERT INTO jobs (id, email, status, pid, owner, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, email, QUEUED, os.getpid(), self._owner_token(), time.time())
+        )
+        self._cleanup()
+        self._get_executor().submit(self._run, job_id, fn)
+        logger.info(f"任务 {job_id} 已提交")
+        return job_id
+
+    def _run(self, job_id, fn):
+        self._set_status(job_id, RUNNING)
+        start_time = time.time()
+        try:
+            result = fn()
+        except JobFailed as e:
+            self._set_status(job_id, FAILED, result=e.result, error=str(e))
+            logger.warning(f"任务 {job_id} 失败: {e}")
+        except Exception as e:
+            self._set_status(job_id, FAILED, error=f'处理失败: {str(e)}')
+            logger.error(f"任务 {job_id} 异常: {e}")
+        else:
+            self._set_status(job_id, DONE, result=result)
+            logger.info(f"任务 {job_id} 完成，耗时: {time.time() - start_time:.2f}秒")
+
+    def _cleanup(self):
+        """删除超过保留时间的已完成任务"""
+        if self.retention > 0:
+            self._connect().execute(
+                'DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?',
+                (DONE, FAILED, time.time() - self.retention)
+            )
+
+    def get(self, job_id):
+        """读取任务，不存在时返回None"""
+        row = self._connect().execute(
+            'SELECT id, email, status, owner, created_at, started_at, finished_at, result, error '
+            'FROM jobs WHERE id = ?', (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+
+        job_id, email, status, owner, created_at, started_at, finished_at, result, error = row
+        if status not in FINISHED_STATUSES and not _owner_alive(owner):
+            # worker进程被回收（max_requests）或崩溃，任务不会再完成
+            self._mark_interrupted(job_id)
+            return self.get(job_id)
+        job = {
+            'job_id': job_id,
+            'email': email,
+            'status': status,
+            'created_at': created_at,
+            'started_at': started_at,
+            'finished_at': finished_at,
+            'result': json.loads(result) if result else None,
+            'error': error
+        }
+        if status == QUEUED:
+            job['queue_position'] = self._connect().execute(
+                'SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?',
+                (QUEUED, created_at)
+            ).fetchone()[0] + 1
+        if started_at:
+            job['wait_seconds'] = round(started_at - created_at, 3)
+        if finished_at and started_at:
+            job['run_seconds'] = round(finished_at - started_at, 3)
+        return job
+
+    def wait(self, job_id, last_status=None, timeout=15):
+        """等待任务状态不同于 last_status（或超时），返回最新的任务"""
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] != last_status:
+                return job
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return job
+            # 其他进程执行的任务不会通知本进程，最多1秒重新查询一次
+            with self._changed:
+                self._changed.wait(min(remaining, 1.0))
+
+    def shutdown(self, wait=True):
+        """关闭本进程的线程池，wait=True 时等待已提交的任务执行完"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._executor_pid == os.getpid():
+            executor.shutdown(wait=wait)
+
+    def stats(self, window=3600):
+        """队列深度、执行中任务数与最近一段时间的排队等待时间"""
+        conn = self._connect()
+        counts = dict(conn.execute(
+            'SELECT status, COUNT(*) FROM jobs WHERE status IN (?, ?) GROUP BY status',
+            (QUEUED, RUNNING)
+        ).fetchall())
+        avg_wait, max_wait, started = conn.execute(
+            'SELECT AVG(started_at - created_at), MAX(started_at - created_at), COUNT(*) '
+            'FROM jobs WHERE started_at > ?', (time.time() - window,)
+        ).fetchone()
+        oldest = conn.execute(
+            'SELECT MIN(created_at) FROM jobs WHERE status = ?', (QUEUED,)
+        ).fetchone()[0]
+        return {
+            'workers': self.workers,
+            'queued': counts.get(QUEUED, 0),
+            'running': counts.get(RUNNING, 0),
+            'oldest_queued_seconds': round(time.time() - oldest, 3) if oldest else 0,
+            'recent_started': started,
+            'avg_wait_seconds': round(avg_wait or 0, 3),
+            'max_wait_seconds': round(max_wait or 0, 3)
+        }
+
+
+def _process_token(pid):
+    """
+    进程标识 '进程号:启动时间'（启动时间取自 /proc/<pid>/stat，单位为系统启动后的时钟滴答），
+    进程号被其他进程复用时标识不同；没有 /proc 的系统只记录进程号，不存在时返回None
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except FileNotFoundError:
+        return None if os.path.isdir('/proc/self') else f"{pid}:"
+    except OSError:
+        return f"{pid}:"
+    # 第2个字段（进程名）可能包含空格和括号，从最后一个右括号之后开始数，启动时间是第22个字段
+    fields = stat[stat.rfind(')') + 2:].split()
+    return f"{pid}:{fields[19]}"
+
+
+def _owner_alive(owner):
+    """记录的所属进程是否仍是当前运行中的同一个进程"""
+    if not owner:
+        return False
+    pid, _, start_time = owner.partition(':')
+    if not _process_alive(int(pid)):
+        return False
+    if not start_time:
+        # 提交时无法读取启动时间，只能按进程号判断
+        return True
+    return _process_token(int(pid)) == owner
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
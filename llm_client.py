@@ -0,0 +1,200 @@
+# llm_client.py
+"""
+DeepSeek API客户端：连接池复用的keep-alive会话、统一的超时设置、
+429/5xx的抖动退避重试，以及集中的错误信息映射
+"""
+import json
+import logging
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import REGISTRY, observe_stage
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+LLM_RETRIES = REGISTRY.counter(
+    'ansapra_llm_retries_total', 'DeepSeek请求重试次数', ('reason',)
+)
+LLM_ERRORS = REGISTRY.counter(
+    'ansapra_llm_errors_total', 'DeepSeek请求失败次数', ('kind',)
+)
+
+
+class LLMError(Exception):
+    """AI接口调用失败，message可直接展示给用户"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMTimeoutError(LLMError):
+    """AI接口响应超时"""
+
+
+class DeepSeekClient:
+    """共享的DeepSeek API客户端（线程安全，所有调用复用同一个连接池）"""
+
+    def __init__(self, api_url, api_key, model='deepseek-chat', pool_size=16,
+                 connect_timeout=10, max_retries=2, backoff_base=0.5, backoff_max=8):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        # 重试由本类自行处理（需要区分状态码和流式请求），适配器本身不重试
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _headers(self):
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def _backoff(self, attempt, retry_after=None):
+        """全抖动指数退避；服务端给出Retry-After时优先使用"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _post(self, payload, timeout, stream=False):
+        """发送请求，对429/5xx和连接失败做退避重试，返回成功的响应"""
+        if not self.api_key:
+            raise LLMError("DeepSeek API Key not configured")
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(
+                    self.api_url,
+                    json=payload,
+                    headers=self._headers(),
+                    timeout=(self.connect_timeout, timeout),
+                    stream=stream
+                )
+            except requests.exceptions.ConnectionError as e:
+                # 读取超时不重试（生成可能已经进行了很久），连接失败才重试
+                if "Read timed out" in str(e) or attempt >= self.max_retries:
+                    raise self.map_error(e)
+                LLM_RETRIES.inc(reason='connection')
+                delay = self._backoff(attempt)
+                logger.warning(f"DeepSeek API连接失败，{delay:.2f}秒后重试: {e}")
+            except requests.exceptions.RequestException as e:
+                raise self.map_error(e)
+            else:
+                if response.status_code == 200:
+                    return response
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    message = response.text[:500]
+                    response.close()
+                    LLM_ERRORS.inc(kind='http')
+                    raise LLMError(f"API调用失败: {response.status_code} {message}", response.status_code)
+                LLM_RETRIES.inc(reason=str(response.status_code))
+                delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                logger.warning(f"DeepSeek API返回 {response.status_code}，{delay:.2f}秒后重试")
+                response.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    def map_error(error):
+        """把底层异常映射为面向用户的错误信息"""
+        if isinstance(error, LLMError):
+            return error
+        if isinstance(error, requests.exceptions.Timeout) or "Read timed out" in str(error):
+            logger.error(f"DeepSeek API请求超时: {error}")
+            LLM_ERRORS.inc(kind='timeout')
+            return LLMTimeoutError("AI处理超时，请稍后重试、缩短文本长度或检查网络连接")
+        logger.error(f"DeepSeek API error: {error}")
+        LLM_ERRORS.inc(kind='connection')
+        if "Connection refused" in str(error):
+            return LLMError("无法连接到API服务器，请检查网络连接")
+        return LLMError(f"API调用失败: {str(error)}")
+
+    def chat(self, messages, max_tokens, temperature=0.7, timeout=150, **options):
+        """非流式调用，返回生成的文本"""
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'stream': False
+        }
+        payload.update(options)
+
+        start = time.perf_counter()
+        response = self._post(payload, timeout)
+        observe_stage('llm_ttfb', time.perf_counter() - start)
+        try:
+            result = response.json()
+        except ValueError as e:
+            raise LLMError(f"API调用失败: 响应格式错误 {e}")
+        finally:
+            response.close()
+            observe_stage('llm_total', time.perf_counter() - start)
+
+        choices = result.get('choices') or []
+        if not choices or not choices[0].get('message'):
+            raise LLMError("No response from DeepSeek API")
+        return choices[0]['message']['content']
+
+    def stream_chat(self, messages, max_tokens, temperature=0.7, timeout=150, **options):
+        """流式调用，逐块产出生成的文本"""
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'stream': True
+        }
+        payload.update(options)
+
+        start = time.perf_counter()
+        first_token = False
+        response = self._post(payload, timeout, stream=True)
+        try:
+            # 按字节分行后再以UTF-8解码：text/event-stream 响应通常不带charset，
+            # decode_unicode 会按ISO-8859-1解码，并在中文字符内的0x85字节处错误地分行
+            for raw in response.iter_lines():
+                try:
+                    line = raw.decode('utf-8')
+                except UnicodeDecodeError as e:
+                    raise LLMError(f"API调用失败: 流式响应编码错误 {e}")
+                # SSE格式：每个数据块以 "data: " 开头，以 "data: [DONE]" 结束
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError as e:
+                    raise LLMError(f"API调用失败: 流式响应格式错误 {e}")
+                choices = chunk.get('choices') or []
+                if choices:
+                    delta = choices[0].get('delta', {}).get('content')
+                    if delta:
+                        if not first_token:
+                            first_token = True
+                            observe_stage('llm_ttfb', time.perf_counter() - start)
+                        yield delta
+        except requests.exceptions.RequestException as e:
+            raise self.map_error(e)
+        finally:
+            response.close()
+            observe_stage('llm_stream_total', time.perf_counter() - start)
@@ -0,0 +1,190 @@
+# long_document.py
+"""
+长文档模式：按章节切分全文，分块并发摘要（map），
+再把压缩后的全文摘要交给个性化解读提示词（reduce）
+"""
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 各解读深度下长文档模式的总token预算（摘要输入 + 摘要输出）
+DEPTH_TOKEN_BUDGETS = {
+    'A': 8000,   # 简洁概括
+    'B': 16000,  # 平衡详细
+    'C': 32000   # 详细深入
+}
+
+# 各解读深度下每个分块摘要的最大输出token数
+DEPTH_SUMMARY_TOKENS = {
+    'A': 300,
+    'B': 500,
+    'C': 800
+}
+
+# 章节标题（中英文常见写法，允许前置编号）
+SECTION_HEADING = re.compile(
+    r'^\s*(?:\d+(?:\.\d+)*\.?\s*|[IVX]+\.\s*)?'
+    r'(abstract|introduction|background|related work|methods?|methodology|materials and methods|'
+    r'experiments?|results?|discussion|conclusions?|references|bibliography|acknowledge?ments?|'
+    r'摘要|引言|背景|方法|材料与方法|实验|结果|讨论|结论|参考文献|致谢)\s*[:：]?\s*$',
+    re.IGNORECASE
+)
+PAGE_MARKER = re.compile(r'^第\d+页:\s*$')
+SKIPPED_SECTIONS = {'references', 'bibliography', 'acknowledgements', 'acknowledgments', '参考文献', '致谢'}
+
+CJK_CHAR = re.compile(r'[　-〿㐀-鿿＀-￯]')
+
+
+def estimate_tokens(text):
+    """粗略估算token数：中文约1字1token，其他约4字符1token"""
+    cjk = len(CJK_CHAR.findall(text))
+    return cjk + (len(text) - cjk) // 4
+
+
+def split_sections(text):
+    """按章节标题切分，返回 [(标题, 内容)]；参考文献、致谢等章节被丢弃"""
+    sections = []
+    title, lines = '', []
+    for line in text.split('\n'):
+        if PAGE_MARKER.match(line):
+            continue
+        match = SECTION_HEADING.match(line)
+        if match:
+            if ''.join(lines).strip():
+                sections.append((title, '\n'.join(lines).strip()))
+            title, lines = match.group(1).strip(), []
+        else:
+            lines.append(line)
+    if ''.join(lines).strip():
+        sections.append((title, '\n'.join(lines).strip()))
+    return [(t, body) for t, body in sections if t.lower() not in SKIPPED_SECTIONS]
+
+
+def split_into_chunks(text, max_chars=6000):
+    """
+    章节感知的分块：小章节合并，超长章节按段落切开
+    返回：[{'title': 标题, 'text': 内容}]
+    """
+    chunks = []
+    for title, body in split_sections(text):
+        pieces = []
+        current = ''
+        for paragraph in re.split(r'\n\s*\n|\n(?=\S)', body):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            # 单个段落超长时硬切
+            while len(paragraph) > max_chars:
+                if current:
+                    pieces.append(current)
+                    current = ''
+                pieces.append(paragraph[:max_chars])
+                paragraph = paragraph[max_chars:]
+            if current and len(current) + len(paragraph) + 1 > max_chars:
+                pieces.append(current)
+                current = paragraph
+            else:
+                current = f"{current}\n{paragraph}" if current else paragraph
+        if current:
+            pieces.append(current)
+
+        for piece in pieces:
+            # 与上一个同章节或较小的分块合并，减少请求次数
+            if chunks and len(chunks[-1]['text']) + len(piece) + 1 <= max_chars and \
+                    (chunks[-1]['title'] == title or len(piece) < max_chars // 4):
+                previous = chunks[-1]
+                if previous['title'] != title and title:
+                    piece = f"[{title}]\n{piece}"
+                previous['text'] = f"{previous['text']}\n{piece}"
+            else:
+                chunks.append({'title': title, 'text': piece})
+    return chunks
+
+
+def fit_to_budget(chunks, token_budget, summary_tokens):
+    """按比例截断各分块，使摘要输入与输出的总token数不超过预算"""
+    if not chunks:
+        return chunks
+    # 预算连摘要输出都放不下时，只保留前面的分块
+    max_chunks = max(1, token_budget // (summary_tokens * 2))
+    chunks = chunks[:max_chunks]
+
+    input_budget = token_budget - summary_tokens * len(chunks)
+    total_input = sum(estimate_tokens(chunk['text']) for chunk in chunks)
+    if total_input <= input_budget:
+        return chunks
+
+    ratio = input_budget / total_input
+    return [
+        {'title': chunk['title'], 'text': chunk['text'][:max(200, int(len(chunk['text']) * ratio))]}
+        for chunk in chunks
+    ]
+
+
+def build_summary_messages(chunk, index, total, language='zh'):
+    """单个分块的摘要请求"""
+    title = chunk['title'] or ('未命名章节' if language != 'en' else 'Untitled section')
+    if language == 'en':
+        system_prompt = "You condense sections of natural science papers for a later interpretation step. Keep facts, methods, key numbers, formulas and conclusions. Do not add commentary."
+        user_prompt = (
+            f"Section {index + 1}/{total} ({title}) of a paper:\n\n{chunk['text']}\n\n"
+            "Summarize this section concisely, preserving research methods, data, results and terminology:"
+        )
+    else:
+        system_prompt = "你负责为后续的论文解读压缩自然科学论文的章节内容。保留事实、方法、关键数据、公式和结论，不要添加评论。"
+        user_prompt = (
+            f"论文第{index + 1}/{total}部分（{title}）：\n\n{chunk['text']}\n\n"
+            "请简洁地概括这一部分，保留研究方法、数据、结果和专业术语："
+        )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def condense_paper(paper_content, chat_fn, depth='B', language='zh', max_workers=4, chunk_chars=6000):
+    """
+    长文档map阶段：分块并发摘要并拼接为压缩全文
+    chat_fn(messages, max_tokens) -> 文本
+    返回：(condensed_text, report)，report包含分块数、token预算和各阶段耗时
+    """
+    token_budget = DEPTH_TOKEN_BUDGETS.get(depth, DEPTH_TOKEN_BUDGETS['B'])
+    summary_tokens = DEPTH_SUMMARY_TOKENS.get(depth, DEPTH_SUMMARY_TOKENS['B'])
+
+    start = time.time()
+    chunks = fit_to_budget(split_into_chunks(paper_content, chunk_chars), token_budget, summary_tokens)
+    split_seconds = time.time() - start
+
+    def summarize(indexed_chunk):
+        index, chunk = indexed_chunk
+        chunk_start = time.time()
+        summary = chat_fn(build_summary_messages(chunk, index, len(chunks), language), summary_tokens)
+        return summary, time.time() - chunk_start
+
+    map_start = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks) or 1))) as pool:
+        results = list(pool.map(summarize, enumerate(chunks)))
+    map_seconds = time.time() - map_start
+
+    header = "Section-by-section condensed summary of the full paper:" if language == 'en' else "以下为论文全文的分章节摘要："
+    parts = [header]
+    for chunk, (summary, _) in zip(chunks, results):
+        parts.append(f"[{chunk['title']}]\n{summary.strip()}" if chunk['title'] else summary.strip())
+    condensed = '\n\n'.join(parts)
+
+    report = {
+        'chunks': len(chunks),
+        'token_budget': token_budget,
+        'estimated_input_tokens': sum(estimate_tokens(chunk['text']) for chunk in chunks),
+        'condensed_chars': len(condensed),
+        'timings': {
+            'split': round(split_seconds, 3),
+            'map': round(map_seconds, 3),
+            'map_chunks': [round(seconds, 3) for _, seconds in results]
+        }
+    }
+    logger.info(f"长文档模式：{len(chunks)}个分块，map阶段耗时 {map_seconds:.2f}秒")
+    return condensed, report
@@ -0,0 +1,219 @@
+# metrics.py
+"""
+进程内性能指标：计数器、仪表盘和直方图，按Prometheus文本格式输出（/metrics），
+并提供按阶段计时的工具和Flask请求计数/在途请求数的钩子
+每个gunicorn worker进程各自统计
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# 直方图默认分桶（秒），覆盖从毫秒级的存储读写到分钟级的AI生成
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+    def _render_items(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def _render_items(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def snapshot(self):
+        """{标签值: (次数, 总耗时)}，用于调试输出"""
+        with self._lock:
+            return {key: (entry[2], entry[1]) for key, entry in self._values.items()}
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Prometheus文本格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'ansapra_stage_seconds', '各处理阶段耗时（秒）', ('stage',)
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    'ansapra_http_requests_total', '按路由、方法和状态码统计的请求数', ('route', 'method', 'status')
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'ansapra_http_request_duration_seconds', '请求处理耗时（流式响应计到发送结束）', ('route',)
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'ansapra_http_requests_in_flight', '正在处理的请求数', ('route',)
+)
+CACHE_EVENTS = REGISTRY.counter(
+    'ansapra_cache_events_total', '缓存命中/未命中/写入等事件数', ('cache', 'event')
+)
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+@contextmanager
+def timed(stage):
+    """对代码块计时并记入阶段直方图（出现异常也会记录）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def init_app(app):
+    """注册Flask钩子：按路由统计请求数、耗时和在途请求数"""
+    from flask import g, request
+
+    def finish(route, start):
+        HTTP_IN_FLIGHT.dec(route=route)
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, route=route)
+
+    @app.before_request
+    def _start_request_metrics():
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g._request_metrics = (route, time.perf_counter())
+        HTTP_IN_FLIGHT.inc(route=route)
+
+    @app.after_request
+    def _record_request_metrics(response):
+        route, start = g.pop('_request_metrics', (None, None))
+        if route is not None:
+            HTTP_REQUESTS.inc(route=route, method=request.method, status=str(response.status_code))
+            # 流式响应在发送结束（或客户端断开）时才算完成
+            response.call_on_close(lambda: finish(route, start))
+        return response
+
+    @app.teardown_request
+    def _abort_request_metrics(error=None):
+        # 未处理的异常不会经过after_request
+        route, start = g.pop('_request_metrics', (None, None))
+        if route is not None:
+            HTTP_REQUESTS.inc(route=route, method=request.method, status='500')
+            finish(route, start)
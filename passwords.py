@@ -0,0 +1,187 @@
+# passwords.py
+"""
+密码哈希：计算和校验在有界线程池中执行（hashlib的pbkdf2/scrypt计算期间释放GIL），
+同时进行的哈希数量有上限，等待过多时立即拒绝，登录高峰不会占满CPU和全部请求线程；
+哈希算法与成本可配置，旧参数的哈希在登录成功时透明地按当前参数重新计算
+"""
+import atexit
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from metrics import REGISTRY, observe_stage
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_OPERATIONS = REGISTRY.counter(
+    'ansapra_password_hash_operations_total', '密码哈希计算次数', ('operation', 'result')
+)
+
+# Retry-After 的范围（秒）
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 30
+
+
+class HasherBusy(Exception):
+    """等待哈希计算的请求过多或等待超时"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def hash_method(password_hash):
+    """哈希字符串中的算法与参数部分，如 'pbkdf2:sha256:600000'"""
+    return (password_hash or '').split('$', 1)[0]
+
+
+def canonical_method(method):
+    """
+    配置的哈希参数在生成的哈希中的写法（如 'pbkdf2' 写作 'pbkdf2:sha256:600000'）
+    参数完整时直接规范化；省略了参数的简写由 werkzeug 补全默认值，用一个空密码计算一次得到
+    """
+    name, *args = method.split(':')
+    try:
+        if name == 'pbkdf2' and len(args) == 2:
+            return f"pbkdf2:{args[0]}:{int(args[1])}"
+        if name == 'scrypt' and len(args) == 3:
+            return 'scrypt:' + ':'.join(str(int(arg)) for arg in args)
+    except ValueError:
+        pass
+    return hash_method(generate_password_hash('', method=method))
+
+
+class PasswordHasher:
+    """
+    method 为 werkzeug 的哈希参数，如 'pbkdf2:sha256:600000'、'scrypt:32768:8:1'
+    workers 为同时计算哈希的线程数（0表示在请求线程中直接计算），
+    最多 queue_size 个请求排队，排队或计算超过 timeout 秒返回繁忙
+    """
+
+    def __init__(self, method='pbkdf2:sha256:600000', workers=2, queue_size=16, timeout=10):
+        self.method = method
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._in_flight = 0
+        # 规范化的算法与参数，与之不同的哈希在登录成功时重新计算
+        self._canonical_method = canonical_method(method)
+        # 单次哈希耗时（指数移动平均），用于估算 Retry-After
+        self._hash_seconds = None
+        self._counters = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0}
+        atexit.register(self.shutdown)
+
+    def _get_pool(self):
+        """按进程懒创建线程池（preload_app 时线程不会随 fork 复制），需持有 _lock"""
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            self._pool_pid = pid
+        return self._pool
+
+    def _retry_after(self):
+        """按排队数与单次耗时估算的重试等待秒数，需持有 _lock"""
+        seconds = (self._hash_seconds or 1.0) * self._in_flight / max(1, self.workers)
+        return max(MIN_RETRY_AFTER, min(MAX_RETRY_AFTER, math.ceil(seconds)))
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+        observe_stage('password_hash', seconds)
+        with self._lock:
+            self._hash_seconds = seconds if self._hash_seconds is None else 0.8 * self._hash_seconds + 0.2 * seconds
+        return result
+
+    def _run(self, operation, func, *args):
+        """在线程池中执行哈希计算并等待结果，繁忙时抛出 HasherBusy"""
+        if self.workers <= 0:
+            return self._timed(func, *args)
+
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_size:
+                self._counters['rejected'] += 1
+                retry_after = self._retry_after()
+                PASSWORD_HASH_OPERATIONS.inc(operation=operation, result='rejected')
+                raise HasherBusy('等待计算密码哈希的请求过多', retry_after)
+            self._in_flight += 1
+            future = self._get_pool().submit(self._timed, func, *args)
+
+        start = time.perf_counter()
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self._counters['rejected'] += 1
+                retry_after = self._retry_after()
+            PASSWORD_HASH_OPERATIONS.inc(operation=operation, result='timeout')
+            logger.warning(f"密码哈希等待超过 {self.timeout} 秒")
+            raise HasherBusy('密码哈希计算超时', retry_after)
+        finally:
+            # 已完成或被取消的任务立即释放名额，超时但仍在计算的任务算完后释放
+            future.add_done_callback(self._release)
+            # 请求线程的等待时间（排队 + 计算）
+            observe_stage('password_hash_wait', time.perf_counter() - start)
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _generate(self, password):
+        return generate_password_hash(password, method=self.method)
+
+    def _check(self, password_hash, password):
+        """校验密码，正确且哈希参数与当前配置不同时在同一任务中计算新哈希"""
+        if not check_password_hash(password_hash, password):
+            return False, None
+        if hash_method(password_hash) == self._canonical_method:
+            return True, None
+        return True, self._generate(password)
+
+    def hash(self, password):
+        """按当前配置的算法与成本计算密码哈希"""
+        password_hash = self._run('hash', self._generate, password)
+        with self._lock:
+            self._counters['hashed'] += 1
+        PASSWORD_HASH_OPERATIONS.inc(operation='hash', result='ok')
+        return password_hash
+
+    def verify(self, password_hash, password):
+        """
+        校验密码，返回 (是否正确, 新哈希)
+        新哈希在密码正确且原哈希的算法或成本与当前配置不同时给出，由调用方保存以完成迁移，否则为None
+        """
+        ok, new_hash = self._run('verify', self._check, password_hash, password)
+        with self._lock:
+            self._counters['verified'] += 1
+            self._counters['rehashed'] += new_hash is not None
+        PASSWORD_HASH_OPERATIONS.inc(operation='verify', result='ok' if ok else 'mismatch')
+        return ok, new_hash
+
+    def shutdown(self):
+        """关闭线程池（worker退出时调用）"""
+        with self._lock:
+            pool = self._pool if self._pool_pid == os.getpid() else None
+            self._pool = None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = self._in_flight
+            stats['hash_ms'] = round(self._hash_seconds * 1000, 1) if self._hash_seconds is not None else None
+        stats['method'] = self.method
+        stats['workers'] = self.workers
+        return stats
@@ -0,0 +1,157 @@
+# pdf_cache.py
+"""
+PDF文本提取结果缓存：以上传文件内容的SHA-256（附加提取引擎版本和页数上限）为键，
+内存LRU层 + 磁盘层（按总大小淘汰最久未使用的条目）
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from metrics import CACHE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(file_bytes):
+    """计算上传内容的SHA-256"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+class PDFExtractionCache:
+    """两级内容寻址缓存，name 为指标中的缓存名"""
+
+    def __init__(self, cache_dir, memory_items=64, disk_max_bytes=200 * 1024 * 1024, name='pdf'):
+        self.cache_dir = cache_dir
+        self.name = name
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'disk_evictions': 0
+        }
+
+        if self.disk_max_bytes > 0:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+    def _count(self, event):
+        """累计事件次数（调用方需持有锁）"""
+        self._counters[event] += 1
+        CACHE_EVENTS.inc(cache=self.name, event=event)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _disk_entries(self):
+        """列出磁盘条目：(mtime, 路径, 大小)"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _remember(self, key, value):
+        """放入内存层（调用方需持有锁）"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """读取缓存，未命中返回None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._count('memory_hits')
+                return self._memory[key]
+
+        value = None
+        if self.disk_max_bytes > 0:
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+                # 更新访问时间，用于LRU淘汰
+                os.utime(path)
+            except (FileNotFoundError, json.JSONDecodeError):
+                value = None
+
+        with self._lock:
+            if value is None:
+                self._count('misses')
+                return None
+            self._count('disk_hits')
+            self._remember(key, value)
+            return value
+
+    def put(self, key, value):
+        """写入缓存"""
+        with self._lock:
+            self._remember(key, value)
+            self._count('stores')
+
+        if self.disk_max_bytes <= 0:
+            return
+
+        data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        if len(data) > self.disk_max_bytes:
+            return
+
+        path = self._path(key)
+        try:
+            # 先写临时文件再重命名，避免并发读到半个文件
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"PDF缓存写入磁盘失败: {e}")
+            return
+
+        with self._lock:
+            self._disk_bytes += len(data) - old_size
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """按最久未使用淘汰磁盘条目，直到总大小降到上限的90%（调用方需持有锁）"""
+        target = self.disk_max_bytes * 0.9
+        entries = sorted(self._disk_entries())
+        self._disk_bytes = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self._disk_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._disk_bytes -= size
+            self._count('disk_evictions')
+
+    def stats(self):
+        """命中/未命中计数与容量信息"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_items'] = len(self._memory)
+            stats['disk_bytes'] = self._disk_bytes
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0
+        return stats
@@ -0,0 +1,489 @@
+# pdf_extract.py
+"""
+单遍PDF文本提取引擎：文档只打开一次，逐页评估文本质量，
+质量不足的页面才逐页回退到pdfplumber / pdfminer，扫描件判断在同一遍中完成；
+可选按页码区间在进程池中并行提取；
+文档来源可以是bytes或上传落盘后的文件路径（按需从磁盘读取，进程池只传递路径）
+"""
+import atexit
+import io
+import logging
+import multiprocessing
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import observe_stage, timed
+
+logger = logging.getLogger(__name__)
+
+# 提取结果的版本：解析器回退策略、扫描件判断或文本过滤规则变化时递增，使磁盘上的旧解析缓存失效
+EXTRACTOR_VERSION = 1
+
+# 可读字符比例低于该阈值视为乱码
+READABLE_RATIO_THRESHOLD = 0.3
+
+# 元数据关键词（不区分大小写的子串匹配）
+METADATA_KEYWORDS = (
+    'Metadata', 'Creator', 'Producer', 'CreationDate', 'ModDate',
+    'Author', 'Title', 'Subject', 'Keywords', 'PDF', 'Version',
+    'Page', 'Pages', 'Document', 'File', 'Software',
+    'Generated by', 'Created by', 'Produced by', 'Written by',
+    'File:', 'Title:', 'Subject:', 'Keywords:', 'Author:',
+    'Creator:', 'Producer:', 'CreationDate:', 'ModDate:',
+    'catalog', 'font', 'fonts'
+)
+# PDF内部结构关键词：即使行长超过200也视为元数据
+PDF_STRUCTURE_KEYWORDS = ('PDF-', 'xref', 'trailer', 'startxref', 'obj', 'endobj', 'stream', 'endstream')
+
+# 乱码判断中不计为特殊字符的标点
+ALLOWED_PUNCTUATION = ',.!?;:()[]{}<>"\''
+
+
+def _keyword_pattern(keywords):
+    """
+    把关键词编译为一个正则（匹配小写后的行）
+    去重并去掉包含其他关键词的冗余项（如 'pages' 含 'page'），子串判断结果不变；
+    按公共前缀组织成字典树形状的分支，每个位置只需尝试首字符相同的关键词
+    """
+    lowered = sorted({keyword.lower() for keyword in keywords}, key=len)
+    minimal = []
+    for keyword in lowered:
+        if not any(shorter in keyword for shorter in minimal):
+            minimal.append(keyword)
+
+    trie = {}
+    for keyword in minimal:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        # 去冗余后不存在互为前缀的关键词，叶子节点即关键词结尾
+
+    def branch(node):
+        alternatives = [re.escape(char) + branch(child) for char, child in sorted(node.items())]
+        if len(alternatives) <= 1:
+            return ''.join(alternatives)
+        return '(?:' + '|'.join(alternatives) + ')'
+
+    return re.compile(branch(trie))
+
+
+METADATA_PATTERN = _keyword_pattern(METADATA_KEYWORDS + PDF_STRUCTURE_KEYWORDS)
+PDF_STRUCTURE_PATTERN = _keyword_pattern(PDF_STRUCTURE_KEYWORDS)
+BLANK_LINES_PATTERN = re.compile(r'\n{3,}')
+
+
+class _SpecialCharTable(dict):
+    """
+    str.translate 用的字符分类表：特殊字符（非字母数字、非空白、非常见标点）保留，
+    其余删除，translate 后的长度即特殊字符数；每个码位首次出现时分类并缓存
+    """
+
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        special = not char.isalnum() and not char.isspace() and char not in ALLOWED_PUNCTUATION
+        value = codepoint if special else None
+        self[codepoint] = value
+        return value
+
+
+SPECIAL_CHAR_TABLE = _SpecialCharTable()
+
+EXTRACTION_FAILED_MESSAGE = """
+PDF文件解析失败，可能是以下原因：
+
+1. **PDF是扫描件/图片**：文件由图片组成，需要OCR识别才能提取文字
+2. **PDF使用特殊字体/编码**：使用了不常见的字体或编码方式
+3. **PDF已损坏或加密**：文件可能已损坏或被加密
+
+建议：
+1. 上传可复制文字的PDF文件（非扫描件）
+2. 或者直接复制PDF中的文字粘贴到文本框中
+3. 或者将扫描件转换为可编辑的PDF（使用Adobe Acrobat等工具）
+
+如果您确定PDF包含可复制文字但仍失败，请通过调试接口检查文件：/api/debug/pdf
+"""
+
+
+def readable_ratio(text):
+    """可读字符（可打印字符或空白）所占比例"""
+    if not text:
+        return 0
+    readable_chars = sum(1 for c in text if c.isprintable() or c.isspace())
+    return readable_chars / len(text)
+
+
+def is_usable_text(text):
+    """页面文本是否可用：非空且不是乱码"""
+    return bool(text and text.strip()) and readable_ratio(text) > READABLE_RATIO_THRESHOLD
+
+
+def _open_stream(source):
+    """打开文档来源：bytes包装为内存流，文件路径打开为只读文件流"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return open(source, 'rb')
+
+
+def _read_header(source, size=5):
+    """读取文档开头的字节"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:size])
+    try:
+        with open(source, 'rb') as f:
+            return f.read(size)
+    except OSError:
+        return b''
+
+
+class _FallbackParser:
+    """
+    回退解析器：仅在有页面需要回退时才打开一次pdfplumber文档，
+    同一文档对象上再逐页尝试pdfminer的版面分析
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._stream = None
+        self._pdf = None
+        self._failed = False
+
+    def _open(self):
+        if self._pdf is None and not self._failed:
+            try:
+                import pdfplumber
+                self._stream = _open_stream(self.source)
+                self._pdf = pdfplumber.open(self._stream)
+            except ImportError:
+                logger.warning("pdfplumber未安装")
+                self._failed = True
+            except Exception as e:
+                logger.warning(f"pdfplumber解析失败: {e}")
+                self._failed = True
+        return self._pdf
+
+    def page_count(self):
+        pdf = self._open()
+        return len(pdf.pages) if pdf else 0
+
+    def extract_page(self, page_num):
+        """返回 (text, extractor)，失败时text为空"""
+        pdf = self._open()
+        if pdf is None or page_num >= len(pdf.pages):
+            return "", None
+
+        page = pdf.pages[page_num]
+        try:
+            with timed('pdf_page_pdfplumber'):
+                text = page.extract_text()
+            if is_usable_text(text):
+                return text, 'pdfplumber'
+            # pdfplumber基于pdfminer，页面上没有任何字符时pdfminer也不会有结果
+            if not page.chars:
+                return "", None
+        except Exception as e:
+            logger.debug(f"pdfplumber第{page_num+1}页提取失败: {e}")
+
+        try:
+            with timed('pdf_page_pdfminer'):
+                text = self._pdfminer_page_text(page.page_obj)
+            if is_usable_text(text):
+                return text, 'pdfminer'
+        except ImportError:
+            logger.warning("pdfminer未安装")
+        except Exception as e:
+            logger.debug(f"pdfminer第{page_num+1}页提取失败: {e}")
+
+        return "", None
+
+    @staticmethod
+    def _pdfminer_page_text(page_obj):
+        """在已解析的页面对象上运行pdfminer版面分析，不重新解析文档"""
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+
+        output = io.StringIO()
+        resource_manager = PDFResourceManager()
+        device = TextConverter(resource_manager, output, laparams=LAParams())
+        try:
+            PDFPageInterpreter(resource_manager, device).process_page(page_obj)
+        finally:
+            device.close()
+        return output.getvalue()
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+        if self._stream is not None:
+            self._stream.close()
+
+
+def _scan_verdict(first_page_text):
+    """根据第一页文本判断是否为扫描件，返回 (is_scanned, message)"""
+    with timed('is_pdf_scanned'):
+        if not first_page_text or not first_page_text.strip():
+            return True, "PDF第一页没有提取到文字，可能是扫描件"
+        if readable_ratio(first_page_text) < READABLE_RATIO_THRESHOLD:
+            return True, "提取的文字大多是乱码，可能是扫描件或特殊编码"
+        return False, "可能是文本型PDF"
+
+
+def _format_page(page_num, page_text):
+    """过滤元数据并加上页码标记；过滤后为空时使用原始文本"""
+    with timed('filter_pdf_metadata'):
+        filtered_text = filter_pdf_metadata(page_text)
+    if filtered_text and filtered_text.strip():
+        return f"第{page_num+1}页:\n{filtered_text}\n\n"
+    return f"第{page_num+1}页:\n{page_text}\n\n"
+
+
+def _open_reader(source):
+    """用PyPDF2打开文档；加密文档尝试空密码解密，失败时抛出PermissionError"""
+    from PyPDF2 import PdfReader
+    # 传入文件流而不是路径：PyPDF2对路径会把整个文件读入内存
+    stream = _open_stream(source)
+    try:
+        reader = PdfReader(stream)
+
+        # 检查PDF是否加密
+        if reader.is_encrypted:
+            try:
+                # 尝试用空密码解密
+                reader.decrypt('')
+            except Exception:
+                raise PermissionError("PDF文件已加密")
+    except BaseException:
+        stream.close()
+        raise
+    return reader
+
+
+def _close_reader(reader):
+    if reader is not None:
+        reader.stream.close()
+
+
+def _extract_pages(source, page_nums, reader=None, fallback=None):
+    """
+    逐页提取：先用PyPDF2，质量不足的页面回退
+    返回：[(page_num, page_text, extractor)]，extractor为None表示该页无可用文本
+    """
+    own_fallback = fallback is None
+    if own_fallback:
+        fallback = _FallbackParser(source)
+    try:
+        pages = []
+        for page_num in page_nums:
+            page_text, extractor = "", None
+
+            if reader is not None:
+                try:
+                    with timed('pdf_page_pypdf2'):
+                        candidate = reader.pages[page_num].extract_text()
+                    if is_usable_text(candidate):
+                        page_text, extractor = candidate, 'PyPDF2'
+                except Exception as page_error:
+                    logger.debug(f"PyPDF2第{page_num+1}页提取失败: {page_error}")
+
+            # 逐页回退，而不是整篇文档换解析器重来
+            if extractor is None:
+                page_text, extractor = fallback.extract_page(page_num)
+
+            pages.append((page_num, page_text, extractor))
+        return pages
+    finally:
+        if own_fallback:
+            fallback.close()
+
+
+def _extract_page_range(source, start, end):
+    """进程池任务：在子进程中独立打开文档并提取 [start, end) 页"""
+    try:
+        reader = _open_reader(source)
+    except Exception:
+        reader = None
+    try:
+        return _extract_pages(source, range(start, end), reader=reader)
+    finally:
+        _close_reader(reader)
+
+
+# 进程池（按需创建，gunicorn worker退出时关闭）
+PARALLEL_MIN_PAGES = 4
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # 在多线程worker中fork不安全，使用forkserver启动子进程
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    """关闭解析进程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _extract_pages_parallel(source, page_count, workers):
+    """把页码区间分给进程池并按顺序重新拼接；进程池不可用时返回None"""
+    chunk_size = -(-page_count // workers)
+    ranges = [(start, min(start + chunk_size, page_count)) for start in range(0, page_count, chunk_size)]
+    try:
+        pool = _get_pool(workers)
+        futures = [pool.submit(_extract_page_range, source, start, end) for start, end in ranges]
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+        return pages
+    except Exception as e:
+        logger.warning(f"并行解析失败，改为串行解析: {e}")
+        shutdown_pool()
+        return None
+
+
+def extract_pdf(source, max_pages=10, workers=0):
+    """
+    单遍解析PDF；workers > 1 时按页码区间在进程池中并行提取
+    source 为文件内容bytes或文件路径
+    返回：{'success', 'text', 'extractor', 'is_scanned', 'scan_message', 'page_extractors'}
+    text 在失败时为错误提示
+    """
+    result = {
+        'success': False,
+        'text': EXTRACTION_FAILED_MESSAGE,
+        'extractor': None,
+        'is_scanned': True,
+        'scan_message': "",
+        'page_extractors': []
+    }
+
+    # 扫描件判断，优先级与逐项检查的顺序一致
+    verdict = None
+    if _read_header(source) != b'%PDF-':
+        verdict = (True, "不是有效的PDF文件")
+
+    start_time = time.perf_counter()
+    fallback = _FallbackParser(source)
+    reader = None
+    try:
+        # 主解析器：PyPDF2，文档只打开一次
+        try:
+            with timed('pdf_open'):
+                reader = _open_reader(source)
+            total_pages = len(reader.pages)
+        except PermissionError:
+            result['text'] = "PDF文件已加密，无法读取内容。请上传未加密的PDF文件。"
+            result['scan_message'] = "PDF文件已加密"
+            return result
+        except Exception as e:
+            logger.warning(f"PyPDF2解析失败: {e}")
+            verdict = verdict or (True, f"PDF检查失败: {str(e)}")
+            total_pages = fallback.page_count()
+
+        if total_pages == 0:
+            verdict = verdict or (True, "PDF没有页面")
+
+        page_count = min(total_pages, max_pages)
+        pages = None
+        if workers > 1 and page_count >= PARALLEL_MIN_PAGES:
+            pages = _extract_pages_parallel(source, page_count, workers)
+        if pages is None:
+            pages = _extract_pages(source, range(page_count), reader=reader, fallback=fallback)
+
+        text_content = ""
+        for page_num, page_text, extractor in pages:
+            if page_num == 0:
+                verdict = verdict or _scan_verdict(page_text)
+            if extractor is not None:
+                text_content += _format_page(page_num, page_text)
+
+        page_extractors = [extractor for _, _, extractor in pages]
+        result['is_scanned'], result['scan_message'] = verdict or _scan_verdict("")
+        result['page_extractors'] = page_extractors
+
+        if text_content.strip():
+            used = [name for name in ('PyPDF2', 'pdfplumber', 'pdfminer') if name in page_extractors]
+            result['success'] = True
+            result['text'] = text_content
+            result['extractor'] = '+'.join(used)
+            logger.info(f"{result['extractor']}成功提取文本，长度: {len(text_content)}")
+
+        return result
+
+    except Exception as e:
+        logger.error(f"PDF解析过程中发生未知错误: {e}")
+        result['text'] = f"PDF解析失败: {str(e)}"
+        return result
+    finally:
+        fallback.close()
+        _close_reader(reader)
+        # 并行模式下子进程中的逐页耗时不会汇总到本进程，只记录整体耗时
+        observe_stage('pdf_extract', time.perf_counter() - start_time)
+
+
+def filter_pdf_metadata(text):
+    """
+    过滤PDF中的元数据和无用信息
+    返回：过滤后的纯文本内容
+    """
+    if not text:
+        return ""
+
+    filtered_lines = []
+    for line in text.split('\n'):
+        stripped_line = line.strip()
+
+        # 跳过空行
+        if not stripped_line:
+            continue
+
+        # 跳过元数据行：短行含任一关键词，或任意长度的行含PDF内部结构关键词
+        length = len(stripped_line)
+        lowered = stripped_line.lower()
+        if (METADATA_PATTERN if length < 200 else PDF_STRUCTURE_PATTERN).search(lowered):
+            continue
+
+        # 跳过看起来像页码的行
+        if length <= 3 and stripped_line.isdigit():
+            continue
+
+        # 跳过包含过多特殊字符的行（可能是乱码）
+        if len(stripped_line.translate(SPECIAL_CHAR_TABLE)) / length > 0.5:
+            continue
+
+        # 跳过看起来像PDF内部结构的行
+        if length < 50 and stripped_line.startswith('%'):
+            continue
+
+        # 保留有用的文本行
+        filtered_lines.append(line)
+
+    # 重新组合文本，移除重复的空白行并清理首尾空白
+    filtered_text = BLANK_LINES_PATTERN.sub('\n\n', '\n'.join(filtered_lines)).strip()
+
+    # 如果过滤后文本太短，可能是过滤过度，返回原始文本
+    if len(filtered_text) < 100 and len(text) > 100:
+        logger.warning("过滤后文本过短，可能是过滤过度")
+        # 尝试更宽松的过滤
+        return text.strip()
+
+    return filtered_text
@@ -0,0 +1,451 @@
+# prompts.py
+"""
+提示词模板：静态部分在导入时按语言预编译，
+阅读习惯与用户画像部分按内容记忆化，每次请求只拼接阅读历史与论文内容
+"""
+import string
+
+
+def compile_template(template):
+    """把 str.format 风格的模板预编译为 (%-格式串, 字段顺序)"""
+    parts, fields = [], []
+    for literal, field, _, _ in string.Formatter().parse(template):
+        parts.append(literal.replace('%', '%%'))
+        if field is not None:
+            parts.append('%s')
+            fields.append(field)
+    return ''.join(parts), tuple(fields)
+
+
+def render(compiled, **values):
+    """渲染预编译的模板（字段值原样插入，不会再次解析其中的花括号）"""
+    fmt, fields = compiled
+    return fmt % tuple([values[field] for field in fields])
+
+
+class Memo:
+    """有容量上限的记忆化表，满了整体清空（提示词片段重新生成的代价很小）"""
+
+    def __init__(self, max_items=1024):
+        self.max_items = max_items
+        self._items = {}
+
+    def get(self, key, factory):
+        value = self._items.get(key)
+        if value is None:
+            if len(self._items) >= self.max_items:
+                self._items.clear()
+            value = self._items[key] = factory()
+        return value
+
+
+def template_language(language):
+    """模板只区分英文与中文，其他语言使用中文模板"""
+    return 'en' if language == 'en' else 'zh'
+
+
+# 论文解读提示词
+
+INTERPRET_SYSTEM_PROMPTS = {
+    'en': """You are a professional natural science paper interpretation assistant, specially designed to help high school students understand academic papers. Please generate paper interpretations according to the user's personalized needs. If the uploaded content cannot be interpreted (e.g., PDF parsing error), please output 'PDF解析出错，请换一篇论文哦'.""",
+    'zh': """你是一位专业的自然科学论文解读助手，专门帮助高中生理解学术论文。请根据用户的个性化需求生成论文解读。如果上传内容无法解读（例如PDF解析错误），请输出'PDF解析出错，请换一篇论文哦'。"""
+}
+
+READING_HABITS_TEMPLATES = {
+    'en': compile_template("""
+Reading Habits Settings:
+1. Preparation Level: {preparation}
+   - A: Almost no preparation
+   - B: Some preparation
+   - C: In-depth preparation
+   - Effect: Higher preparation level → remove basic term explanations, only explain difficult terms
+
+2. Reading Purpose: {purpose}
+   - A: Goal-oriented: Reading for specific tasks (homework, competitions), pursuing efficiency and directness
+     * Focus on article concepts and core knowledge points in interpretation
+   - B: Knowledge explorer: Driven by subject interest, wants to broaden knowledge, not急于求成, not pursuing in-depth understanding
+     * Connect with related knowledge within the discipline and practical application examples in interpretation
+   - C: Deep learner: For in-depth understanding and research in a field, values research methods and applications beyond paper knowledge
+     * Focus on the most cutting-edge technology parts of the paper, interpret thoroughly and in detail
+   - D: Scientific literacy builder: Hopes to improve personal scientific literacy and overall scientific perception through paper interpretation
+     * Focus on cultivating user's scientific literacy and scientific perception ability in interpretation
+
+3. Reading Time Preference: {time}
+   - A: Within 10 minutes
+     * Shorter, more concise interpretation
+   - B: 10-30 minutes
+     * Moderate length and detail
+   - C: 30 minutes or more
+     * Longer, more detailed interpretation
+
+4. Preferred Interpretation Style: {style}
+   - A: Vivid and figurative, language is colloquial, can connect with the simplest examples and analogies in life to interpret papers
+     * Focus on colloquial expression and examples, analogies in interpretation
+   - B: Quantitative interpretation, try to interpret papers through data and formulas
+     * Connect more with formulas and data in the article in interpretation
+   - C: Professional interpretation, interpret papers through more formal language and professional rigorous expression, make slight adjustments to paper content
+     * Use rigorous expression in interpretation
+   - D: Authentic style, retain the original expression style and expression method of the original text, accept long and difficult sentences, professional terminology interpretation method
+     * Use high difficulty, high academic style similar to professional academic papers in interpretation
+   - E: Step-by-step derivation, through problem introduction, similar to classroom teaching method to gradually introduce knowledge, emphasize interactivity
+     * Use question method in interpretation, guide users like classroom teaching
+
+5. Preferred Interpretation Depth: {depth}
+   - A: Concise summary
+     * Use about 2000 words for paper overview section
+   - B: Balanced detailed
+     * Use about 4000 words for paper overview section
+   - C: Detailed in-depth
+     * Use about 6000 words for paper overview section
+
+6. Preferred Post-reading Test Content: {test_type}
+   - A: Related definition fill-in-the-blank questions
+   - B: Error-prone multiple-choice questions
+   - C: Formula logic dictation questions
+
+7. Preferred Chart Formats: {chart_types}
+   - A: Mind maps (tree structure)
+   - B: Flowcharts and logic diagrams
+   - C: Tables
+   - D: Statistical charts (line charts, bar charts, etc.)
+
+Please strictly adjust your interpretation according to these settings, especially the specific requirements for each option.
+"""),
+    'zh': compile_template("""
+阅读习惯设置：
+1. 阅读一篇专业自然科学论文之前，您会在论文所在领域知识方面做什么程度的准备？ {preparation}
+   - A：几乎不做准备
+   - B：做一些准备
+   - C：做较为深入的准备
+   - 效果：准备程度越高 → 去除基础术语解释，只解释高难度术语
+
+2. 您阅读自然科学论文的原因是？ {purpose}
+   - A：目标驱动者: 为完成特定任务（如作业、比赛）而阅读，追求高效和直接
+     * 在论文解读过程中，专注于文章概念和核心知识点的解释
+   - B：知识探索者: 受学科兴趣驱动，希望拓宽知识面，不急于求成，不追求深入理解
+     * 在论文解读部分应多联系学科内部相关知识和实际应用举例
+   - C：深度学习者: 为了深入理解并研究某一领域知识，论文知识之外，同时重视研究方法和应用
+     * 在论文解读部分应当侧重于论文最前沿最尖端的技术部分，对论文解读透彻而详细
+   - D：科学了解者：希望通过论文解读提升个人科学素养和整体科学感知能力
+     * 在论文解读部分注重用户科学素养和科学感知能力的培养，解读内容侧重该部分
+
+3. 您愿意在多长时间内解读一篇自然科学论文？ {time}
+   - A：10分钟内
+     * 解读简短、精炼
+   - B：10-30分钟内
+     * 长度适中、细节适当
+   - C：30分钟及以上
+     * 解读详细、内容全面
+
+4. 您喜好的自然科学论文解读风格与方式是？ {style}
+   - A：生动形象，语言偏口语化，能联系生活中最简单的例子和类比解读论文
+     * 在论文解读过程中，专注于口语化表达和举例、类比
+   - B：量化解读，尽量通过数据和公式解读论文
+     * 在论文解读部分应多联系文章中的公式和数据
+   - C：专业解读，通过较为正式的语言和专业严谨的表达解读论文，对论文内容稍作调整
+     * 采用严谨的表达
+   - D：原汁原味，保留原文的表达风格和表述方式，接受长难句、专业术语解读方式
+     * 在论文解读部分采用高难度、高学术性，类似于专业学术论文的风格进行解读
+   - E：逐步推导，通过问题引入的方式，类似于课堂教学的方式逐步介绍知识，强调互动性
+     * 在论文解读部分多采用疑问的方式，通过问题，像课堂一样引导教导用户
+
+5. 您喜好的自然科学论文解读深度是？ {depth}
+   - A：简洁概括
+     * 在论文解读的论文概述部分中，使用2000字左右概括
+   - B：平衡详细
+     * 在论文解读的论文概述部分中，使用4000字左右概括
+   - C：详细深入
+     * 在论文解读的论文概述部分中，使用6000字左右概括
+
+6. 您希望读后自测部分包含哪些内容？（可多选） {test_type}
+   - A：相关定义填空题
+   - B：易错易混选择题
+   - C：公式逻辑默写题
+
+7. 您偏好的图表形式是？（可多选） {chart_types}
+   - A：思维导图（树状）
+   - B：流程图与逻辑图
+   - C：表格
+   - D：统计图（折线图、柱状图等）
+
+请严格根据以上设置调整您的解读，特别是每个选项的具体要求。确保解读内容与用户的阅读习惯设置完全匹配，以提供个性化的论文解读体验。
+""")
+}
+
+# 阅读习惯设置项及其默认值
+READING_HABIT_DEFAULTS = {
+    'preparation': 'B',
+    'purpose': 'B',
+    'time': 'B',
+    'style': 'C',
+    'depth': 'B',
+    'test_type': ['A'],
+    'chart_types': ['A']
+}
+
+USER_CONTEXT_TEMPLATES = {
+    'en': compile_template("""
+User Profile Analysis:
+1. Knowledge Reserve: {knowledge_reserve}
+2. Learning Style Preferences: {learning_styles}
+3. Knowledge Framework Form: {knowledge_structure}
+4. Ability Level: {abilities}
+5. Scientific Discrimination Ability: {discrimination}
+6. Reading Focus: {reading_focus}
+7. Inquiry Tendency: {inquiry}
+"""),
+    'zh': compile_template("""
+用户画像分析：
+1. 知识储备：{knowledge_reserve}
+2. 学习方式偏好：{learning_styles}
+3. 知识框架形式：{knowledge_structure}
+4. 能力水平：{abilities}
+5. 科学辨伪能力：{discrimination}
+6. 阅读关注点：{reading_focus}
+7. 探究倾向：{inquiry}
+""")
+}
+
+# 用户画像字段 -> 模板字段及缺省值
+PROFILE_FIELDS = {
+    '知识储备': ('knowledge_reserve', {}),
+    '学习方式偏好': ('learning_styles', {}),
+    '知识框架形式': ('knowledge_structure', ''),
+    '能力水平': ('abilities', {}),
+    '科学辨伪能力': ('discrimination', ''),
+    '阅读关注点': ('reading_focus', ''),
+    '探究倾向': ('inquiry', '')
+}
+
+HISTORY_HEADERS = {
+    'en': "Previous reading history (especially paper subjects and keywords) can help illustrate the user's reading interests and preferences:\n",
+    'zh': "过往阅读历史（尤其是论文的科目和关键词）可以帮助说明用户的阅读兴趣和阅读类型偏好：\n"
+}
+
+INTERPRET_USER_TEMPLATES = {
+    'en': compile_template("""
+a) The user is a high school student who needs to interpret a natural science academic paper
+b) The specific personalized interpretation settings, past reading data, personal natural science knowledge framework questionnaire, and the paper file for this interpretation have been transmitted. Please generate an interpretation that meets all personalized needs based on the user's input paper.
+c) To help improve the user's knowledge framework, focus on the weak points of the user's knowledge framework during interpretation, leverage the user's strengths in natural sciences, and focus on cultivating the user's interest in natural sciences. Please focus on the user's knowledge framework, reflect in the interpretation the improvement of the user's natural science knowledge framework, pay attention to cultivating the user's ability to strengthen weak disciplines, respect existing strengths, focus on personalized interpretation methods, and require attention to the internal connections of the five major disciplines of natural sciences involved in the paper
+d) The user's past reading history, especially the subjects and keywords of papers, can help illustrate the user's reading interests and preferences.
+e) When interpreting, sentences should not be lengthy; they should be short and clear
+f) At the beginning of the interpretation content, please provide three paper-related keywords with both Chinese and English output.
+g) Divide the interpretation content into logical sections with clear subtitles. The final output should be divided into: Paper Core Overview (Research Background and Purpose, Research Methods and Theory, Research Findings and Significance, and this part must be clear and detailed), Terminology Interpretation Section (not brief, explain more high-difficulty terms), Self-Assessment Questions(answers must be given at the end of the part), and Post-Reading Thinking Questions(must be high quality ones)
+h) Only interpret the paper content; no additional content needs to be generated
+i) The generated interpretation must be in English. (If the user's web language is set to Chinese, the interpretation output should be in Chinese)
+j) The interpretation must end with the reference: "Interpretation content generated by DeepSeek AI, for reference only."
+
+User Reading Habits:
+{reading_habits_context}
+
+User Context:
+{user_context}
+
+{history_context}
+
+Paper Content:
+{paper}
+
+Please generate the interpretation:
+"""),
+    'zh': compile_template("""
+a) 用户是一位高中生，需要解读一篇自然科学学术论文
+b) 其具体个性化解读方式设置数据、过往阅读数据、个人自然科学知识框架问卷、本次解读的论文文件已经传送，请根据用户输入的论文，生成一篇符合所有个性化需求的解读内容。
+c) 为了帮助完善用户的知识框架，可以在解读时注重用户知识框架的薄弱点，并发挥用户在自然科学方面的长处，着重引导培养用户在自然科学方面的兴趣。请重点关注用户的知识框架，在解读中体现出完善用户自然科学知识框架、注重培养用户增强薄弱学科能力、尊重现有长处，关注个性化解读方式，要求注重论文涉及的自然科学五大学科内部联系
+d) 用户的过往阅读历史，尤其是论文的科目和关键词，可以帮助说明用户的阅读兴趣和阅读类型偏好。
+e) 解读时，句子不能冗长， 要求简短、清晰
+f) 请在解读内容的开头提供三个论文相关的关键词，中英双语输出这些关键词。
+g) 尽可能逻辑清晰地分出小标题，有条理地分开解读内容的各部分。最终输出的内容要分为论文核心概述（研究背景与目的、研究方法与理论、研究发现与意义，该部分必须详细解释透彻）、术语解读部分（不要简短，多解释一些高难度术语）、自测小问题（必须要在该部分后面附上题目答案用于自测）、读后思考问题（质量要高）
+h) 只进行论文内容的解读，不需要额外生成其他内容
+i) 生成的解读内容需要是中文。（如果用户网页语言设置为英文，解读输出为英文）
+j) 解读的末尾必须有参考字样：解读内容由DeepSeek AI生成，仅供参考
+
+用户阅读习惯：
+{reading_habits_context}
+
+用户画像：
+{user_context}
+
+{history_context}
+
+论文内容：
+{paper}
+
+请开始生成解读：
+""")
+}
+
+
+# 用户相关片段的记忆化表；键为阅读设置的repr和用户画像版本戳，相同内容的用户共享同一片段
+_reading_habits_memo = Memo()
+_user_context_memo = Memo()
+
+
+def reading_habits_context(language, reading_settings):
+    """阅读习惯描述（按设置内容记忆化），没有设置时为空"""
+    if not reading_settings:
+        return ""
+    language = template_language(language)
+
+    def build():
+        values = {key: reading_settings.get(key, default) for key, default in READING_HABIT_DEFAULTS.items()}
+        return render(READING_HABITS_TEMPLATES[language], **values)
+
+    return _reading_habits_memo.get((language, repr(reading_settings)), build)
+
+
+def user_context(language, profile_stamp, analyze_profile):
+    """
+    用户画像描述（按画像版本戳记忆化）
+    analyze_profile() 返回用户画像分析，只在未命中时调用
+    """
+    language = template_language(language)
+
+    def build():
+        profile = analyze_profile()
+        values = {field: profile.get(key, default) for key, (field, default) in PROFILE_FIELDS.items()}
+        return render(USER_CONTEXT_TEMPLATES[language], **values)
+
+    return _user_context_memo.get((language, profile_stamp), build)
+
+
+def history_context(language, history):
+    """最近3条阅读历史的描述"""
+    if not history:
+        return ""
+    lines = [HISTORY_HEADERS[template_language(language)]]
+    for i, item in enumerate(history[:3]):  # 取最近3条
+        lines.append(f"{i+1}. {item.get('paper_content', '')[:100]}...\n")
+    return ''.join(lines)
+
+
+def interpretation_user_prompt(language, reading_habits, user_profile, history, paper):
+    """拼接解读请求的用户提示词"""
+    return render(
+        INTERPRET_USER_TEMPLATES[template_language(language)],
+        reading_habits_context=reading_habits,
+        user_context=user_profile,
+        history_context=history,
+        paper=paper
+    )
+
+
+# 图表生成提示词
+
+CHART_SYSTEM_PROMPTS = {
+    'en': """You are a professional chart generation assistant. Please generate clear, structured chart data based on the provided paper content.""",
+    'zh': """你是一位专业的图表生成助手。请根据提供的论文内容生成清晰、结构化的图表数据。"""
+}
+
+CHART_TEMPLATES = {
+    'en': """
+Based on the following paper content, generate a detailed {subject}.
+
+Paper content:
+{paper}
+
+Please generate markdown syntax code{renderer} for the {target}.
+要求生成markdown语法代码并返回。论文相关图表生成部分，请{instruction}。注意不要出现语法错误，导致前端显示syntax error。
+
+一定要注意没有syntax error，只返回代码让查看器后台运行即可
+
+Please output only the {output}, no other content.
+            """,
+    'zh': """
+基于以下论文内容，生成{subject}。
+
+论文内容：
+{paper}
+
+请生成{target}。
+要求生成markdown语法代码并返回。论文相关图表生成部分，请{instruction}。
+
+一定要注意没有syntax error，只返回代码让查看器后台运行即可
+
+请仅输出{output}，不要输出其他内容。注意不要出现语法错误，导致前端显示syntax error。
+            """
+}
+
+MERMAID_INSTRUCTION = '变成mermaid语法渲染器，直接生成返回的markdown代码运行后的图表'
+TABLE_INSTRUCTION = '直接生成返回的markdown代码运行后的表格'
+
+# 各图表类型（A思维导图 / B流程图 / C表格 / D统计图）填入模板的内容
+CHART_TYPES = {
+    'en': {
+        'A': {
+            'subject': 'mind map (tree structure) that organizes the main ideas, key concepts, and relationships in the paper',
+            'renderer': ' using mermaid syntax renderer',
+            'target': 'mind map',
+            'instruction': MERMAID_INSTRUCTION,
+            'output': 'markdown code with mermaid syntax'
+        },
+        'B': {
+            'subject': 'flowchart and logic diagram that shows the research process, methodology, and logical relationships in the paper',
+            'renderer': ' using mermaid syntax renderer',
+            'target': 'flowchart and logic diagram',
+            'instruction': MERMAID_INSTRUCTION,
+            'output': 'markdown code with mermaid syntax'
+        },
+        'C': {
+            'subject': 'table that summarizes the key data, results, and findings in the paper',
+            'renderer': '',
+            'target': 'table',
+            'instruction': TABLE_INSTRUCTION,
+            'output': 'markdown table code'
+        },
+        'D': {
+            'subject': 'statistical chart data (such as line charts, bar charts, etc.) that visualizes the key data and results in the paper',
+            'renderer': ' using mermaid syntax renderer',
+            'target': 'statistical charts',
+            'instruction': MERMAID_INSTRUCTION,
+            'output': 'markdown code with mermaid syntax'
+        }
+    },
+    'zh': {
+        'A': {
+            'subject': '一个详细的思维导图（树状结构），组织论文中的主要思想、关键概念和关系',
+            'target': '使用mermaid语法渲染器的markdown语法代码来表示思维导图',
+            'instruction': MERMAID_INSTRUCTION,
+            'output': '带有mermaid语法的markdown代码'
+        },
+        'B': {
+            'subject': '一个详细的流程图和逻辑图，展示论文中的研究过程、方法论和逻辑关系',
+            'target': '使用mermaid语法渲染器的markdown语法代码来表示流程图和逻辑图',
+            'instruction': MERMAID_INSTRUCTION,
+            'output': '带有mermaid语法的markdown代码'
+        },
+        'C': {
+            'subject': '一个详细的表格，总结论文中的关键数据、结果和发现',
+            'target': 'markdown语法代码来表示表格',
+            'instruction': TABLE_INSTRUCTION,
+            'output': 'markdown表格代码'
+        },
+        'D': {
+            'subject': '详细的统计图表数据（如折线图、柱状图等），可视化论文中的关键数据和结果',
+            'target': '使用mermaid语法渲染器的markdown语法代码来表示统计图表',
+            'instruction': MERMAID_INSTRUCTION,
+            'output': '带有mermaid语法的markdown代码'
+        }
+    }
+}
+
+
+def _chart_prompt_parts(language, fields):
+    """预先渲染论文内容前后的两段文本"""
+    head, tail = CHART_TEMPLATES[language].split('{paper}')
+    return render(compile_template(head), **fields), render(compile_template(tail), **fields)
+
+
+# {语言: {图表类型: (论文前文本, 论文后文本)}}
+CHART_PROMPT_PARTS = {
+    language: {chart_type: _chart_prompt_parts(language, fields) for chart_type, fields in types.items()}
+    for language, types in CHART_TYPES.items()
+}
+
+
+def build_chart_prompt(chart_type, paper_content, language='zh'):
+    """构建图表生成提示词，不支持的图表类型返回None"""
+    parts = CHART_PROMPT_PARTS[template_language(language)].get(chart_type)
+    if parts is None:
+        return None
+    return parts[0] + paper_content + parts[1]
@@ -0,0 +1,256 @@
+# rate_limit.py
+"""
+限流：令牌桶按登录用户、游客会话、客户端IP和登录尝试的账户分别计数，解读、聊天、图表、登录等各有独立预算；
+桶状态默认保存在进程内，配置数据库路径后保存在本地SQLite中，由所有gunicorn worker共享
+"""
+import functools
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from flask import jsonify, request, session
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_HITS = REGISTRY.counter(
+    'ansapra_rate_limit_hits_total', '触发限流的请求数', ('route', 'scope')
+)
+
+# 限流维度（account 为登录请求中填写的账户，由路由自行传入）
+SCOPES = ('user', 'guest', 'ip', 'account')
+
+
+class Budget:
+    """令牌桶预算：最多累积 capacity 个令牌，每 period 秒补满"""
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+
+    def __repr__(self):
+        return f"{self.capacity}/{self.period:g}"
+
+
+def parse_budgets(spec):
+    """
+    解析预算配置，如 'user=30/3600,guest=5/3600,ip=120/3600'
+    返回：{维度: Budget}；次数为0的维度不限流
+    """
+    budgets = {}
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        scope, _, value = item.partition('=')
+        scope = scope.strip()
+        if scope not in SCOPES:
+            raise ValueError(f"未知的限流维度: {scope}")
+        capacity, _, period = value.partition('/')
+        capacity, period = int(capacity), float(period or 60)
+        if capacity > 0 and period > 0:
+            budgets[scope] = Budget(capacity, period)
+    return budgets
+
+
+def _refill(tokens, updated_at, budget, now):
+    return min(budget.capacity, tokens + max(0.0, now - updated_at) * budget.rate)
+
+
+def _take_all(states, checks, now):
+    """
+    对一组桶一次性扣除1个令牌：任一桶不足时都不扣
+    states: {key: (tokens, updated_at)}（缺失表示满桶）；checks: [(key, budget)]
+    返回：(新状态或None, 被拒绝的key, 需等待的秒数)
+    """
+    updated = {}
+    for key, budget in checks:
+        tokens, updated_at = states.get(key, (budget.capacity, now))
+        tokens = _refill(tokens, updated_at, budget, now)
+        if tokens < 1:
+            return None, key, (1 - tokens) / budget.rate
+        updated[key] = (tokens - 1, now)
+    return updated, None, 0
+
+
+class MemoryBucketStore:
+    """进程内的令牌桶状态"""
+
+    def __init__(self, max_keys=100000, idle_ttl=86400):
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, checks, now=None):
+        """返回 (allowed, 被拒绝的key, 需等待的秒数)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            updated, rejected, wait = _take_all(self._buckets, checks, now)
+            if updated is None:
+                return False, rejected, wait
+            self._buckets.update(updated)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return True, None, 0
+
+    def _prune(self, now):
+        """闲置超过最长补满周期的桶必然已补满，与不存在等价"""
+        idle = [key for key, (_, updated_at) in self._buckets.items() if now - updated_at > self.idle_ttl]
+        for key in idle:
+            del self._buckets[key]
+        if len(self._buckets) > self.max_keys:
+            # 仍然过多时丢弃最久未更新的一半
+            ordered = sorted(self._buckets.items(), key=lambda item: item[1][1])
+            for key, _ in ordered[:len(ordered) // 2]:
+                del self._buckets[key]
+
+
+class SQLiteBucketStore:
+    """保存在本地SQLite中的令牌桶状态（同一台机器上的多个worker共享）"""
+
+    def __init__(self, db_path, idle_ttl=86400, cleanup_every=1000):
+        self.db_path = db_path
+        self.idle_ttl = idle_ttl
+        self.cleanup_every = cleanup_every
+        self._local = threading.local()
+        self._operations = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            'key TEXT PRIMARY KEY, '
+            'tokens REAL NOT NULL, '
+            'updated_at REAL NOT NULL)'
+        )
+
+    def _connect(self):
+        """获取当前线程（当前进程）的数据库连接"""
+        pid = os.getpid()
+        cached = getattr(self._local, 'conn', None)
+        if cached is not None and cached[0] == pid:
+            return cached[1]
+
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = (pid, conn)
+        return conn
+
+    def take(self, checks, now=None):
+        """返回 (allowed, 被拒绝的key, 需等待的秒数)"""
+        now = time.time() if now is None else now
+        keys = [key for key, _ in checks]
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                f"SELECT key, tokens, updated_at FROM buckets WHERE key IN ({','.join('?' * len(keys))})",
+                keys
+            ).fetchall()
+            updated, rejected, wait = _take_all({key: (tokens, at) for key, tokens, at in rows}, checks, now)
+            if updated is not None:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)',
+                    [(key, tokens, at) for key, (tokens, at) in updated.items()]
+                )
+                self._operations += 1
+                if self._operations % self.cleanup_every == 0:
+                    conn.execute('DELETE FROM buckets WHERE updated_at < ?', (now - self.idle_ttl,))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        if updated is None:
+            return False, rejected, wait
+        return True, None, 0
+
+
+class RateLimiter:
+    """按路由的多维度令牌桶限流"""
+
+    def __init__(self, store, budgets, trusted_proxies=0, enabled=True):
+        self.store = store
+        # {路由: {维度: Budget}}
+        self.budgets = budgets
+        self.trusted_proxies = trusted_proxies
+        self.enabled = enabled
+
+    def client_ip(self):
+        """客户端IP；部署在 trusted_proxies 层反向代理之后时取代理追加的地址"""
+        if self.trusted_proxies > 0:
+            forwarded = request.access_route
+            if len(forwarded) >= self.trusted_proxies and request.headers.get('X-Forwarded-For'):
+                return forwarded[-self.trusted_proxies]
+        return request.remote_addr or 'unknown'
+
+    def identities(self):
+        """当前请求适用的 (维度, 标识)：登录用户或游客会话，以及客户端IP"""
+        identities = []
+        email = session.get('user_email')
+        if email:
+            identities.append(('guest' if session.get('is_guest') else 'user', email))
+        identities.append(('ip', self.client_ip()))
+        return identities
+
+    def check(self, route, extra_identities=()):
+        """
+        扣除令牌，返回 (allowed, 触发限流的维度, Retry-After秒数)
+        extra_identities: 请求会话之外的 (维度, 标识)，如登录请求中的账户
+        """
+        budgets = self.budgets.get(route) or {}
+        checks = [
+            (f"{route}:{scope}:{identity}", budgets[scope])
+            for scope, identity in self.identities() + list(extra_identities) if scope in budgets
+        ]
+        if not self.enabled or not checks:
+            return True, None, 0
+        try:
+            allowed, rejected, wait = self.store.take(checks)
+        except sqlite3.Error as e:
+            # 限流存储故障时放行，不影响正常使用
+            logger.error(f"限流状态读写失败: {e}")
+            return True, None, 0
+        if allowed:
+            return True, None, 0
+        scope = rejected.split(':', 2)[1]
+        return False, scope, max(1, math.ceil(wait))
+
+    def rejection(self, route, scope, retry_after):
+        """check 未放行时的响应：带 Retry-After 的429"""
+        RATE_LIMIT_HITS.inc(route=route, scope=scope)
+        logger.warning(f"{route} 触发限流（{scope}），{retry_after}秒后可重试")
+        response = jsonify({
+            'success': False,
+            'message': f'请求过于频繁，请在{retry_after}秒后重试',
+            'retry_after': retry_after
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    def limit(self, route):
+        """路由装饰器：超出预算时返回带 Retry-After 的429"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                allowed, scope, retry_after = self.check(route)
+                if not allowed:
+                    return self.rejection(route, scope, retry_after)
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def config(self):
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.store).__name__,
+            'budgets': {route: {scope: repr(b) for scope, b in budgets.items()} for route, budgets in self.budgets.items()}
+        }
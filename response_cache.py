@@ -0,0 +1,174 @@
+# response_cache.py
+"""
+AI生成结果缓存：带过期时间（TTL）和容量上限的内存LRU缓存，
+解读结果的缓存键计算，以及相同键并发请求的合并（single-flight）
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import CACHE_EVENTS
+
+# 影响解读提示词的阅读设置项
+PROMPT_READING_KEYS = ('depth', 'style', 'purpose', 'time', 'preparation', 'test_type', 'chart_types')
+
+
+class TTLCache:
+    """线程安全的TTL + LRU缓存，name 为指标中的缓存名"""
+
+    def __init__(self, max_items=256, ttl=86400, name='ttl'):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.name = name
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'expired': 0, 'stores': 0}
+
+    @property
+    def enabled(self):
+        return self.max_items > 0 and self.ttl > 0
+
+    def _count(self, event):
+        """累计事件次数（调用方需持有锁）"""
+        self._counters[event] += 1
+        CACHE_EVENTS.inc(cache=self.name, event=event)
+
+    def get(self, key):
+        """读取缓存，未命中或已过期返回None"""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self._count('misses')
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._items[key]
+                self._count('expired')
+                self._count('misses')
+                return None
+
+            self._items.move_to_end(key)
+            self._count('hits')
+            return value
+
+    def put(self, key, value):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._items[key] = (time.time() + self.ttl, value)
+            self._items.move_to_end(key)
+            self._count('stores')
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['items'] = len(self._items)
+        return stats
+
+
+class _Call:
+    """一次进行中的计算"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout=None):
+        """等待计算完成并返回结果；计算失败时抛出同样的异常"""
+        if not self.done.wait(timeout):
+            raise TimeoutError('等待进行中的相同请求超时')
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """相同键的并发计算只执行一次，其余调用等待并共享结果"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = {'leaders': 0, 'followers': 0}
+
+    def acquire(self, key):
+        """
+        加入键对应的计算
+        返回：(call, is_leader)；is_leader为True时调用方负责计算并在结束后调用release
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._counters['followers'] += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self._counters['leaders'] += 1
+            return call, True
+
+    def release(self, key, call, result=None, error=None):
+        """结束计算并唤醒所有等待者"""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call.error = error
+        call.done.set()
+
+    def do(self, key, fn):
+        """执行 fn()；已有相同键的计算在进行时直接等待其结果"""
+        call, is_leader = self.acquire(key)
+        if not is_leader:
+            return call.wait()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.release(key, call, error=e)
+            raise
+        self.release(key, call, result=result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+def bucket_profile(profile_analysis):
+    """把用户画像归一化为粗粒度分档，相近画像的学生共享缓存"""
+    def bucket(value):
+        if isinstance(value, dict):
+            return {k: bucket(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [bucket(v) for v in value]
+        if isinstance(value, int) and not isinstance(value, bool):
+            # 1-5分的能力自评：低 / 中 / 高
+            if value <= 2:
+                return 'low'
+            if value == 3:
+                return 'mid'
+            return 'high'
+        return value
+
+    return bucket(profile_analysis or {})
+
+
+def interpretation_cache_key(paper_hash, language, user_settings, profile_analysis, mode='standard'):
+    """解读结果缓存键：论文内容哈希 + 语言 + 阅读设置 + 分档后的用户画像 + 解读模式"""
+    reading_settings = (user_settings or {}).get('reading', {})
+    key_data = {
+        'paper': paper_hash,
+        'mode': mode,
+        'language': language,
+        'reading': {k: reading_settings.get(k) for k in PROMPT_READING_KEYS},
+        'profile': bucket_profile(profile_analysis)
+    }
+    encoded = json.dumps(key_data, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
@@ -0,0 +1,289 @@
+# sessions.py
+"""
+服务端会话：Cookie中只保存随机会话ID，会话数据和登录用户的简要信息
+（id、用户名、设置、语言）保存在进程内带过期时间的会话表中，并写入本地SQLite，
+worker重启后会话仍然有效；用户设置、问卷修改或删除账户时使对应会话的简要信息失效
+"""
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+# 会话ID的字节数（Cookie中为其URL安全的Base64编码）
+SID_BYTES = 32
+
+
+# 简要信息来源于用户记录中的这些字段，修改后需使会话中缓存的简要信息失效
+SUMMARY_FIELDS = ('id', 'username', 'settings')
+
+
+def user_summary(user):
+    """已登录用户的简要信息（不含密码哈希、问卷和历史），缓存在会话中"""
+    settings = user.get('settings', {})
+    return {
+        'id': user.get('id'),
+        'username': user.get('username', ''),
+        'settings': settings,
+        'language': settings.get('language', 'zh')
+    }
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """服务端会话：字典内容修改时标记 modified，summary 为缓存的用户简要信息"""
+
+    def __init__(self, initial=None, sid=None, summary=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.summary = summary
+        # 加载时的登录邮箱，登录身份变化时更换会话ID（防止会话固定攻击）
+        self.loaded_email = (initial or {}).get('user_email')
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+
+class SessionStore:
+    """会话表：进程内的TTL + LRU表在前，SQLite在后（所有worker共享，重启不丢失）"""
+
+    def __init__(self, db_path, ttl=7 * 86400, cache_ttl=60, max_items=10000, cleanup_every=1000):
+        self.db_path = db_path
+        # 会话闲置超过 ttl 秒后失效
+        self.ttl = ttl
+        # 进程内的会话最多使用 cache_ttl 秒后重新从SQLite读取（其他worker的修改在此期间内生效）
+        self.cache_ttl = cache_ttl
+        self.max_items = max_items
+        self.cleanup_every = cleanup_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # sid -> {'data', 'summary', 'email', 'expires_at', 'cached_at'}
+        self._items = OrderedDict()
+        self._writes = 0
+        self._counters = {'hits': 0, 'misses': 0, 'saves': 0, 'invalidations': 0}
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'sid TEXT PRIMARY KEY, '
+            'email TEXT, '
+            'data TEXT NOT NULL, '
+            'summary TEXT, '
+            'expires_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS sessions_email ON sessions (email)')
+
+    def _connect(self):
+        """获取当前线程（当前进程）的数据库连接"""
+        pid = os.getpid()
+        cached = getattr(self._local, 'conn', None)
+        if cached is not None and cached[0] == pid:
+            return cached[1]
+
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = (pid, conn)
+        return conn
+
+    def _cache(self, sid, entry):
+        """放入进程内会话表，超出容量时淘汰最久未使用的会话（仍保存在SQLite中）"""
+        self._items[sid] = entry
+        self._items.move_to_end(sid)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def load(self, sid):
+        """读取会话，返回 (data, summary)，不存在或已过期时返回None"""
+        now = time.time()
+        with self._lock:
+            entry = self._items.get(sid)
+            if entry is not None and (entry['expires_at'] <= now or now - entry['cached_at'] >= self.cache_ttl):
+                del self._items[sid]
+                entry = None
+            if entry is not None:
+                self._items.move_to_end(sid)
+                self._counters['hits'] += 1
+                data, summary, expires_at = entry['data'], entry['summary'], entry['expires_at']
+            else:
+                self._counters['misses'] += 1
+
+        if entry is None:
+            row = self._connect().execute(
+                'SELECT data, summary, expires_at FROM sessions WHERE sid = ?', (sid,)
+            ).fetchone()
+            if row is None or row[2] <= now:
+                return None
+            data, summary, expires_at = json.loads(row[0]), json.loads(row[1]) if row[1] else None, row[2]
+
+        # 剩余时间不足一半时顺延（每个会话每半个ttl最多写一次）
+        extend = expires_at - now <= self.ttl / 2
+        if extend:
+            expires_at = now + self.ttl
+            self._connect().execute('UPDATE sessions SET expires_at = ? WHERE sid = ?', (expires_at, sid))
+        with self._lock:
+            if entry is None:
+                self._cache(sid, {
+                    'data': data, 'summary': summary, 'email': data.get('user_email'),
+                    'expires_at': expires_at, 'cached_at': now
+                })
+            elif extend:
+                entry['expires_at'] = expires_at
+        return dict(data), summary
+
+    def save(self, sid, data, summary=None):
+        """写入会话（进程内会话表和SQLite）"""
+        now = time.time()
+        expires_at = now + self.ttl
+        email = data.get('user_email')
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO sessions (sid, email, data, summary, expires_at) VALUES (?, ?, ?, ?, ?)',
+            (sid, email, json.dumps(data, ensure_ascii=False),
+             json.dumps(summary, ensure_ascii=False) if summary is not None else None, expires_at)
+        )
+        with self._lock:
+            self._cache(sid, {
+                'data': dict(data), 'summary': summary, 'email': email,
+                'expires_at': expires_at, 'cached_at': now
+            })
+            self._counters['saves'] += 1
+            self._writes += 1
+            cleanup = self._writes % self.cleanup_every == 0
+        if cleanup:
+            self.cleanup(now)
+
+    def set_summary(self, sid, summary):
+        """缓存会话用户的简要信息"""
+        self._connect().execute(
+            'UPDATE sessions SET summary = ? WHERE sid = ?', (json.dumps(summary, ensure_ascii=False), sid)
+        )
+        with self._lock:
+            entry = self._items.get(sid)
+            if entry is not None:
+                entry['summary'] = summary
+
+    def delete(self, sid):
+        self._connect().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+        with self._lock:
+            self._items.pop(sid, None)
+
+    def invalidate_user(self, email):
+        """用户记录修改后清除该用户所有会话中缓存的简要信息，下次使用时重新读取"""
+        self._connect().execute('UPDATE sessions SET summary = NULL WHERE email = ? AND summary IS NOT NULL', (email,))
+        with self._lock:
+            for entry in self._items.values():
+                if entry['email'] == email:
+                    entry['summary'] = None
+            self._counters['invalidations'] += 1
+
+    def delete_user(self, email):
+        """删除用户的所有会话（删除账户后其他设备上的登录同时失效）"""
+        self._connect().execute('DELETE FROM sessions WHERE email = ?', (email,))
+        with self._lock:
+            for sid in [sid for sid, entry in self._items.items() if entry['email'] == email]:
+                del self._items[sid]
+            self._counters['invalidations'] += 1
+
+    def cleanup(self, now=None):
+        """删除已过期的会话"""
+        now = time.time() if now is None else now
+        deleted = self._connect().execute('DELETE FROM sessions WHERE expires_at <= ?', (now,)).rowcount
+        with self._lock:
+            for sid in [sid for sid, entry in self._items.items() if entry['expires_at'] <= now]:
+                del self._items[sid]
+        if deleted:
+            logger.info(f"已清理 {deleted} 个过期会话")
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['cached'] = len(self._items)
+        stats['ttl'] = self.ttl
+        return stats
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask会话接口：Cookie中只保存会话ID，会话内容保存在 SessionStore 中"""
+
+    def __init__(self, store):
+        self.store = store
+        # 升级前签名Cookie中的会话，首次访问时迁移为服务端会话
+        self._legacy = SecureCookieSessionInterface()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            loaded = self.store.load(sid)
+            if loaded is not None:
+                data, summary = loaded
+                return ServerSession(data, sid=sid, summary=summary)
+
+            legacy = self._legacy.open_session(app, request)
+            if legacy:
+                session = ServerSession()
+                session.update(legacy)
+                return session
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.sid:
+                self.store.delete(session.sid)
+            if session.modified or session.sid:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        if not session.modified and session.sid:
+            return
+
+        new_sid = session.sid is None or session.get('user_email') != session.loaded_email
+        if new_sid:
+            # 登录身份变化时换用新的会话ID，旧ID作废
+            if session.sid:
+                self.store.delete(session.sid)
+            session.sid = secrets.token_urlsafe(SID_BYTES)
+        self.store.save(session.sid, dict(session), session.summary)
+
+        if new_sid:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
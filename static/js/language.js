@@ -2,38 +2,54 @@ class LanguageManager {
     constructor() {
         this.currentLang = localStorage.getItem('language') || 'zh';
         this.translations = {};
+        // 各语言的下载请求（每种语言只请求一次）及下载失败的语言
+        this.loading = {};
+        this.failed = new Set();
         this.init();
     }
 
     async init() {
-        await this.loadTranslations();
+        // 只下载当前语言的翻译，切换语言时再下载其他语言
+        await this.loadLanguage(this.currentLang);
         this.applyLanguage(this.currentLang);
         this.setupEventListeners();
     }
 
-    async loadTranslations() {
-        try {
-            // 尝试使用相对路径加载翻译文件
-            const response = await fetch('static/lang/translations.json');
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            this.translations = await response.json();
-            console.log('Translations loaded successfully');
-        } catch (error) {
-            console.error('Failed to load translations:', error);
-            // 使用默认翻译作为后备
-            this.translations = {
-                en: {},
-                zh: {}
-            };
+    loadLanguage(lang) {
+        if (!this.loading[lang]) {
+            this.loading[lang] = fetch(`/api/i18n/${encodeURIComponent(lang)}`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP error! status: ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(translations => {
+                    this.translations[lang] = translations;
+                    console.log(`Translations loaded successfully: ${lang}`);
+                })
+                .catch(error => {
+                    console.error(`Failed to load ${lang} translations:`, error);
+                    this.failed.add(lang);
+                });
         }
+        return this.loading[lang];
     }
 
     applyLanguage(lang) {
         if (!this.translations[lang]) {
-            console.warn(`Language ${lang} not available, defaulting to en`);
-            lang = 'en';
+            if (!this.failed.has(lang)) {
+                // 该语言的翻译还没有下载，下载完成后再应用
+                this.loadLanguage(lang).then(() => this.applyLanguage(lang));
+                return;
+            }
+            if (lang !== 'en') {
+                console.warn(`Language ${lang} not available, defaulting to en`);
+                this.applyLanguage('en');
+                return;
+            }
+            // 使用空翻译作为后备
+            this.translations[lang] = {};
         }
 
         this.currentLang = lang;
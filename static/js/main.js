@@ -728,7 +728,8 @@ async function loadChatHistory() {
     if (!AppState.user || AppState.user.is_guest) return;
     
     try {
-        const response = await fetch('/api/chat/history', {
+        // 对话上下文只用到最近几轮，只取最新一页
+        const response = await fetch('/api/chat/history?limit=10', {
             credentials: 'include'
         });
         const data = await response.json();
@@ -3166,6 +3167,52 @@ function setupCookieConsent() {
     }
 }
 
+// 读取Server-Sent Events流式响应，返回done/error事件中的最终数据
+async function readSSEStream(response, onDelta) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    let receivedText = '';
+    let result = null;
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // 每条事件以空行分隔
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let eventName = 'message';
+            let eventData = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    eventData += line.slice(5).trim();
+                }
+            });
+            if (!eventData) continue;
+            
+            const payload = JSON.parse(eventData);
+            if (eventName === 'done' || eventName === 'error') {
+                result = payload;
+            } else if (payload.delta) {
+                receivedText += payload.delta;
+                if (onDelta) onDelta(receivedText);
+            }
+        }
+    }
+    
+    if (!result) {
+        throw new Error('流式响应意外中断');
+    }
+    return result;
+}
+
 // 修改文件处理逻辑，确保正确传递文件
 async function startInterpretation() {
     if (AppState.isProcessing) return;
@@ -3220,6 +3267,8 @@ async function startInterpretation() {
         const currentLanguage = window.languageManager ? window.languageManager.getCurrentLanguage() : 'zh';
         formData.append('language', currentLanguage);
         console.log('发送到API的语言:', currentLanguage);
+        // 使用流式输出，边生成边接收解读内容
+        formData.append('stream', '1');
         
         // 显示上传进度
         const progressElement = document.createElement('div');
@@ -3259,7 +3308,14 @@ async function startInterpretation() {
             
             let data;
             try {
-                data = await response.json();
+                const contentType = response.headers.get('Content-Type') || '';
+                if (contentType.includes('text/event-stream')) {
+                    data = await readSSEStream(response, (receivedText) => {
+                        progressElement.innerHTML = `<p>正在生成解读... 已接收 ${receivedText.length} 字</p>`;
+                    });
+                } else {
+                    data = await response.json();
+                }
                 console.log('API响应数据:', data);
             } catch (jsonError) {
                 console.error('JSON解析错误:', jsonError);
@@ -0,0 +1,175 @@
+# static_assets.py
+"""
+静态资源：启动时按内容哈希为 static 目录下的文件生成带指纹的文件名（url_for('static') 直接输出），
+带指纹的副本和预压缩的 gzip / brotli 版本写入构建目录，按 Accept-Encoding 选择并以
+Cache-Control: immutable 长期缓存；不带指纹的请求和动态页面按 ETag 协商缓存（未变化时返回304）
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import sys
+import tempfile
+import time
+
+from flask import request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 带指纹的文件缓存一年（内容变化时文件名随之变化）
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# 文件名中内容哈希的长度
+HASH_LENGTH = 12
+# 预压缩的文件类型
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.json', '.svg', '.html', '.txt')
+# 按优先级排列的预压缩编码：(编码, 文件后缀, 压缩函数)
+ENCODINGS = [('gzip', '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', '.br', lambda data: brotli.compress(data, quality=11)))
+# 构建目录中不再被引用的文件保留的时间（滚动重启期间旧页面仍可能请求旧文件）
+STALE_MAX_AGE = 7 * 24 * 3600
+
+
+def _write_once(path, produce):
+    """文件不存在时写入 produce() 的结果（先写临时文件再改名，多个worker同时构建也不会读到半个文件）"""
+    if os.path.exists(path):
+        return path
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.build-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(produce())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def negotiate_encoding(variants):
+    """按 Accept-Encoding 从 {编码: ...} 中选择压缩版本，都不接受时返回 'identity'"""
+    for encoding, _, _ in ENCODINGS:
+        if encoding in variants and request.accept_encodings[encoding] > 0:
+            return encoding
+    return 'identity'
+
+
+def revalidate(response):
+    """动态页面：按内容生成ETag并要求浏览器每次协商，内容未变化时返回304"""
+    response.add_etag()
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response.make_conditional(request)
+
+
+class AssetPipeline:
+    """带指纹、预压缩、长期缓存的静态资源"""
+
+    def __init__(self, build_dir, enabled=True):
+        # send_file 会把相对路径解析到应用目录下，这里按当前工作目录转为绝对路径
+        self.build_dir = os.path.abspath(build_dir)
+        self.enabled = enabled
+        # 原文件名 -> 带指纹的文件名
+        self.manifest = {}
+        # 带指纹的文件名 -> (内容哈希, mimetype, {编码: 文件路径})
+        self._assets = {}
+        self._send_static_file = None
+
+    def init_app(self, app):
+        """构建静态资源，并接管 url_for('static') 和 static 路由"""
+        if not self.enabled or not app.static_folder:
+            return
+        start = time.perf_counter()
+        self.build(app.static_folder)
+        logger.info(f"静态资源构建完成: {len(self.manifest)} 个文件，耗时 {time.perf_counter() - start:.2f}秒"
+                    f"（{'、'.join(encoding for encoding, _, _ in ENCODINGS)}）")
+        app.url_defaults(self._url_defaults)
+        self._send_static_file = app.view_functions['static']
+        app.view_functions['static'] = self.serve
+
+    def build(self, static_folder):
+        """为 static_folder 下的所有文件生成带指纹的副本和压缩版本"""
+        built = set()
+        for root, _, files in os.walk(static_folder):
+            for name in sorted(files):
+                source = os.path.join(root, name)
+                filename = os.path.relpath(source, static_folder).replace(os.sep, '/')
+                built.update(self._build_file(filename, source))
+        self._prune(built)
+
+    def _build_file(self, filename, source):
+        with open(source, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        stem, ext = os.path.splitext(filename)
+        hashed = f"{stem}.{digest}{ext}"
+        target = os.path.join(self.build_dir, *hashed.split('/'))
+
+        variants = {'identity': _write_once(target, lambda: data)}
+        if ext.lower() in COMPRESSIBLE_EXTENSIONS:
+            for encoding, suffix, compress in ENCODINGS:
+                path = _write_once(target + suffix, lambda: compress(data))
+                # 压缩后没有变小的不使用
+                if os.path.getsize(path) < len(data):
+                    variants[encoding] = path
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.manifest[filename] = hashed
+        self._assets[hashed] = (digest, mimetype, variants)
+        return [target] + [target + suffix for _, suffix, _ in ENCODINGS]
+
+    def _prune(self, built):
+        """删除构建目录中长期不再被引用的旧版本"""
+        cutoff = time.time() - STALE_MAX_AGE
+        for root, _, files in os.walk(self.build_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if path in built:
+                    continue
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.unlink(path)
+                except OSError:
+                    continue
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self.manifest.get(values['filename'], values['filename'])
+
+    def serve(self, filename):
+        """static 路由：带指纹的文件长期缓存，其余文件按ETag / Last-Modified协商"""
+        asset = self._assets.get(filename)
+        if asset is None:
+            return self._send_static_file(filename=filename)
+
+        digest, mimetype, variants = asset
+        encoding = negotiate_encoding(variants)
+        response = send_file(
+            variants[encoding],
+            mimetype=mimetype,
+            max_age=IMMUTABLE_MAX_AGE,
+            etag=f"{digest}-{encoding}",
+            conditional=True
+        )
+        response.cache_control.immutable = True
+        if encoding != 'identity':
+            response.content_encoding = encoding
+        if len(variants) > 1:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+if __name__ == '__main__':
+    # 用法: python static_assets.py [构建目录]（部署时预先构建，worker启动时直接复用）
+    logging.basicConfig(level=logging.INFO)
+    pipeline = AssetPipeline(sys.argv[1] if len(sys.argv) > 1 else 'data/assets')
+    pipeline.build(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    for filename, hashed in sorted(pipeline.manifest.items()):
+        print(f"{filename} -> {hashed}")
@@ -0,0 +1,166 @@
+# upload_spool.py
+"""
+上传文件落盘：multipart解析时把文件部分直接分块写入 UPLOAD_FOLDER 下的临时文件，
+写入的同时计算SHA-256，解析器按路径打开文件流，上传内容不再整体读入内存
+"""
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from flask import Request, current_app
+
+logger = logging.getLogger(__name__)
+
+# 复制非落盘上传流时的分块大小
+CHUNK_SIZE = 1024 * 1024
+# 临时文件名前后缀，用于清理进程异常退出后遗留的文件
+FILE_PREFIX = 'upload-'
+FILE_SUFFIX = '.part'
+
+
+class SpooledUpload:
+    """
+    落盘的上传文件：可写可读的文件对象（供werkzeug写入），写入时累计SHA-256和大小
+    默认随请求结束（close）删除；交给后台任务时先调用 detach()，由任务结束时 discard()
+    （detach 后写入句柄已关闭，之后只能通过 open()/mapped()/head() 按路径读取）
+    """
+
+    def __init__(self, directory=None):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(
+            mode='w+b', dir=directory or None, prefix=FILE_PREFIX, suffix=FILE_SUFFIX, delete=False
+        )
+        self.path = self._file.name
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._detached = False
+        self._removed = False
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        # read / seek / tell / flush 等由底层文件对象提供
+        if name == '_file':
+            raise AttributeError(name)
+        return getattr(self._file, name)
+
+    @property
+    def sha256(self):
+        """写入内容的SHA-256（与 pdf_cache.content_hash 一致）"""
+        return self._hash.hexdigest()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def head(self, size):
+        """读取开头的 size 个字节"""
+        with open(self.path, 'rb') as f:
+            return f.read(size)
+
+    def _flush(self):
+        """把已写入的内容刷到磁盘（写入句柄已关闭时内容已全部落盘）"""
+        if not self._file.closed:
+            self._file.flush()
+
+    def open(self):
+        """打开一个独立的只读文件流（各自维护读取位置，可在线程间并用）"""
+        self._flush()
+        return open(self.path, 'rb')
+
+    @contextmanager
+    def mapped(self):
+        """只读内存映射（空文件返回空bytes），用于解码文本文件时避免额外的副本"""
+        self._flush()
+        if self.size == 0:
+            yield b''
+            return
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+    def detach(self):
+        """
+        转交所有权：立即关闭写入句柄（请求结束时werkzeug会关闭上传的文件对象，
+        后台任务可能在那之后才开始），文件保留到调用方 discard()
+        """
+        self._file.close()
+        self._detached = True
+        return self
+
+    def close(self):
+        self._file.close()
+        if not self._detached:
+            self._remove()
+
+    def discard(self):
+        """关闭并删除临时文件"""
+        self._file.close()
+        self._remove()
+
+    def _remove(self):
+        if self._removed:
+            return
+        self._removed = True
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除上传临时文件失败 {self.path}: {e}")
+
+
+class SpoolingRequest(Request):
+    """multipart中的文件部分直接写入 UPLOAD_FOLDER 下的 SpooledUpload"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledUpload(current_app.config.get('UPLOAD_FOLDER'))
+
+
+def spool_upload(file_storage, directory=None):
+    """
+    返回上传文件对应的 SpooledUpload
+    通过 SpoolingRequest 解析的上传直接复用；其他来源的文件流分块复制到临时文件
+    """
+    stream = file_storage.stream
+    if isinstance(stream, SpooledUpload):
+        stream._flush()
+        return stream
+
+    upload = SpooledUpload(directory)
+    stream.seek(0)
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        upload.write(chunk)
+    upload.flush()
+    return upload
+
+
+def remove_stale(directory, max_age=86400):
+    """删除超过 max_age 秒的遗留上传临时文件（worker崩溃或被回收时未能清理）"""
+    if not directory or not os.path.isdir(directory):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        if not (name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.stat(path).st_mtime < cutoff:
+                os.unlink(path)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info(f"已清理 {removed} 个遗留的上传临时文件")
+    return removed
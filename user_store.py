@@ -0,0 +1,336 @@
+# user_store.py
+"""
+用户数据存储引擎：基于SQLite（WAL模式），按邮箱读写单条用户记录，
+避免每次请求都整体读写 users.json；
+阅读历史和聊天历史按用户追加写入独立的日志表，超出上限后压缩到最近的条数。
+"""
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 历史记录类型及每个用户保留的条数
+HISTORY_KINDS = ('reading', 'chat')
+HISTORY_LIMIT = 50
+# 超出上限这么多条后才压缩，避免每次追加都删除
+HISTORY_COMPACT_SLACK = 10
+
+
+class UserStore:
+    """按记录读写的用户存储"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self.transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS users ('
+                'email TEXT PRIMARY KEY, '
+                'data TEXT NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS meta ('
+                'key TEXT PRIMARY KEY, '
+                'value TEXT)'
+            )
+            # 追加写入的历史日志，id 递增即时间顺序
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS history ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'email TEXT NOT NULL, '
+                'kind TEXT NOT NULL, '
+                'data TEXT NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS history_user ON history (email, kind, id)')
+
+    def _connect(self):
+        """获取当前线程（当前进程）的数据库连接"""
+        # gunicorn preload_app 会在 fork 前创建连接，子进程必须重新连接
+        pid = os.getpid()
+        cached = getattr(self._local, 'conn', None)
+        if cached is not None and cached[0] == pid:
+            return cached[1]
+
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = (pid, conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """写事务（BEGIN IMMEDIATE，多个worker之间不会丢失写入）"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+
+    def get(self, email):
+        """读取单个用户记录，不存在时返回None"""
+        row = self._connect().execute(
+            'SELECT data FROM users WHERE email = ?', (email,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def exists(self, email):
+        """用户是否存在"""
+        return self._connect().execute(
+            'SELECT 1 FROM users WHERE email = ?', (email,)
+        ).fetchone() is not None
+
+    def insert(self, email, user_data):
+        """插入新用户，邮箱已存在时返回False"""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO users (email, data) VALUES (?, ?)',
+                (email, json.dumps(user_data, ensure_ascii=False))
+            )
+            return cursor.rowcount == 1
+
+    def put(self, email, user_data):
+        """写入（覆盖）单个用户记录"""
+        with self.transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO users (email, data) VALUES (?, ?)',
+                (email, json.dumps(user_data, ensure_ascii=False))
+            )
+
+    def update(self, email, updater):
+        """
+        在同一事务中对单个用户记录做读-改-写
+        updater 接收用户字典并就地修改
+        返回：修改后的用户字典，用户不存在时返回None
+        """
+        with self.transaction() as conn:
+            row = conn.execute(
+                'SELECT data FROM users WHERE email = ?', (email,)
+            ).fetchone()
+            if not row:
+                return None
+
+            user_data = json.loads(row[0])
+            updater(user_data)
+            conn.execute(
+                'UPDATE users SET data = ? WHERE email = ?',
+                (json.dumps(user_data, ensure_ascii=False), email)
+            )
+            return user_data
+
+    def update_all(self, updater, marker=None):
+        """
+        在同一事务中对所有用户记录做读-改-写，updater 返回True表示记录有修改
+        marker=(key, value)：meta中已是该值时直接返回0，完成后写入该值，保证只执行一次
+        返回：修改的条数
+        """
+        with self.transaction() as conn:
+            if marker:
+                row = conn.execute('SELECT value FROM meta WHERE key = ?', (marker[0],)).fetchone()
+                if row and row[0] == marker[1]:
+                    return 0
+
+            rows = []
+            for email, data in conn.execute('SELECT email, data FROM users').fetchall():
+                user_data = json.loads(data)
+                if updater(user_data):
+                    rows.append((json.dumps(user_data, ensure_ascii=False), email))
+            conn.executemany('UPDATE users SET data = ? WHERE email = ?', rows)
+
+            if marker:
+                conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', marker)
+            return len(rows)
+
+    def delete(self, email):
+        """删除用户及其历史记录，返回是否删除成功"""
+        with self.transaction() as conn:
+            cursor = conn.execute('DELETE FROM users WHERE email = ?', (email,))
+            conn.execute('DELETE FROM history WHERE email = ?', (email,))
+            return cursor.rowcount == 1
+
+    def append_history(self, email, kind, item):
+        """
+        追加一条历史记录（只插入一行，不改写用户记录）
+        超出 HISTORY_LIMIT + HISTORY_COMPACT_SLACK 条时压缩到最近 HISTORY_LIMIT 条
+        返回：是否写入（用户不存在时返回False）
+        """
+        with self.transaction() as conn:
+            if not self._insert_history(conn, email, kind, item):
+                return False
+            self._compact_history(conn, email, kind)
+            return True
+
+    def apply_batch(self, updates, history):
+        """
+        在同一事务中写入一批修改（写缓冲的批量提交）：要么全部生效，要么全部不生效
+        updates: {邮箱: {字段: 值}}，按字段覆盖用户记录；history: [(邮箱, 类型, 记录)]，按顺序追加
+        已不存在的用户的修改被忽略
+        返回：(修改的用户数, 追加的历史记录数)
+        """
+        with self.transaction() as conn:
+            updated = 0
+            for email, fields in updates.items():
+                row = conn.execute('SELECT data FROM users WHERE email = ?', (email,)).fetchone()
+                if not row:
+                    continue
+                user_data = json.loads(row[0])
+                user_data.update(fields)
+                conn.execute(
+                    'UPDATE users SET data = ? WHERE email = ?',
+                    (json.dumps(user_data, ensure_ascii=False), email)
+                )
+                updated += 1
+
+            appended, touched = 0, set()
+            for email, kind, item in history:
+                if self._insert_history(conn, email, kind, item):
+                    appended += 1
+                    touched.add((email, kind))
+            for email, kind in touched:
+                self._compact_history(conn, email, kind)
+            return updated, appended
+
+    @staticmethod
+    def _insert_history(conn, email, kind, item):
+        """插入一条历史记录，用户不存在时返回False"""
+        cursor = conn.execute(
+            'INSERT INTO history (email, kind, data) '
+            'SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM users WHERE email = ?)',
+            (email, kind, json.dumps(item, ensure_ascii=False), email)
+        )
+        return cursor.rowcount == 1
+
+    @staticmethod
+    def _compact_history(conn, email, kind):
+        """超出 HISTORY_LIMIT + HISTORY_COMPACT_SLACK 条时删除最近 HISTORY_LIMIT 条之前的记录"""
+        count = conn.execute(
+            'SELECT COUNT(*) FROM history WHERE email = ? AND kind = ?', (email, kind)
+        ).fetchone()[0]
+        if count <= HISTORY_LIMIT + HISTORY_COMPACT_SLACK:
+            return
+        conn.execute(
+            'DELETE FROM history WHERE email = ? AND kind = ? AND id <= ('
+            'SELECT id FROM history WHERE email = ? AND kind = ? ORDER BY id DESC LIMIT 1 OFFSET ?)',
+            (email, kind, email, kind, HISTORY_LIMIT)
+        )
+
+    def get_history(self, email, kind, limit=HISTORY_LIMIT, before=None):
+        """
+        按时间倒序读取最近 HISTORY_LIMIT 条以内的历史记录（尚未压缩的旧记录不返回）
+        before: 只返回 id 小于该值的记录（分页游标）
+        返回：([(id, item)], has_more)
+        """
+        params = [email, kind, email, kind, HISTORY_LIMIT - 1]
+        condition = ''
+        if before is not None:
+            condition = ' AND id < ?'
+            params.append(before)
+        params.append(limit + 1)
+        rows = self._connect().execute(
+            'SELECT id, data FROM history WHERE email = ? AND kind = ? AND id >= COALESCE(('
+            'SELECT id FROM history WHERE email = ? AND kind = ? ORDER BY id DESC LIMIT 1 OFFSET ?), 0)'
+            f'{condition} ORDER BY id DESC LIMIT ?',
+            params
+        ).fetchall()
+        return [(row_id, json.loads(data)) for row_id, data in rows[:limit]], len(rows) > limit
+
+    def migrate_embedded_history(self):
+        """
+        一次性把旧版用户记录中的 reading_history / chat_history 列表移到历史日志表
+        返回：迁移的用户数
+        """
+        with self.transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'history_migrated'").fetchone()
+            if row:
+                return 0
+
+            updates, rows = [], []
+            for email, data in conn.execute('SELECT email, data FROM users').fetchall():
+                user_data = json.loads(data)
+                if 'reading_history' not in user_data and 'chat_history' not in user_data:
+                    continue
+                reading = user_data.pop('reading_history', None) or []
+                chat = user_data.pop('chat_history', None) or []
+                # 阅读历史是新的在前，聊天历史是旧的在前；都按时间顺序插入
+                rows += [(email, 'reading', item) for item in reversed(reading[:HISTORY_LIMIT])]
+                rows += [(email, 'chat', item) for item in chat[-HISTORY_LIMIT:]]
+                updates.append((json.dumps(user_data, ensure_ascii=False), email))
+
+            conn.executemany(
+                'INSERT INTO history (email, kind, data) VALUES (?, ?, ?)',
+                [(email, kind, json.dumps(item, ensure_ascii=False)) for email, kind, item in rows]
+            )
+            conn.executemany('UPDATE users SET data = ? WHERE email = ?', updates)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('history_migrated', '1')")
+        if updates:
+            logger.info(f"已把 {len(updates)} 个用户的历史记录迁移到历史日志表")
+        return len(updates)
+
+    def count(self):
+        """用户总数"""
+        return self._connect().execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def import_users(self, users_data, overwrite=False):
+        """批量导入 {email: user_data}，返回导入条数"""
+        verb = 'INSERT OR REPLACE' if overwrite else 'INSERT OR IGNORE'
+        rows = [
+            (email, json.dumps(user_data, ensure_ascii=False))
+            for email, user_data in users_data.items()
+        ]
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(f'{verb} INTO users (email, data) VALUES (?, ?)', rows)
+            return conn.total_changes - before
+
+    def migrate_from_json(self, json_path):
+        """
+        一次性从旧版 users.json 迁移
+        返回：迁移的用户数；已迁移过或文件不存在时返回0
+        """
+        marker = self._connect().execute(
+            "SELECT value FROM meta WHERE key = 'migrated_from'"
+        ).fetchone()
+        if marker:
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                users_data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except json.JSONDecodeError as e:
+            logger.error(f"users.json 格式错误，跳过迁移: {e}")
+            return 0
+
+        imported = self.import_users(users_data)
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+                (os.path.abspath(json_path),)
+            )
+        logger.info(f"已从 {json_path} 迁移 {imported} 个用户到 {self.db_path}")
+        return imported
+
+
+if __name__ == '__main__':
+    # 用法: python user_store.py [users.json路径] [users.db路径]
+    json_path = sys.argv[1] if len(sys.argv) > 1 else 'data/users.json'
+    db_path = sys.argv[2] if len(sys.argv) > 2 else 'data/users.db'
+    logging.basicConfig(level=logging.INFO)
+    store = UserStore(db_path)
+    count = store.migrate_from_json(json_path)
+    store.migrate_embedded_history()
+    print(f"迁移完成: {count} 个用户 -> {db_path}（共 {store.count()} 个用户）")
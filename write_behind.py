@@ -0,0 +1,189 @@
+# write_behind.py
+"""
+用户数据写缓冲：设置修改、登录时间、阅读历史和聊天记录先写入进程内的待提交集合，
+由后台线程每隔 interval 秒（或待提交数达到上限时）在一个事务中批量提交，进程退出时提交剩余部分；
+读取用户记录时叠加尚未提交的修改，同一进程内立即可见
+进程崩溃时最多丢失最近 interval 秒内的修改，每批修改要么全部生效要么全部不生效
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from metrics import REGISTRY, observe_stage
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_OPERATIONS = REGISTRY.counter(
+    'ansapra_write_behind_operations_total', '写缓冲提交的修改数', ('kind',)
+)
+WRITE_BEHIND_PENDING = REGISTRY.gauge(
+    'ansapra_write_behind_pending', '写缓冲中尚未提交的修改数'
+)
+
+
+class WriteBehindBuffer:
+    """
+    UserStore 前的写缓冲，interval 为0时直接写入（不缓冲）
+    on_flush(updates) 在每批修改提交成功后调用，updates 为 {邮箱: {字段: 值}}
+    （用于使其他worker在提交前根据旧数据缓存的内容失效）
+    """
+
+    def __init__(self, store, interval=1.0, max_pending=1000, on_flush=None):
+        self.store = store
+        self.interval = interval
+        self.max_pending = max_pending
+        self.on_flush = on_flush
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # 同一时间只有一个批次在提交，保证批次按顺序生效
+        self._flush_lock = threading.Lock()
+        # 待提交：{邮箱: {字段: 值}} 和 [(邮箱, 类型, 记录)]
+        self._updates = {}
+        self._history = []
+        # 正在提交的批次（提交完成前读取仍需叠加）
+        self._flushing_updates = {}
+        self._flushing_history = []
+        self._pending = 0
+        self._closed = False
+        self._thread = None
+        self._thread_pid = None
+        self._counters = {'updates': 0, 'appends': 0, 'flushes': 0, 'flushed': 0, 'errors': 0}
+        if self.enabled:
+            atexit.register(self.shutdown)
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def _ensure_flusher(self):
+        """按进程懒启动提交线程（preload_app 时线程不会随 fork 复制），需持有 _lock"""
+        pid = os.getpid()
+        if self._thread is None or self._thread_pid != pid or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+
+    def _count_pending(self):
+        """待提交数（同一用户的字段修改合并为一条），需持有 _lock"""
+        self._pending = len(self._updates) + len(self._history)
+        WRITE_BEHIND_PENDING.set(self._pending)
+
+    def _added(self):
+        """记录一次新的待提交修改，需持有 _lock"""
+        self._ensure_flusher()
+        self._count_pending()
+        if self._pending >= self.max_pending:
+            self._wakeup.notify()
+
+    def update_fields(self, email, fields):
+        """按字段覆盖用户记录，返回是否已写入或已缓冲"""
+        with self._lock:
+            buffered = self.enabled and not self._closed
+            if buffered:
+                self._updates.setdefault(email, {}).update(fields)
+                self._counters['updates'] += 1
+                self._added()
+        if not buffered:
+            return self.store.update(email, lambda user: user.update(fields)) is not None
+        return True
+
+    def append_history(self, email, kind, item):
+        """追加一条历史记录，返回是否已写入或已缓冲"""
+        with self._lock:
+            buffered = self.enabled and not self._closed
+            if buffered:
+                self._history.append((email, kind, item))
+                self._counters['appends'] += 1
+                self._added()
+        if not buffered:
+            return self.store.append_history(email, kind, item)
+        return True
+
+    def pending_fields(self, email):
+        """该用户尚未提交的字段修改"""
+        with self._lock:
+            fields = dict(self._flushing_updates.get(email, {}))
+            fields.update(self._updates.get(email, {}))
+        return fields
+
+    def has_pending_history(self, email):
+        with self._lock:
+            return any(entry[0] == email for entry in self._flushing_history) or \
+                any(entry[0] == email for entry in self._history)
+
+    def discard(self, email):
+        """丢弃该用户尚未提交的修改（删除账户时）"""
+        with self._lock:
+            self._updates.pop(email, None)
+            self._history = [entry for entry in self._history if entry[0] != email]
+            self._count_pending()
+
+    def flush(self):
+        """在一个事务中提交当前所有待提交的修改，返回提交的修改数"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._updates and not self._history:
+                    return 0
+                updates, history = self._updates, self._history
+                self._flushing_updates, self._flushing_history = updates, history
+                self._updates, self._history = {}, []
+                self._count_pending()
+
+            start = time.perf_counter()
+            try:
+                self.store.apply_batch(updates, history)
+            except Exception as e:
+                logger.error(f"写缓冲批量提交失败，下次重试: {e}")
+                with self._lock:
+                    # 放回待提交集合，之后的修改覆盖之前的
+                    for email, fields in updates.items():
+                        self._updates[email] = {**fields, **self._updates.get(email, {})}
+                    self._history = history + self._history
+                    self._count_pending()
+                    self._flushing_updates, self._flushing_history = {}, []
+                    self._counters['errors'] += 1
+                return 0
+            observe_stage('user_store_flush', time.perf_counter() - start)
+
+            with self._lock:
+                self._flushing_updates, self._flushing_history = {}, []
+                self._counters['flushes'] += 1
+                self._counters['flushed'] += len(updates) + len(history)
+            WRITE_BEHIND_OPERATIONS.inc(len(updates), kind='user')
+            WRITE_BEHIND_OPERATIONS.inc(len(history), kind='history')
+            if updates and self.on_flush is not None:
+                try:
+                    self.on_flush(updates)
+                except Exception as e:
+                    logger.error(f"写缓冲提交后的回调失败: {e}")
+            return len(updates) + len(history)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._closed and self._pending < self.max_pending:
+                    self._wakeup.wait(self.interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def shutdown(self, timeout=30):
+        """停止提交线程并提交剩余的修改（worker退出时调用）"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread if self._thread_pid == os.getpid() else None
+            self._wakeup.notify()
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending'] = self._pending
+        stats['interval'] = self.interval
+        return stats